@@ -32,6 +32,16 @@ from .common.atom_type import (
     CertificateAtom,
     UrlAtom,
 )
+from .common.bulk_search_cache import BulkSearchCache
+from .common.bulk_search_scheduler import BulkSearchScheduler
+from .common.lookup_batcher import LookupBatcher
 from .common.output import Output
+from .common.spooled_result import SpooledResult
+from .common.query_shard import QueryShard, TimeRangeShard, AtomTypeShard
+from .common.polling_strategy import PollingStrategy, FixedPolling, AdaptivePolling
+from .common.throttler import RateLimiter
+from .common.watch_state import WatchStateStore
 
+from .endpoints.sightings import BulkSightingsError
 from .datalake import Datalake
+from .async_datalake import AsyncDatalake
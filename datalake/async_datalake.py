@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from datalake.common.throttler import RateLimiter
+from datalake.datalake import Datalake
+from datalake.endpoints.bulk_search import OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES
+from datalake.endpoints.endpoint import (
+    OCD_DTL_KEEP_ALIVE,
+    OCD_DTL_POOL_BLOCK,
+    OCD_DTL_POOL_CONNECTIONS,
+    OCD_DTL_POOL_MAXSIZE,
+)
+from datalake.endpoints.async_endpoints import (
+    AsyncAdvancedSearch,
+    AsyncBulkSearch,
+    AsyncComments,
+    AsyncFilteredThreatEntity,
+    AsyncMyAccount,
+    AsyncSightings,
+    AsyncSources,
+    AsyncTags,
+    AsyncThreats,
+)
+
+OCD_DTL_ASYNC_MAX_WORKERS = int(os.getenv("OCD_DTL_ASYNC_MAX_WORKERS", 32))
+
+
+class AsyncDatalake:
+    """Asyncio entrypoint to the Datalake library
+
+    Usage:
+    >>> async with AsyncDatalake(longterm_token='some longterm token') as dtl:
+    ...     await dtl.Threats.lookup(atom_value='mayoclinic.org', atom_type=AtomType.DOMAIN)
+
+    Every endpoint method of Datalake is available as a coroutine, and its generators as async generators.
+    Throttling, retries and tokens are shared with the underlying Datalake instance,
+    max_workers bounds the number of requests sent at the same time.
+    """
+
+    def __init__(
+        self,
+        username: str = None,
+        password: str = None,
+        longterm_token: str = None,
+        env: str = "prod",
+        log_level=logging.WARNING,
+        proxies: dict = None,
+        verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        max_workers: int = OCD_DTL_ASYNC_MAX_WORKERS,
+        pool_connections: int = OCD_DTL_POOL_CONNECTIONS,
+        pool_maxsize: int = None,
+        pool_block: bool = OCD_DTL_POOL_BLOCK,
+        keep_alive: bool = OCD_DTL_KEEP_ALIVE,
+        max_in_memory_result_bytes: int = OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES,
+    ):
+        self._datalake = Datalake(
+            username=username,
+            password=password,
+            longterm_token=longterm_token,
+            env=env,
+            log_level=log_level,
+            proxies=proxies,
+            verify=verify,
+            rate_limiter=rate_limiter,
+            pool_connections=pool_connections,
+            # Keep a connection per worker by default to avoid discarding warm connections
+            pool_maxsize=pool_maxsize or max(max_workers, OCD_DTL_POOL_MAXSIZE),
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+            max_in_memory_result_bytes=max_in_memory_result_bytes,
+        )
+        self.logger = self._datalake.logger
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ocd-dtl"
+        )
+
+        # Endpoints
+        self.MyAccount = AsyncMyAccount(self._datalake.MyAccount, self._executor)
+        self.AdvancedSearch = AsyncAdvancedSearch(
+            self._datalake.AdvancedSearch, self._executor
+        )
+        self.BulkSearch = AsyncBulkSearch(self._datalake.BulkSearch, self._executor)
+        self.FilteredThreatEntity = AsyncFilteredThreatEntity(
+            self._datalake.FilteredThreatEntity, self._executor
+        )
+        self.Comments = AsyncComments(self._datalake.Comments, self._executor)
+        self.Tags = AsyncTags(self._datalake.Tags, self._executor)
+        self.Sources = AsyncSources(self._datalake.Sources, self._executor)
+        self.Threats = AsyncThreats(self._datalake.Threats, self._executor)
+        self.Sightings = AsyncSightings(self._datalake.Sightings, self._executor)
+
+    def close(self):
+        """Release the workers used to send the requests, then the files and connections of the instance"""
+        self._executor.shutdown(wait=True)
+        self._datalake.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # waiting for the workers would block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
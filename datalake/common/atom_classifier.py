@@ -0,0 +1,186 @@
+import ipaddress
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from datalake.common.atom import AtomType
+
+OCD_DTL_ATOM_TYPE_MEMO_SIZE = int(os.getenv("OCD_DTL_ATOM_TYPE_MEMO_SIZE", 100000))
+OCD_DTL_ATOM_TYPE_MEMO_PATH = os.getenv("OCD_DTL_ATOM_TYPE_MEMO_PATH")
+
+_HASH_LENGTHS = {32, 40, 64, 128}  # md5, sha1, sha256, sha512
+_HASH_REGEX = re.compile(r"^[0-9a-fA-F]+$")
+_DOMAIN_PATTERN = (
+    r"(?=.{1,253}$)(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+"
+    r"(?:[a-z]{2,63}|xn--[a-z0-9-]{1,59})"
+)
+_DOMAIN_REGEX = re.compile(rf"^{_DOMAIN_PATTERN}$", re.IGNORECASE)
+# Domains are only typed locally with one of these TLDs, so file names like setup.exe or readme.txt are typed by the API.
+# TLDs that are also common file extensions (.pl, .sh, .rs, .cc, .ai, .app, ...) are left out for the same reason.
+_LOCAL_TLDS = frozenset(
+    """
+    com net org info biz edu gov mil int io co me tv xyz online site top club shop store tech blog cloud live news
+    name mobi asia travel jobs eu
+    ar at au be bg br by ca ch cl cn cz de dk dz ec ee eg es fi fr gr hk hr hu id ie il in ir is it jp ke kr kz
+    lk lt lu lv ma mx my ng nl no np nz pe ph pk pt ro ru sa se sg si sk th tn tr tw ua uk us uy ve vn za
+    """.split()
+)
+_EMAIL_REGEX = re.compile(
+    rf"^[a-z0-9!#$%&'*+/=?^_`{{|}}~.-]{{1,64}}@{_DOMAIN_PATTERN}$", re.IGNORECASE
+)
+_URL_REGEX = re.compile(r"^(?:https?|ftp)://[^\s/?#.][^\s]*$", re.IGNORECASE)
+
+
+def classify_atom_value(
+    atom_value: str, treat_hashes_like: AtomType = AtomType.FILE
+) -> Optional[AtomType]:
+    """
+    Return the type of an atom value when it can be told without the API, None otherwise.
+
+    Only unambiguous values are typed: ips, ip ranges, hashes, urls, emails and domains of well known TLDs.
+    AS numbers, crypto addresses and phone numbers look too much alike to be typed locally.
+    Hashes are typed as <treat_hashes_like>, as the API does.
+    """
+    if not atom_value or atom_value != atom_value.strip() or " " in atom_value:
+        return None
+    if "/" in atom_value and "://" not in atom_value:
+        try:
+            ipaddress.ip_network(atom_value, strict=False)
+            return AtomType.IP_RANGE
+        except ValueError:
+            return None
+    try:
+        ipaddress.ip_address(atom_value)
+        return AtomType.IP
+    except ValueError:
+        pass
+    if len(atom_value) in _HASH_LENGTHS and _HASH_REGEX.match(atom_value):
+        return treat_hashes_like
+    if _URL_REGEX.match(atom_value):
+        return AtomType.URL
+    if _EMAIL_REGEX.match(atom_value):
+        return AtomType.EMAIL
+    if _DOMAIN_REGEX.match(atom_value):
+        tld = atom_value.rsplit(".", 1)[1].lower()
+        if tld in _LOCAL_TLDS or tld.startswith("xn--"):
+            return AtomType.DOMAIN
+    return None
+
+
+class AtomClassifier:
+    """
+    Type atom values locally, remembering the types learned from the API for the values that can't be.
+
+    The memo is thread safe and keeps the memo_size most recently used values.
+    With a memo_path, the types learned are also appended to that NDJSON file and loaded back by the next
+    AtomClassifier using it, so they are only asked once to the API across runs.
+    The file is rewritten with the memo_size most recent values when it grows to twice that size, its directory is
+    created if needed. Call close, or use the classifier as a context manager, to close the file.
+    """
+
+    def __init__(
+        self,
+        memo_size: int = OCD_DTL_ATOM_TYPE_MEMO_SIZE,
+        memo_path: str = OCD_DTL_ATOM_TYPE_MEMO_PATH,
+    ):
+        self.memo_size = memo_size
+        self.memo_path = memo_path
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self._file = None
+        if memo_path:
+            self._load()
+
+    def _load(self):
+        try:
+            memo_folder = os.path.dirname(self.memo_path)
+            if memo_folder:
+                os.makedirs(memo_folder, exist_ok=True)
+            self._load_file()
+        except OSError as e:
+            raise ValueError(
+                f"Can't use {self.memo_path} as atom type memo: {e}"
+            ) from e
+
+    def _load_file(self):
+        lines = 0
+        complete = True
+        try:
+            with open(self.memo_path, encoding="utf-8") as memo_file:
+                for line in memo_file:
+                    lines += 1
+                    complete = line.endswith("\n")
+                    try:
+                        atom_value, treat_hashes_like, atom_type = json.loads(line)
+                        key = (atom_value, AtomType(treat_hashes_like))
+                        self._memo[key] = AtomType(atom_type)
+                    except ValueError:  # line cut by an interruption
+                        continue
+                    self._memo.move_to_end(key)
+                    if len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+        except FileNotFoundError:
+            pass
+
+        if lines > 2 * self.memo_size:
+            compacted_path = f"{self.memo_path}.tmp"
+            with open(compacted_path, "w", encoding="utf-8") as compacted_file:
+                for (atom_value, treat_hashes_like), atom_type in self._memo.items():
+                    compacted_file.write(
+                        self._memo_line(atom_value, treat_hashes_like, atom_type)
+                    )
+            os.replace(compacted_path, self.memo_path)
+            complete = True
+        self._file = open(self.memo_path, "a", encoding="utf-8")
+        if not complete:
+            self._file.write("\n")  # don't append to the line cut by the interruption
+
+    @staticmethod
+    def _memo_line(
+        atom_value: str, treat_hashes_like: AtomType, atom_type: AtomType
+    ) -> str:
+        return json.dumps([atom_value, treat_hashes_like.value, atom_type.value]) + "\n"
+
+    def classify(
+        self, atom_value: str, treat_hashes_like: AtomType = AtomType.FILE
+    ) -> Optional[AtomType]:
+        """Return the type of the atom value, None if it has to be asked to the API"""
+        key = (atom_value, treat_hashes_like)
+        with self._lock:
+            atom_type = self._memo.get(key)
+            if atom_type:
+                self._memo.move_to_end(key)
+                return atom_type
+        return classify_atom_value(atom_value, treat_hashes_like)
+
+    def remember(
+        self, atom_value: str, treat_hashes_like: AtomType, atom_type: AtomType
+    ):
+        """Save the type given by the API for an atom value"""
+        key = (atom_value, treat_hashes_like)
+        with self._lock:
+            known = self._memo.get(key) == atom_type
+            self._memo[key] = atom_type
+            self._memo.move_to_end(key)
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+            if self._file and not known:
+                self._file.write(
+                    self._memo_line(atom_value, treat_hashes_like, atom_type)
+                )
+                self._file.flush()
+
+    def close(self):
+        """Close the memo file, the types learned afterwards are only kept in memory"""
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+OCD_DTL_BULK_SEARCH_CACHE_TTL = float(os.getenv("OCD_DTL_BULK_SEARCH_CACHE_TTL", 600))
+
+
+class BulkSearchCache:
+    """
+    Local disk cache of the bulk search tasks created, so identical bulk searches reuse the same task.
+
+    Bulk searches are identified by their query (query hash or query body), query fields and export flags.
+    A task created less than ttl seconds ago is reused, whether it is still running or done.
+    Each entry is a small JSON file in directory, so the cache can be shared by several processes.
+    """
+
+    def __init__(self, directory: str, ttl: float = OCD_DTL_BULK_SEARCH_CACHE_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(
+        query_body: dict = None,
+        query_hash: str = None,
+        query_fields: list = None,
+        **export_flags,
+    ) -> str:
+        """Digest of the parameters of BulkSearch.create_task identifying a bulk search"""
+        bulk_search = {
+            "query": query_body or query_hash,
+            "query_fields": query_fields,  # the order defines the result columns
+            "export_flags": {
+                flag: value for flag, value in export_flags.items() if value
+            },
+        }
+        return hashlib.sha256(
+            json.dumps(bulk_search, sort_keys=True).encode()
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the uuid of the task cached for key if it is fresh"""
+        try:
+            with open(self._path(key), encoding="utf-8") as entry_file:
+                entry = json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time.time() - entry["created_at"] > self.ttl:
+            return None
+        return entry["task_uuid"]
+
+    def set(self, key: str, task_uuid: str):
+        path = self._path(key)
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as entry_file:
+            json.dump({"task_uuid": task_uuid, "created_at": time.time()}, entry_file)
+        os.replace(temporary_path, path)  # readers never see a partial entry
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
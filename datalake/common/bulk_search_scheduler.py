@@ -0,0 +1,148 @@
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import Future
+from time import monotonic, sleep
+from typing import AsyncGenerator, Callable, Generator, List
+
+from datalake.common.bulk_search_task import (
+    BULK_SEARCH_FAILED_STATE,
+    BulkSearchFailedError,
+    BulkSearchTask,
+    BulkSearchTaskState,
+)
+from datalake.common.utils import concurrent_map
+
+OCD_DTL_MAX_ACTIVE_BULK_SEARCHES = int(os.getenv("OCD_DTL_MAX_ACTIVE_BULK_SEARCHES", 5))
+
+
+class BulkSearchScheduler:
+    """
+    Run many bulk searches, keeping at most max_active of them in progress on the API.
+
+    Usage:
+    >>> scheduler = BulkSearchScheduler(dtl.BulkSearch)
+    >>> for query_hash in query_hashes:
+    ...     scheduler.submit(query_hash=query_hash, callback=lambda future: print(future.result().uuid))
+    >>> for future in scheduler.as_completed():
+    ...     future.result().download()
+
+    submit accepts the parameters of BulkSearch.create_task and returns a future of the bulk search task,
+    resolved once the task is DONE, or failed with BulkSearchFailedError or TimeoutError.
+    The tasks are only created and polled while the scheduler runs: through run, as_completed or as_completed_async.
+    All the active tasks are polled together every poll_interval seconds, up to max_workers at the same time.
+    """
+
+    def __init__(
+        self,
+        bulk_search,  # BulkSearch endpoint
+        max_active: int = OCD_DTL_MAX_ACTIVE_BULK_SEARCHES,
+        max_workers: int = None,
+        poll_interval: float = BulkSearchTask.REQUEST_INTERVAL,
+        timeout: float = 15 * 60,
+    ):
+        if max_active < 1:
+            raise ValueError("max_active needs to be positive")
+        self.bulk_search = bulk_search
+        self.max_active = max_active
+        self.max_workers = max_workers or max_active
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._queued = deque()  # (create_task kwargs, future)
+        self._active = {}  # task uuid -> (task, futures, deadline)
+
+    def __len__(self):
+        """Number of bulk searches not finished yet"""
+        return len(self._queued) + len(self._active)
+
+    def submit(
+        self, callback: Callable[[Future], None] = None, **create_task_kwargs
+    ) -> Future:
+        """Queue a bulk search, callback is called with the future of the task once it is finished"""
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+        self._queued.append((create_task_kwargs, future))
+        return future
+
+    def run(self) -> None:
+        """Run the bulk searches until all of them are finished"""
+        for _ in self.as_completed():
+            pass
+
+    def as_completed(self) -> Generator[Future, None, None]:
+        """Run the bulk searches and yield their futures as they finish"""
+        while self:
+            finished = self._step()
+            yield from finished
+            if self._active and not finished:
+                sleep(self.poll_interval)
+
+    async def as_completed_async(self) -> AsyncGenerator[Future, None]:
+        """Same as as_completed, the requests are sent from the default executor of the running loop"""
+        loop = asyncio.get_running_loop()
+        while self:
+            finished = await loop.run_in_executor(None, self._step)
+            for future in finished:
+                yield future
+            if self._active and not finished:
+                await asyncio.sleep(self.poll_interval)
+
+    def _step(self) -> List[Future]:
+        """Create tasks up to max_active, poll the other active ones and return the futures of those finished"""
+        finished = []
+        created_uuids = set()
+        while self._queued and len(self._active) < self.max_active:
+            create_task_kwargs, future = self._queued.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                task = self.bulk_search.create_task(**create_task_kwargs)
+            except Exception as e:
+                future.set_exception(e)
+                finished.append(future)
+                continue
+            if task.uuid in self._active:  # the same bulk search was already submitted
+                self._active[task.uuid][1].append(future)
+                continue
+            self._active[task.uuid] = (task, [future], monotonic() + self.timeout)
+            created_uuids.add(task.uuid)
+            finished.extend(self._check(task))
+
+        polled_uuids = [uuid for uuid in self._active if uuid not in created_uuids]
+        for uuid, updated_task in concurrent_map(
+            self._poll, polled_uuids, max_workers=self.max_workers
+        ):
+            if isinstance(updated_task, Exception):
+                _, futures, _ = self._active.pop(uuid)
+                for future in futures:
+                    future.set_exception(updated_task)
+                finished.extend(futures)
+            else:
+                task = self._active[uuid][0]
+                task.__dict__.update(updated_task.__dict__)
+                finished.extend(self._check(task))
+        return finished
+
+    def _poll(self, uuid):
+        try:
+            return uuid, self.bulk_search.get_task(uuid)
+        except Exception as e:
+            return uuid, e
+
+    def _check(self, task: BulkSearchTask) -> List[Future]:
+        """Resolve the futures of the task if it is finished"""
+        _, futures, deadline = self._active[task.uuid]
+        if task.state == BulkSearchTaskState.DONE:
+            for future in futures:
+                future.set_result(task)
+        elif task.state in BULK_SEARCH_FAILED_STATE:
+            for future in futures:
+                future.set_exception(BulkSearchFailedError(task.state))
+        elif monotonic() > deadline:
+            for future in futures:
+                future.set_exception(TimeoutError(f"bulk search {task.uuid} timed out"))
+        else:
+            return []
+        del self._active[task.uuid]
+        return futures
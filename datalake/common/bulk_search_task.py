@@ -1,10 +1,25 @@
 import asyncio
 import datetime
+import functools
+import gzip
+import json
 import os
+import re
+import shutil
+import tempfile
 from enum import Enum
+from typing import Generator, Optional, Tuple
 
-from datalake.common.output import Output
-from datalake.common.utils import parse_api_timestamp
+import requests
+import urllib3
+
+from datalake.common.output import Output, iter_json_list
+from datalake.common.polling_strategy import AdaptivePolling, PollingStrategy
+from datalake.common.spooled_result import SpooledResult
+from datalake.common.utils import concurrent_map, parse_api_timestamp
+
+OCD_DTL_MAX_RETRIES = int(os.getenv("OCD_DTL_MAX_RETRIES", 3))
+_CONTENT_RANGE_REGEX = re.compile(r"bytes (\d+)-\d+/(\d+|\*)")
 
 
 class BulkSearchTaskState(Enum):
@@ -46,7 +61,12 @@ class BulkSearchTask:
     """
 
     REQUEST_INTERVAL = float(os.getenv("OCD_DTL_MAX_BACK_OFF_TIME", 10))
+    # strategy deciding when to poll the task while waiting for it, can be replaced per task or for all of them
+    polling_strategy: PollingStrategy = AdaptivePolling()
     STREAM_CHUNK_SIZE = 4096
+    # zip archives smaller than this are kept in memory, bigger ones are spooled to a temporary file
+    ZIP_SPOOL_MAX_SIZE = int(os.getenv("OCD_DTL_ZIP_SPOOL_MAX_SIZE", 64 * 1024 * 1024))
+    DOWNLOAD_BUFFER_SIZE = int(os.getenv("OCD_DTL_DOWNLOAD_BUFFER_SIZE", 1024 * 1024))
 
     def __init__(
         self,
@@ -95,28 +115,70 @@ class BulkSearchTask:
         """
         return self._endpoint.download(self.uuid, output=output, stream=stream)
 
-    async def download_async(self, output=Output.JSON, timeout=15 * 60, stream=False):
+    async def download_async(
+        self,
+        output=Output.JSON,
+        timeout=15 * 60,
+        stream=False,
+        polling_strategy: PollingStrategy = None,
+    ):
         """
         Wait asynchronously for the bulk search to be ready then return its result
 
-        Note that the requests library is used which is blocking.
+        The blocking requests are sent from the default executor of the running loop.
         timeout parameter is in seconds.
+        If the result is bigger than the max_in_memory_result_bytes of the Datalake instance, it is downloaded
+        to a temporary file and a SpooledResult is returned instead, iterate over it to read the result.
+        polling_strategy decides when the task is polled, default to the polling_strategy attribute of the task.
         """
+        loop = asyncio.get_running_loop()
+        await self._wait_until_done(timeout, polling_strategy)
+        max_in_memory_size = self._endpoint.max_in_memory_result_bytes
+        if (
+            not stream
+            and max_in_memory_size is not None
+            and (self.file_size or 0) > max_in_memory_size
+        ):
+            return await loop.run_in_executor(
+                None,
+                functools.partial(
+                    self._download_spooled, output=output, max_size=max_in_memory_size
+                ),
+            )
+        return await loop.run_in_executor(
+            None, functools.partial(self.download, output=output, stream=stream)
+        )
+
+    async def _wait_until_done(self, timeout, polling_strategy=None):
+        loop = asyncio.get_running_loop()
+        polling_strategy = polling_strategy or self.polling_strategy
         start = datetime.datetime.now(datetime.timezone.utc)
         while self.state != BulkSearchTaskState.DONE:
             if self.state in BULK_SEARCH_FAILED_STATE:
                 raise BulkSearchFailedError(self.state)
             time_passed = datetime.datetime.now(datetime.timezone.utc) - start
-            if time_passed.total_seconds() > timeout:
+            remaining_time = timeout - time_passed.total_seconds()
+            if remaining_time < 0:
                 raise TimeoutError()
 
-            await asyncio.sleep(self.REQUEST_INTERVAL)
-            self.update()
-        return self.download(output=output, stream=stream)
+            # poll once more right at the timeout rather than waiting past it
+            interval = polling_strategy.next_interval(self)
+            await asyncio.sleep(max(min(interval, remaining_time), 0))
+            await loop.run_in_executor(None, self.update)
 
-    def download_sync(self, output=Output.JSON, timeout=15 * 60, stream=False):
+    def download_sync(
+        self,
+        output=Output.JSON,
+        timeout=15 * 60,
+        stream=False,
+        polling_strategy: PollingStrategy = None,
+    ):
         """Blocking version of download_async, easier to use but doesn't allow parallelization"""
-        return asyncio.run(self.download_async(output, timeout, stream=stream))
+        return asyncio.run(
+            self.download_async(
+                output, timeout, stream=stream, polling_strategy=polling_strategy
+            )
+        )
 
     def download_sync_stream_to_file(
         self, output_path, output=Output.JSON, timeout=15 * 60
@@ -130,6 +192,254 @@ class BulkSearchTask:
             for chunk in raw_response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE):
                 output_file.write(chunk)
 
+    def download_to_file(
+        self,
+        output_path,
+        output=Output.JSON,
+        timeout=15 * 60,
+        resume: bool = False,
+        max_workers: int = 1,
+        buffer_size: int = None,
+        retries: int = OCD_DTL_MAX_RETRIES,
+    ) -> int:
+        """
+        Wait for the bulk search to be ready then download it to output_path and return the size of the file.
+
+        When the server accepts HTTP range requests:
+        * with resume, the bytes already in output_path are not downloaded again if they come from an interrupted
+          download of the same task and output, as recorded in the `<output_path>.download` file next to it
+        * a broken connection is resumed from the last byte written, up to retries times per connection
+        * with max_workers > 1, the file is preallocated and max_workers parts of it are downloaded in parallel,
+          such a download can't be resumed
+        Otherwise the whole file is downloaded again on a single connection.
+        The data is read by blocks of buffer_size bytes (default to the OCD_DTL_DOWNLOAD_BUFFER_SIZE environment
+        variable, 1MB) and the size of the file is checked against the size announced by the server.
+        A gzip Content-Encoding is decoded once the whole file is downloaded, as ranges are positions in the encoded file.
+        """
+        asyncio.run(self._wait_until_done(timeout))
+        buffer_size = buffer_size or self.DOWNLOAD_BUFFER_SIZE
+        state_path = f"{output_path}.download"
+        state = {"uuid": self.uuid, "output": output.name, "file_size": self.file_size}
+        offset = 0
+        if (
+            resume
+            and os.path.exists(output_path)
+            and self._load_download_state(state_path) == state
+        ):
+            offset = os.path.getsize(output_path)
+        sequential = offset or max_workers <= 1
+        if sequential:
+            with open(state_path, "w") as state_file:
+                json.dump(state, state_file)
+        elif os.path.exists(state_path):
+            os.remove(state_path)
+
+        with open(output_path, "r+b" if offset else "wb") as output_file:
+            if sequential:
+                position, total_size, content_encoding = self._download_range(
+                    output_file, output, offset, None, buffer_size, retries
+                )
+            else:
+                part_size = max(-(-(self.file_size or 0) // max_workers), buffer_size)
+                position, total_size, content_encoding = self._download_range(
+                    output_file, output, 0, part_size - 1, buffer_size, retries
+                )
+                if total_size is not None and position < total_size:
+                    # the server sent only the first part
+                    output_file.truncate(total_size)
+                    parts = [
+                        (first_byte, min(first_byte + part_size, total_size) - 1)
+                        for first_byte in range(position, total_size, part_size)
+                    ]
+                    list(
+                        concurrent_map(
+                            lambda part: self._download_part(
+                                output_path, output, part, buffer_size, retries
+                            ),
+                            parts,
+                            max_workers=max_workers,
+                        )
+                    )
+                    position = total_size
+            output_file.truncate(position)
+
+        if sequential:
+            os.remove(state_path)
+        expected_size = total_size if total_size is not None else self.file_size
+        file_size = os.path.getsize(output_path)
+        if file_size != expected_size:
+            raise ValueError(
+                f"Downloaded file size is {file_size} bytes, {expected_size} bytes were expected"
+            )
+        if content_encoding in ("gzip", "x-gzip"):
+            self._decode_gzip_file(output_path, buffer_size)
+        elif content_encoding not in (None, "identity"):
+            raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+        return os.path.getsize(output_path)
+
+    @staticmethod
+    def _load_download_state(state_path: str) -> Optional[dict]:
+        try:
+            with open(state_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _decode_gzip_file(file_path, buffer_size: int):
+        decoded_path = f"{file_path}.decoded"
+        with gzip.open(file_path, "rb") as encoded_file, open(
+            decoded_path, "wb"
+        ) as decoded_file:
+            shutil.copyfileobj(encoded_file, decoded_file, buffer_size)
+        os.replace(decoded_path, file_path)
+
+    def _download_part(self, output_path, output, part, buffer_size, retries):
+        with open(output_path, "r+b") as output_file:
+            self._download_range(output_file, output, *part, buffer_size, retries)
+
+    def _download_range(
+        self,
+        output_file,
+        output: Output,
+        first_byte: int,
+        last_byte: Optional[int],
+        buffer_size: int,
+        retries: int,
+    ) -> Tuple[int, Optional[int], Optional[str]]:
+        """
+        Write the bytes from first_byte to last_byte (included, None for the end of the file) at the same position
+        in output_file, or the whole file if the server doesn't accept the range.
+        The bytes are written as they are sent, without decoding their Content-Encoding.
+
+        Return the position after the last byte written, the size of the whole file if the server announced it,
+        and the Content-Encoding of the file.
+        """
+        position = first_byte
+        buffer = bytearray(buffer_size)
+        while True:
+            # the byte before position is requested too, so the range is never empty when the file is complete
+            range_first_byte = max(position - 1, 0)
+            response = self._endpoint.download(
+                self.uuid,
+                output=output,
+                stream=True,
+                byte_range=(range_first_byte, last_byte),
+            )
+            try:
+                if response.status_code == 206:
+                    response_first_byte, total_size = self._parse_content_range(
+                        response.headers.get("Content-Range", "")
+                    )
+                    end = total_size
+                    if last_byte is not None and total_size is not None:
+                        end = min(last_byte + 1, total_size)
+                    elif last_byte is not None:
+                        end = last_byte + 1
+                else:  # the whole file is sent
+                    response_first_byte = position = 0
+                    content_length = response.headers.get("Content-Length")
+                    total_size = end = int(content_length) if content_length else None
+                output_file.seek(position)
+                # Content-Range and Content-Length count the encoded bytes
+                response.raw.decode_content = False
+                skipped = position - response_first_byte
+                if skipped < 0:
+                    raise ValueError(
+                        f"Invalid Content-Range header: {response.headers['Content-Range']}"
+                    )
+                while end is None or position < end:
+                    read_size = skipped or buffer_size
+                    if end is not None:
+                        read_size = min(read_size, end - position + skipped)
+                    read = response.raw.readinto(memoryview(buffer)[:read_size])
+                    if not read:
+                        break
+                    if skipped:
+                        skipped -= read
+                    else:
+                        output_file.write(memoryview(buffer)[:read])
+                        position += read
+                if end is None or position >= end:
+                    return (
+                        position,
+                        total_size,
+                        response.headers.get("Content-Encoding"),
+                    )
+                raise ConnectionError(
+                    f"Connection closed after {position} bytes, {end} were expected"
+                )
+            except (
+                requests.RequestException,
+                urllib3.exceptions.HTTPError,
+                ConnectionError,
+            ):
+                if retries <= 0:
+                    raise
+                retries -= 1
+            finally:
+                response.close()
+
+    @staticmethod
+    def _parse_content_range(content_range: str) -> Tuple[int, Optional[int]]:
+        """Return the position of the first byte sent and the size of the whole file from a Content-Range header"""
+        match = _CONTENT_RANGE_REGEX.fullmatch(content_range.strip())
+        if not match:
+            raise ValueError(f"Invalid Content-Range header: {content_range}")
+        total_size = match.group(2)
+        return int(match.group(1)), None if total_size == "*" else int(total_size)
+
+    def iter_results(self, timeout=15 * 60) -> Generator[dict, None, None]:
+        """
+        Wait for the bulk search to be ready then yield its results one by one, keyed by the task query_fields.
+
+        The JSON result is parsed as it is downloaded, so the memory usage doesn't depend on the size of the result.
+        """
+        raw_response = self.download_sync(
+            output=Output.JSON, timeout=timeout, stream=True
+        )
+        try:
+            chunks = raw_response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE)
+            for row in iter_json_list(chunks, "results"):
+                yield dict(zip(self.query_fields, row))
+        finally:
+            raw_response.close()
+
+    def iter_zip_results(
+        self, output=Output.JSON_ZIP, timeout=15 * 60
+    ) -> Generator[dict, None, None]:
+        """
+        Wait for the bulk search to be ready, download it as a zip archive then yield its content one item at a time.
+
+        The archive is kept as bytes, its files are decompressed while they are read:
+        * JSON_ZIP yields the threats keyed by the task query_fields, like iter_results
+        * CSV_ZIP yields the CSV rows keyed by the CSV header
+        * STIX_ZIP yields the STIX objects of each bundle
+        """
+        if output not in (Output.JSON_ZIP, Output.CSV_ZIP, Output.STIX_ZIP):
+            raise ValueError(
+                f"{output} output type is not supported. "
+                f"Outputs supported are: CSV_ZIP, JSON_ZIP, STIX_ZIP"
+            )
+        asyncio.run(self._wait_until_done(timeout))
+        # zip archives index their files at their end, the whole archive is needed before reading them
+        with self._download_spooled(output, self.ZIP_SPOOL_MAX_SIZE) as result:
+            yield from result
+
+    def _download_spooled(self, output: Output, max_size: int) -> SpooledResult:
+        """Download the result to a temporary file, kept in memory up to max_size bytes"""
+        raw_response = self.download(output=output, stream=True)
+        spool = tempfile.SpooledTemporaryFile(max_size=max_size)
+        try:
+            for chunk in raw_response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE):
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        finally:
+            raw_response.close()
+        return SpooledResult(spool, output, self.query_fields)
+
     def update(self):
         """Query the API to refresh the tasks attributes"""
         updated_bs = self._endpoint.get_task(self.uuid)
@@ -0,0 +1,75 @@
+import hashlib
+import heapq
+import json
+from array import array
+from bisect import bisect_left
+from typing import Callable, Generator, Iterable, Sequence, Tuple
+
+from datalake.common.utils import split_iterable
+
+SORT_CHUNK_SIZE = 1000000
+
+
+def row_fingerprint(row: Sequence) -> int:
+    """64 bits digest of a bulk search row"""
+    digest = hashlib.blake2b(json.dumps(list(row)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def sorted_fingerprints(rows: Iterable[Sequence]) -> array:
+    """
+    Return the sorted and unique fingerprints of rows, 8 bytes per row.
+
+    Rows are fingerprinted and sorted SORT_CHUNK_SIZE at a time, so no more than a chunk of them is held as Python ints.
+    """
+    sorted_chunks = [
+        array("Q", sorted(row_fingerprint(row) for row in rows_chunk))
+        for rows_chunk in split_iterable(rows, SORT_CHUNK_SIZE)
+    ]
+    fingerprints = array("Q")
+    previous_fingerprint = None
+    for fingerprint in heapq.merge(*sorted_chunks):
+        if fingerprint != previous_fingerprint:
+            fingerprints.append(fingerprint)
+            previous_fingerprint = fingerprint
+    return fingerprints
+
+
+def contains(fingerprints: array, fingerprint: int) -> bool:
+    index = bisect_left(fingerprints, fingerprint)
+    return index < len(fingerprints) and fingerprints[index] == fingerprint
+
+
+def iter_missing_rows(
+    rows: Iterable[Sequence], fingerprints: array
+) -> Generator[tuple, None, None]:
+    """Yield, once each, the rows whose fingerprint is not in the sorted fingerprints"""
+    yielded_fingerprints = set()
+    for row in rows:
+        fingerprint = row_fingerprint(row)
+        if (
+            not contains(fingerprints, fingerprint)
+            and fingerprint not in yielded_fingerprints
+        ):
+            yielded_fingerprints.add(fingerprint)
+            yield tuple(row)
+
+
+def iter_rows_diff(
+    previous_rows: Callable[[], Iterable[Sequence]],
+    new_rows: Callable[[], Iterable[Sequence]],
+) -> Generator[Tuple[str, tuple], None, None]:
+    """
+    Yield ("added", row) for the rows only in new_rows, then ("removed", row) for the rows only in previous_rows.
+
+    previous_rows and new_rows return a new iterator over the rows at each call, they are each read twice,
+    only the fingerprints of one side are held in memory at a time.
+    Two different rows may have the same fingerprint, with 64 bits the odds stay negligible for millions of rows.
+    """
+    previous_fingerprints = sorted_fingerprints(previous_rows())
+    for row in iter_missing_rows(new_rows(), previous_fingerprints):
+        yield "added", row
+    del previous_fingerprints
+    new_fingerprints = sorted_fingerprints(new_rows())
+    for row in iter_missing_rows(previous_rows(), new_fingerprints):
+        yield "removed", row
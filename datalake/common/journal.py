@@ -0,0 +1,94 @@
+import hashlib
+import json
+
+
+class BulkThreatsJournal:
+    """
+    Append-only NDJSON journal of the batches submitted to the bulk-manual-threats endpoint.
+
+    Each line records either the task created for a batch or the outcome of that task,
+    so an interrupted add_threats run can be resumed without submitting the finished batches again.
+    Batches are identified by a digest of their atom type and atom values.
+    """
+
+    SUBMITTED = "submitted"
+    DONE = "done"
+    CANCELLED = "cancelled"
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.batches = {}
+        complete = True
+        if resume:
+            complete = self._load()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+        if not complete:
+            self._file.write("\n")  # don't append to the line cut by the interruption
+
+    @staticmethod
+    def batch_key(atom_type: str, atom_values: str) -> str:
+        return hashlib.sha256(f"{atom_type}\n{atom_values}".encode()).hexdigest()
+
+    def _load(self) -> bool:
+        """Load the existing journal, return False if its last line is incomplete"""
+        line = "\n"
+        try:
+            with open(self.path, encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # last line cut by the interruption
+                        continue
+                    self.batches.setdefault(entry["batch"], {}).update(entry)
+        except FileNotFoundError:
+            pass
+        return line.endswith("\n")
+
+    def _write(self, entry: dict):
+        self.batches.setdefault(entry["batch"], {}).update(entry)
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def task_uuid(self, batch_key: str):
+        """Return the uuid of the task created for the batch, if it may still be running"""
+        batch = self.batches.get(batch_key, {})
+        if batch.get("event") == self.SUBMITTED:
+            return batch["task_uuid"]
+        return None
+
+    def task_status(self, batch_key: str):
+        """Return the final status of the task created for the batch, if it is done"""
+        batch = self.batches.get(batch_key, {})
+        if batch.get("event") == self.DONE:
+            return batch["task_status"]
+        return None
+
+    def submitted(self, batch_key: str, task_uuid: str):
+        self._write(
+            {"event": self.SUBMITTED, "batch": batch_key, "task_uuid": task_uuid}
+        )
+
+    def done(self, batch_key: str, task_uuid: str, task_status: dict):
+        self._write(
+            {
+                "event": self.DONE,
+                "batch": batch_key,
+                "task_uuid": task_uuid,
+                "task_status": task_status,
+            }
+        )
+
+    def cancelled(self, batch_key: str, task_uuid: str):
+        """Record a task that won't add the threats, its batch will be submitted again on resume"""
+        self._write(
+            {"event": self.CANCELLED, "batch": batch_key, "task_uuid": task_uuid}
+        )
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,166 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic
+from typing import Dict, List, Tuple
+
+from datalake.common.atom import AtomType
+from datalake.endpoints.endpoint import OCD_DTL_MAX_WORKERS
+
+OCD_DTL_LOOKUP_BATCH_DELAY = float(os.getenv("OCD_DTL_LOOKUP_BATCH_DELAY", 0.005))
+
+_CLOSE = object()  # sentinel stopping the collecting thread
+
+
+class LookupBatcher:
+    """
+    Coalesce single threat lookups sent from many threads into bulk lookups.
+
+    Each lookup is buffered for at most max_delay seconds, or until max_batch_size atoms are buffered,
+    then all the buffered atoms are looked up with a single threats-bulk-lookup request.
+    Each caller gets its own row of the bulk lookup response.
+
+    Usage:
+    >>> with LookupBatcher(dtl.Threats) as batcher:
+    ...     future = batcher.submit('mayoclinic.org', AtomType.DOMAIN)
+    ...     future.result()
+
+    Up to max_workers bulk lookups are sent at the same time (default to the OCD_DTL_MAX_WORKERS environment variable),
+    atoms keep being buffered while a bulk lookup is being sent.
+    """
+
+    def __init__(
+        self,
+        threats,  # Threats endpoint
+        hashkey_only: bool = False,
+        max_delay: float = OCD_DTL_LOOKUP_BATCH_DELAY,
+        max_batch_size: int = None,
+        max_workers: int = None,
+    ):
+        self.threats = threats
+        self.hashkey_only = hashkey_only
+        self.max_delay = max_delay
+        self.max_batch_size = max_batch_size or threats._NB_ATOMS_PER_BULK_LOOKUP
+        self._pending = queue.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+            thread_name_prefix="ocd-dtl-lookup",
+        )
+        self._closed = False
+        self._lock = threading.Lock()
+        self._collector = threading.Thread(
+            target=self._collect, name="ocd-dtl-lookup-batcher", daemon=True
+        )
+        self._collector.start()
+
+    def submit(self, atom_value: str, atom_type: AtomType = None) -> Future:
+        """
+        Buffer the lookup of an atom and return a future of its bulk lookup row.
+
+        If atom_type is not specified, it is determined with the other untyped atoms of the batch.
+        """
+        if atom_type and not isinstance(atom_type, AtomType):
+            raise ValueError(f"{atom_type} atom_type could not be treated")
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The lookup batcher is closed")
+            self._pending.put((atom_value, atom_type, future))
+        return future
+
+    def lookup(self, atom_value: str, atom_type: AtomType = None) -> dict:
+        """Look up an atom, blocking until its bulk lookup row is received"""
+        return self.submit(atom_value, atom_type).result()
+
+    def close(self):
+        """Send the atoms still buffered and wait for all the lookups to be done"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending.put(_CLOSE)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _collect(self):
+        closing = False
+        while not closing:
+            item = self._pending.get()
+            if item is _CLOSE:
+                return
+            batch = [item]
+            deadline = monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._pending.get(timeout=max(deadline - monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._lookup_batch, batch)
+
+    def _lookup_batch(self, batch: List[Tuple[str, AtomType, Future]]):
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        try:
+            typed_atoms = self._type_atoms(batch)
+            if not typed_atoms:
+                return
+            response = self.threats._bulk_lookup_typed_atoms(
+                {
+                    atom_type: list(dict.fromkeys(atom_values))
+                    for atom_type, atom_values in typed_atoms.items()
+                },
+                hashkey_only=self.hashkey_only,
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        rows = {}
+        for atom_type, atom_rows in response.items():
+            if isinstance(atom_rows, list):
+                for row in atom_rows:
+                    rows[(atom_type, row.get("atom_value"))] = row
+        for atom_value, atom_type, future in batch:
+            if future.done():  # could not be typed
+                continue
+            row = rows.get((atom_type.value, atom_value))
+            if row is None:
+                future.set_exception(
+                    ValueError(f"no bulk lookup result for {atom_value}")
+                )
+            else:
+                future.set_result(row)
+
+    def _type_atoms(self, batch) -> Dict[str, list]:
+        """Group the atoms by type, typing the untyped ones, and fill in the atom type of each batch item"""
+        untyped_atoms = [
+            atom_value for atom_value, atom_type, _ in batch if not atom_type
+        ]
+        atom_types = {}
+        if untyped_atoms:
+            extracted = self.threats._atom_values_extract(untyped_atoms)
+            for atom_type, atom_values in extracted["results"].items():
+                for atom_value in atom_values:
+                    atom_types[atom_value] = AtomType(atom_type)
+
+        typed_atoms = {}
+        for index, (atom_value, atom_type, future) in enumerate(batch):
+            atom_type = atom_type or atom_types.get(atom_value)
+            if not atom_type:
+                future.set_exception(ValueError("atom could not be typed"))
+                continue
+            batch[index] = (atom_value, atom_type, future)
+            typed_atoms.setdefault(atom_type.value, []).append(atom_value)
+        return typed_atoms
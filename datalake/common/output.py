@@ -1,5 +1,7 @@
+import codecs
+import json
 from enum import Enum
-from typing import Set, Union
+from typing import Any, Generator, Iterable, Set, Union
 
 from requests import Response
 
@@ -35,6 +37,104 @@ def parse_response(response: Response) -> Union[str, dict]:
         return response.json()
 
 
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = " \t\n\r"
+_JSON_NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _JsonStream:
+    """Text buffer over chunks of a JSON document, only keeping the part not parsed yet"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _read(self) -> bool:
+        """Append the next chunk to the buffer, return False at the end of the document"""
+        if self._eof:
+            return False
+        self._buffer = self._buffer[self._position :]
+        self._position = 0
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self._eof = True
+            self._buffer += self._decoder.decode(b"", final=True)
+            return True
+        self._buffer += self._decoder.decode(chunk)
+        return True
+
+    def next_char(self) -> str:
+        """Skip whitespaces and return the next character without consuming it, empty at the end of the document"""
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in _JSON_WHITESPACE
+            ):
+                self._position += 1
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not self._read():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.next_char()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Invalid JSON: expected one of {chars!r}, got {char or 'end of document'!r}"
+            )
+        self._position += 1
+        return char
+
+    def value(self) -> Any:
+        """Consume and return the next JSON value"""
+        self.next_char()
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if self._read():
+                    continue
+                raise
+            # a number at the end of the buffer may continue in the next chunk, even after a "." or an "e"
+            if (
+                end < len(self._buffer) and self._buffer[end] not in _JSON_NUMBER_CHARS
+            ) or not self._read():
+                self._position = end
+                return value
+
+
+def iter_json_list(chunks: Iterable[bytes], key: str) -> Generator[Any, None, None]:
+    """
+    Parse a JSON object as its chunks are received and yield the items of its list at key one by one.
+
+    Only one item is held in memory at a time, the other values of the object are skipped.
+    """
+    stream = _JsonStream(chunks)
+    stream.expect("{")
+    if stream.next_char() == "}":
+        return
+    while True:
+        current_key = stream.value()
+        stream.expect(":")
+        if current_key == key:
+            stream.expect("[")
+            if stream.next_char() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield stream.value()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            stream.value()
+        if stream.expect(",}") == "}":
+            return
+
+
 def display_outputs(outputs):
     return ", ".join(sorted([str(output) for output in outputs]))
 
@@ -0,0 +1,64 @@
+import datetime
+import os
+from abc import ABC, abstractmethod
+
+OCD_DTL_MAX_BACK_OFF_TIME = float(os.getenv("OCD_DTL_MAX_BACK_OFF_TIME", 10))
+OCD_DTL_MIN_BACK_OFF_TIME = min(
+    float(os.getenv("OCD_DTL_MIN_BACK_OFF_TIME", 1)), OCD_DTL_MAX_BACK_OFF_TIME
+)
+
+
+class PollingStrategy(ABC):
+    """
+    Decide how long to wait before polling a running bulk search task again.
+
+    Subclass it and implement next_interval to plug in another strategy.
+    """
+
+    @abstractmethod
+    def next_interval(self, task: "BulkSearchTask") -> float:
+        """Return the number of seconds to wait before the next poll of task"""
+        pass
+
+
+class FixedPolling(PollingStrategy):
+    """Poll every interval seconds"""
+
+    def __init__(self, interval: float = OCD_DTL_MAX_BACK_OFF_TIME):
+        self.interval = interval
+
+    def next_interval(self, task: "BulkSearchTask") -> float:
+        return self.interval
+
+
+class AdaptivePolling(PollingStrategy):
+    """
+    Poll a task around the time it should be done, between min_interval and max_interval seconds.
+
+    The end of the task is guessed from its eta, or from its progress since it started.
+    A task waiting in the queue is polled every max_interval seconds, a task just created every min_interval seconds.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = OCD_DTL_MIN_BACK_OFF_TIME,
+        max_interval: float = OCD_DTL_MAX_BACK_OFF_TIME,
+    ):
+        if min_interval > max_interval:
+            raise ValueError("min_interval can't be greater than max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+    def next_interval(self, task: "BulkSearchTask") -> float:
+        # the API timestamps are parsed as naive UTC datetimes
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        if task.eta:
+            interval = (task.eta - now).total_seconds()
+        elif task.started_at and task.progress:
+            elapsed = (now - task.started_at).total_seconds()
+            interval = elapsed * (100 - task.progress) / task.progress
+        elif task.queue_position:
+            interval = self.max_interval
+        else:
+            interval = self.min_interval
+        return min(max(interval, self.min_interval), self.max_interval)
@@ -0,0 +1,120 @@
+import datetime
+from abc import ABC, abstractmethod
+from typing import List
+
+from datalake.common.atom import AtomType
+from datalake.common.utils import format_normalized_timestamp
+
+
+class QueryShard(ABC):
+    """
+    Part of a bulk search, selected by a filter added to the query body of the bulk search.
+
+    Subclasses define the filter and how to split the shard when its bulk search has too many results.
+    """
+
+    @abstractmethod
+    def filter(self) -> dict:
+        pass
+
+    @abstractmethod
+    def split(self) -> List["QueryShard"]:
+        """Return the smaller shards covering this one, or an empty list if it can't be split"""
+        pass
+
+    def query_body(self, query_body: dict) -> dict:
+        """Return query_body restricted to this shard"""
+        shard_group = {"AND": [self.filter()]}
+        if list(query_body) == ["AND"]:
+            return {"AND": query_body["AND"] + [shard_group]}
+        return {"AND": [query_body, shard_group]}
+
+
+class TimeRangeShard(QueryShard):
+    """Threats whose field (first_seen or last_updated) is in [start, end)"""
+
+    FIELDS = ("first_seen", "last_updated")
+
+    def __init__(
+        self,
+        field: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        min_duration: datetime.timedelta = datetime.timedelta(minutes=1),
+    ):
+        if field not in self.FIELDS:
+            raise ValueError(f"field needs to be one of {', '.join(self.FIELDS)}")
+        if start >= end:
+            raise ValueError("start needs to be before end")
+        self.field = field
+        self.start = start
+        self.end = end
+        self.min_duration = min_duration
+
+    @classmethod
+    def windows(
+        cls,
+        field: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        window: datetime.timedelta,
+        **kwargs,
+    ) -> List["TimeRangeShard"]:
+        """Split [start, end) in consecutive shards of window duration"""
+        if window <= datetime.timedelta(0):
+            raise ValueError("The time window needs to be positive")
+        shards = []
+        while start < end:
+            shards.append(cls(field, start, min(start + window, end), **kwargs))
+            start += window
+        return shards
+
+    def filter(self) -> dict:
+        return {
+            "field": self.field,
+            "range": {
+                "gte": format_normalized_timestamp(self.start),
+                "lt": format_normalized_timestamp(self.end),
+            },
+            "type": "filter",
+        }
+
+    def split(self) -> List["TimeRangeShard"]:
+        if self.end - self.start < 2 * self.min_duration:
+            return []
+        middle = self.start + (self.end - self.start) / 2
+        return [
+            TimeRangeShard(self.field, self.start, middle, self.min_duration),
+            TimeRangeShard(self.field, middle, self.end, self.min_duration),
+        ]
+
+    def __repr__(self):
+        return f"TimeRangeShard({self.field}, {self.start}, {self.end})"
+
+
+class AtomTypeShard(QueryShard):
+    """Threats of one of the atom_types"""
+
+    def __init__(self, atom_types: List[AtomType]):
+        if not atom_types:
+            raise ValueError("At least one atom type is required")
+        self.atom_types = list(atom_types)
+
+    def filter(self) -> dict:
+        return {
+            "field": "atom_type",
+            "multi_values": [atom_type.value for atom_type in self.atom_types],
+            "type": "filter",
+        }
+
+    def split(self) -> List["AtomTypeShard"]:
+        if len(self.atom_types) < 2:
+            return []
+        middle = len(self.atom_types) // 2
+        return [
+            AtomTypeShard(self.atom_types[:middle]),
+            AtomTypeShard(self.atom_types[middle:]),
+        ]
+
+    def __repr__(self):
+        return f"AtomTypeShard({', '.join(str(t.value) for t in self.atom_types)})"
@@ -0,0 +1,101 @@
+import gzip
+import heapq
+import json
+import sys
+import tempfile
+from contextlib import ExitStack
+from typing import Callable, Generator, Iterable, Sequence
+
+from datalake.common.utils import split_iterable
+
+SNAPSHOT_EXTENSION = ".ndjson.gz"
+COMPRESS_LEVEL = 6
+SORT_CHUNK_SIZE = 1000000
+
+
+def is_snapshot(file_path: str) -> bool:
+    return file_path.endswith(SNAPSHOT_EXTENSION)
+
+
+def write_snapshot(file_path: str, header: dict, rows: Iterable[Sequence]):
+    """Write a gzip compressed snapshot of header then rows, one compact json row per line in the given order"""
+    with gzip.open(
+        file_path, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL
+    ) as snapshot_file:
+        snapshot_file.write(json.dumps(header, sort_keys=True) + "\n")
+        for row in rows:
+            snapshot_file.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+
+def save_snapshot(
+    file_path: str,
+    bulk_search_result: dict,
+    sort_key: Callable[[Sequence], str] = None,
+):
+    """
+    Save a bulk search JSON result as a gzip compressed snapshot.
+
+    The first line holds every key of the result but its results, then each row is written on its own line,
+    without indentation and sorted by sort_key, so that similar rows compress together.
+    """
+    header = {
+        key: value for key, value in bulk_search_result.items() if key != "results"
+    }
+    write_snapshot(
+        file_path, header, sorted(bulk_search_result["results"], key=sort_key)
+    )
+
+
+def write_sorted_snapshot(
+    file_path: str,
+    header: dict,
+    rows: Iterable[Sequence],
+    sort_key: Callable[[Sequence], str] = None,
+):
+    """
+    Write a snapshot of rows sorted by sort_key, holding no more than SORT_CHUNK_SIZE rows in memory.
+
+    The rows are sorted SORT_CHUNK_SIZE at a time, the sorted chunks are spilled to temporary files
+    when there are several of them, then merged while the snapshot is written.
+    """
+    with ExitStack() as stack:
+        sorted_chunks = []
+        last_chunk = []
+        for rows_chunk in split_iterable(rows, SORT_CHUNK_SIZE):
+            if last_chunk:
+                sorted_chunks.append(_spill_rows(stack, last_chunk))
+            last_chunk = sorted(rows_chunk, key=sort_key)
+        sorted_chunks.append(last_chunk)
+        write_snapshot(file_path, header, heapq.merge(*sorted_chunks, key=sort_key))
+
+
+def _spill_rows(stack: ExitStack, rows: Iterable[Sequence]) -> Generator:
+    spill_file = stack.enter_context(tempfile.TemporaryFile("w+", encoding="utf-8"))
+    for row in rows:
+        spill_file.write(json.dumps(row, separators=(",", ":")) + "\n")
+    spill_file.seek(0)
+    return (json.loads(line) for line in spill_file)
+
+
+def read_snapshot_header(file_path: str) -> dict:
+    with gzip.open(file_path, "rt", encoding="utf-8") as snapshot_file:
+        return json.loads(snapshot_file.readline())
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def iter_snapshot_rows(file_path: str) -> Generator[list, None, None]:
+    """Yield the rows of a snapshot one at a time, their strings interned"""
+    with gzip.open(file_path, "rt", encoding="utf-8") as snapshot_file:
+        snapshot_file.readline()  # header
+        for line in snapshot_file:
+            yield [_intern(value) for value in json.loads(line)]
+
+
+def load_snapshot(file_path: str) -> dict:
+    """Return the bulk search JSON result saved in a snapshot"""
+    bulk_search_result = read_snapshot_header(file_path)
+    bulk_search_result["results"] = list(iter_snapshot_rows(file_path))
+    return bulk_search_result
@@ -0,0 +1,88 @@
+import codecs
+import csv
+import functools
+import shutil
+import zipfile
+from typing import BinaryIO, Generator, Iterable
+
+from datalake.common.output import Output, iter_json_list
+
+ZIP_OUTPUTS = (Output.JSON_ZIP, Output.CSV_ZIP, Output.STIX_ZIP)
+CHUNK_SIZE = 1024 * 1024
+
+
+def _iter_lines(chunks: Iterable[bytes]) -> Generator[str, None, None]:
+    """Decode utf-8 chunks and yield their lines, line endings included"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _iter_file_items(result_file: BinaryIO, output: Output, query_fields: list):
+    chunks = iter(functools.partial(result_file.read, CHUNK_SIZE), b"")
+    if output in (Output.CSV, Output.CSV_ZIP):
+        yield from csv.DictReader(_iter_lines(chunks))
+    elif output == Output.STIX_ZIP:
+        yield from iter_json_list(chunks, "objects")
+    else:
+        for row in iter_json_list(chunks, "results"):
+            yield dict(zip(query_fields, row))
+
+
+def iter_result_file(
+    result_file: BinaryIO, output: Output, query_fields: list
+) -> Generator[dict, None, None]:
+    """
+    Yield the content of a bulk search result file one item at a time, decompressing zip archives while reading them.
+
+    JSON and JSON_ZIP yield the threats keyed by query_fields, CSV and CSV_ZIP yield the CSV rows keyed by the
+    CSV header and STIX_ZIP yields the STIX objects of each bundle.
+    """
+    if output not in ZIP_OUTPUTS:
+        yield from _iter_file_items(result_file, output, query_fields)
+        return
+    with zipfile.ZipFile(result_file) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            with archive.open(member) as member_file:
+                yield from _iter_file_items(member_file, output, query_fields)
+
+
+class SpooledResult:
+    """
+    Bulk search result stored in a temporary file instead of memory.
+
+    Iterate over it to get the results one by one, see iter_result_file for the items yielded by each output.
+    Use save to copy the raw result to a file and close to delete the temporary file.
+    """
+
+    def __init__(self, spool: BinaryIO, output: Output, query_fields: list):
+        self.spool = spool
+        self.output = output
+        self.query_fields = query_fields
+
+    def __iter__(self):
+        self.spool.seek(0)
+        return iter_result_file(self.spool, self.output, self.query_fields)
+
+    def save(self, output_path: str):
+        self.spool.seek(0)
+        with open(output_path, "wb") as output_file:
+            shutil.copyfileobj(self.spool, output_file, CHUNK_SIZE)
+
+    def close(self):
+        self.spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
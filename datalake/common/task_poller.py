@@ -0,0 +1,90 @@
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic, sleep
+from typing import Callable, Dict, Optional
+
+
+class TaskPoller:
+    """
+    Track several asynchronous API tasks together and poll them until they finish.
+
+    Each task has its own exponential back-off, starting at initial_back_off_time and capped at max_back_off_time.
+    The task due the soonest is always polled first, tasks due at the same time are polled in the order they were added.
+    poll is called with a task uuid and returns the final API response of the task, or None while it is still running.
+    A task still running after timeout seconds is given up, its result is None.
+    """
+
+    def __init__(
+        self,
+        poll: Callable[[str], Optional[dict]],
+        timeout: float,
+        max_back_off_time: float,
+        initial_back_off_time: float = 1,
+    ):
+        self.poll = poll
+        self.timeout = timeout
+        self.max_back_off_time = max_back_off_time
+        self.initial_back_off_time = min(initial_back_off_time, max_back_off_time)
+        self.results: Dict[str, Optional[dict]] = {}
+        # (next poll time, insertion order, task uuid, back-off time, deadline)
+        self._schedule = []
+        self._insertion_order = count()
+
+    def __len__(self):
+        """Number of tasks still running"""
+        return len(self._schedule)
+
+    def add(self, task_uuid: str):
+        """Track a new task, it is due right away"""
+        now = monotonic()
+        heappush(
+            self._schedule,
+            (
+                now,
+                next(self._insertion_order),
+                task_uuid,
+                self.initial_back_off_time,
+                now + self.timeout,
+            ),
+        )
+
+    def poll_due(self):
+        """Poll the tasks that are due, without waiting"""
+        while self._schedule and self._schedule[0][0] <= monotonic():
+            self._poll_next()
+
+    def wait_for_one(self) -> Optional[str]:
+        """Poll the tasks, waiting between polls, until one of them finishes and return its uuid"""
+        while self._schedule:
+            wait_time = self._schedule[0][0] - monotonic()
+            if wait_time > 0:
+                sleep(wait_time)
+            finished_task_uuid = self._poll_next()
+            if finished_task_uuid:
+                return finished_task_uuid
+        return None
+
+    def wait_for_all(self) -> Dict[str, Optional[dict]]:
+        """Poll the tasks until all of them are finished and return their results"""
+        while self._schedule:
+            self.wait_for_one()
+        return self.results
+
+    def _poll_next(self) -> Optional[str]:
+        _, insertion_order, task_uuid, back_off_time, deadline = heappop(self._schedule)
+        result = self.poll(task_uuid)
+        now = monotonic()
+        if result is None and now + back_off_time < deadline:
+            heappush(
+                self._schedule,
+                (
+                    now + back_off_time,
+                    insertion_order,
+                    task_uuid,
+                    min(back_off_time * 2, self.max_back_off_time),
+                    deadline,
+                ),
+            )
+            return None
+        self.results[task_uuid] = result
+        return task_uuid
@@ -1,8 +1,63 @@
+import asyncio
 import random
-from time import sleep, time
-from typing import Callable, Dict, List
+import threading
+from collections import deque
+from time import monotonic, sleep, time
 
-THROTTLE_QUEUE: Dict[Callable[[], None], List[float]] = {}
+
+class RateLimiter:
+    """
+    Sliding window log allowing call_per_period calls in any window of period seconds
+
+    The limiter is thread safe and can be shared by all the endpoints (and threads) using the same credentials.
+    A caller reserves its time slot before waiting for it, so concurrent callers never exceed the quota.
+
+    :param period: time in seconds
+    :param call_per_period: number of calls allowed during the period
+    """
+
+    def __init__(self, *, period: float, call_per_period: int):
+        if period <= 0 or call_per_period < 1:
+            raise ValueError("period and call_per_period need to be positive")
+        self.period = period
+        self.call_per_period = call_per_period
+        # time slots of the last call_per_period calls, some may be reserved in the future
+        self._slots = deque(maxlen=call_per_period)
+        self._lock = threading.Lock()
+
+    def _next_slot(self, now: float) -> float:
+        if len(self._slots) < self.call_per_period:
+            return now
+        return max(now, self._slots[0] + self.period)
+
+    def _reserve(self) -> float:
+        """Reserve a time slot, even if it is not available yet, and return the time to wait before using it"""
+        with self._lock:
+            now = monotonic()
+            slot = self._next_slot(now)
+            self._slots.append(slot)
+            return slot - now
+
+    def try_acquire(self) -> bool:
+        """Take a time slot if one is available right now, never waits"""
+        with self._lock:
+            now = monotonic()
+            if self._next_slot(now) > now:
+                return False
+            self._slots.append(now)
+            return True
+
+    def acquire(self):
+        """Take a time slot, blocking the current thread until it is available"""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            sleep(wait_time)
+
+    async def acquire_async(self):
+        """Take a time slot, suspending the current coroutine until it is available"""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
 
 
 def throttle(*, period: int, call_per_period: int):
@@ -14,25 +69,11 @@ def throttle(*, period: int, call_per_period: int):
     """
 
     def inner_decorator(f):
+        rate_limiter = RateLimiter(period=period, call_per_period=call_per_period)
+
         def wrapped(*args, **kwargs):
-            previous_call = THROTTLE_QUEUE.get(f, [])
-            call_time = time()
-
-            # Clear calls made older than the given period
-            while previous_call and previous_call[0] + period <= call_time:
-                previous_call.pop(0)
-            # Check if the number of call for the period don't allow the function to be called
-            if len(previous_call) >= call_per_period:
-                time_since_first_call = call_time - previous_call[0]
-                sleep(
-                    max(period - time_since_first_call, 0.1)
-                )  # Wait until a call has been made 'period' ago
-                assert previous_call[0] + period <= time()
-                previous_call.pop(0)
-            previous_call.append(time())
-            THROTTLE_QUEUE[f] = previous_call
-            response = f(*args, **kwargs)
-            return response
+            rate_limiter.acquire()
+            return f(*args, **kwargs)
 
         return wrapped
 
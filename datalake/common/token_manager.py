@@ -4,6 +4,7 @@ Token manager will manage tokens for the scripts.
 
 import json
 import os
+import threading
 from getpass import getpass
 from urllib.parse import urljoin
 
@@ -28,6 +29,7 @@ class TokenManager:
         longterm_token=None,
         proxies: dict = None,
         verify: bool = True,
+        session: requests.Session = None,
     ):
         """environment can be either prod or preprod"""
         base_url = urljoin(
@@ -45,8 +47,11 @@ class TokenManager:
         self.longterm_token = longterm_token
         self.proxies = proxies
         self.verify = verify
+        self.session = session or requests.Session()
         self.access_token = None
         self.refresh_token = None
+        # a single refresh at a time, the requests rejected with the same token wait for it
+        self._lock = threading.RLock()
         self.get_token()
 
     def get_token(self):
@@ -87,7 +92,7 @@ class TokenManager:
         else:
             data = {"email": self.username, "password": self.password}
 
-            response = requests.post(
+            response = self.session.post(
                 url=self.url_token, json=data, proxies=self.proxies, verify=self.verify
             )
             json_response = json.loads(response.text)
@@ -104,7 +109,7 @@ class TokenManager:
     def fetch_new_token(self):
         self.logger.debug("Token will be refreshed")
         headers = {"Authorization": self.refresh_token}
-        response = requests.post(
+        response = self.session.post(
             url=self.url_refresh,
             headers=headers,
             proxies=self.proxies,
@@ -128,10 +133,22 @@ class TokenManager:
             )
             raise ValueError(f"Could not refresh the token: {response.text}")
 
-    def process_auth_error(self, json_resp: dict):
+    def process_auth_error(self, json_resp: dict, used_token: str = None):
         """
         Allow to update token when API response is either Missing Authorization Header or Token has expired.
+
+        used_token is the Authorization header of the rejected request: if the token has been updated since then,
+        by another thread, it is not updated again.
         """
+        with self._lock:
+            if used_token is not None and used_token != (
+                self.access_token or self.longterm_token
+            ):
+                self.logger.debug("Token already updated by another request")
+                return
+            self._process_auth_error(json_resp)
+
+    def _process_auth_error(self, json_resp: dict):
         error_msg = get_error_message(json_resp)
         if error_msg in (
             "Missing Authorization Header",
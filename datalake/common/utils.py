@@ -1,7 +1,21 @@
 import datetime
 import json
-from collections import defaultdict
-from typing import Dict, Optional, Generator
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+NORMALIZED_TIMESTAMP = "%Y-%m-%dT%H:%M:%S.%fZ"
 
 
 def join_dicts(*dicts: dict) -> Dict[str, list]:
@@ -18,7 +32,99 @@ def join_dicts(*dicts: dict) -> Dict[str, list]:
     return out
 
 
+def _csv_lines(csv_response: str) -> List[str]:
+    """Lines of a CSV API response, the first one being its header, none for an empty response"""
+    csv_response = csv_response.strip()
+    return csv_response.split("\n") if csv_response else []
+
+
+class CsvHeaderDedupWriter:
+    """
+    Write several CSV API responses to a file as a single CSV, only the header of the first response is kept.
+
+    Responses are written as they come, nothing is kept in memory.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self.header = None
+        self.count = 0  # number of rows written, header excluded
+
+    def write(self, csv_response: str):
+        csv_lines = _csv_lines(csv_response)
+        if not csv_lines:
+            return
+        if self.header is None:
+            self.header = csv_lines[0]
+            self.file.write(f"{self.header}\n")
+        for csv_line in islice(csv_lines, 1, None):
+            self.file.write(f"{csv_line}\n")
+            self.count += 1
+
+
+class JsonListWriter:
+    """
+    Write the items of several JSON lists to a file as a single JSON list.
+
+    Items are written as they come, call close once all the lists are written.
+    """
+
+    def __init__(self, file: TextIO):
+        self.file = file
+        self.count = 0
+        self.file.write("[")
+
+    def write(self, items: list):
+        for item in items:
+            self.file.write(",\n" if self.count else "\n")
+            self.file.write(json.dumps(item))
+            self.count += 1
+
+    def close(self):
+        self.file.write("\n]" if self.count else "]")
+
+
+class ResponseAggregator:
+    """
+    Merge the JSON or CSV API responses of several batches in place.
+
+    JSON responses are dictionaries of lists, extended key by key.
+    CSV responses are joined with the header of the first non empty response only, the first line of every
+    other response being its header.
+    Each response is copied once, so aggregating N batches is linear in the size of the responses.
+    """
+
+    def __init__(self):
+        self._json_response = defaultdict(list)
+        self._csv_lines = []
+        self._csv_header_seen = False
+
+    def add(self, response: Union[dict, str]):
+        if isinstance(response, dict):  # json response
+            for key, val in response.items():
+                self._json_response[key].extend(val)
+        else:  # csv response
+            csv_lines = _csv_lines(response)
+            if not csv_lines:
+                return
+            self._csv_lines.extend(
+                islice(csv_lines, 1 if self._csv_header_seen else 0, None)
+            )
+            self._csv_header_seen = True
+
+    def json(self) -> Dict[str, list]:
+        return dict(self._json_response)
+
+    def csv(self) -> str:
+        return "\n".join(self._csv_lines)
+
+
 def aggregate_csv_or_json_api_response(aggregated_response, response):
+    """
+    Return the aggregation of two responses, copying both of them.
+
+    Prefer a ResponseAggregator when merging more than a few responses.
+    """
     if isinstance(response, dict):  # json response
         aggregated_response = join_dicts(aggregated_response, response)
     else:  # csv response
@@ -38,11 +144,95 @@ def parse_api_timestamp(timestamp: str) -> Optional[datetime.datetime]:
     return None
 
 
+def split_time_range(
+    normalized_timestamp_since: str,
+    normalized_timestamp_until: str,
+    window: datetime.timedelta,
+) -> List[Tuple[str, str]]:
+    """
+    Split a range of normalized timestamps in consecutive windows of the given duration.
+
+    Both bounds of each window are included, the last window ends at normalized_timestamp_until.
+    """
+    if window <= datetime.timedelta(0):
+        raise ValueError("The time window needs to be positive")
+    since = datetime.datetime.strptime(normalized_timestamp_since, NORMALIZED_TIMESTAMP)
+    until = datetime.datetime.strptime(normalized_timestamp_until, NORMALIZED_TIMESTAMP)
+    one_ms = datetime.timedelta(milliseconds=1)
+    time_ranges = []
+    while since + window <= until:
+        time_ranges.append((since, since + window - one_ms))
+        since += window
+    if since <= until or not time_ranges:
+        time_ranges.append((since, until))
+    return [
+        (format_normalized_timestamp(start), format_normalized_timestamp(end))
+        for start, end in time_ranges
+    ]
+
+
+def format_normalized_timestamp(timestamp: datetime.datetime) -> str:
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
 def split_list(list_to_split: list, slice_size: int) -> Generator[list, None, None]:
     for i in range(0, len(list_to_split), slice_size):
         yield list_to_split[i : i + slice_size]
 
 
+def split_iterable(
+    iterable_to_split: Iterable, slice_size: int
+) -> Generator[list, None, None]:
+    """Same as split_list but only consumes the iterable one slice at a time"""
+    iterator = iter(iterable_to_split)
+    while True:
+        batch = list(islice(iterator, slice_size))
+        if not batch:
+            return
+        yield batch
+
+
+def concurrent_map(
+    function: Callable, iterable: Iterable, max_workers: int = 1, ordered=False
+) -> Generator:
+    """
+    Call function on each item of the iterable using up to max_workers threads and yield the results.
+
+    Results are yielded as soon as they are available, or in the order of the iterable if ordered is set.
+    Items are consumed lazily: no more than twice max_workers calls are pending at any time.
+    An exception raised by a call is raised when its result is reached.
+    """
+    if max_workers <= 1:
+        for item in iterable:
+            yield function(item)
+        return
+
+    max_pending = 2 * max_workers
+    iterator = iter(iterable)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        if ordered:
+            pending = deque(
+                executor.submit(function, item)
+                for item in islice(iterator, max_pending)
+            )
+            while pending:
+                future = pending.popleft()
+                for item in islice(iterator, 1):
+                    pending.append(executor.submit(function, item))
+                yield future.result()
+        else:
+            pending = {
+                executor.submit(function, item)
+                for item in islice(iterator, max_pending)
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for item in islice(iterator, len(done)):
+                    pending.add(executor.submit(function, item))
+                for future in done:
+                    yield future.result()
+
+
 def get_error_message(resp_body: dict):
     if "msg" in resp_body:
         return resp_body.get("msg")
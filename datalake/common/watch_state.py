@@ -0,0 +1,172 @@
+import datetime
+import sqlite3
+from typing import Generator, Iterable, Optional, Sequence
+
+from datalake.common.utils import split_iterable
+
+_INSERT_BATCH_SIZE = 10000
+
+
+class WatchStateStore:
+    """
+    SQLite store of the threats currently matching each watched query hash.
+
+    Each threat is kept with the first and last time it was seen by a watch run. apply_run computes the difference
+    between a new run and the stored threats in the database, without loading them, and only writes that difference:
+    the last_seen of the threats still matching is the last run of the watch, it is only stored once they are removed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS watches (
+                    query_hash TEXT PRIMARY KEY,
+                    last_run TIMESTAMP NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS threats (
+                    query_hash TEXT NOT NULL,
+                    atom_value TEXT NOT NULL,
+                    threat_hashkey TEXT NOT NULL,
+                    first_seen TIMESTAMP NOT NULL,
+                    last_seen TIMESTAMP,  -- NULL while the threat still matches
+                    PRIMARY KEY (query_hash, atom_value, threat_hashkey)
+                );
+                """
+            )
+
+    def last_run(self, query_hash: str) -> Optional[datetime.datetime]:
+        row = self._connection.execute(
+            "SELECT last_run FROM watches WHERE query_hash = ?", (query_hash,)
+        ).fetchone()
+        return datetime.datetime.fromisoformat(row[0]) if row else None
+
+    def threats(
+        self, query_hash: str, include_removed: bool = False
+    ) -> Generator[tuple, None, None]:
+        """Yield (atom_value, threat_hashkey, first_seen, last_seen) for each threat matching query_hash"""
+        last_run = self.last_run(query_hash)
+        query = (
+            "SELECT atom_value, threat_hashkey, first_seen, last_seen FROM threats "
+            "WHERE query_hash = ?"
+        )
+        if not include_removed:
+            query += " AND last_seen IS NULL"
+        cursor = self._connection.execute(
+            query + " ORDER BY atom_value, threat_hashkey", (query_hash,)
+        )
+        for atom_value, threat_hashkey, first_seen, last_seen in cursor:
+            yield (
+                atom_value,
+                threat_hashkey,
+                datetime.datetime.fromisoformat(first_seen),
+                datetime.datetime.fromisoformat(last_seen) if last_seen else last_run,
+            )
+
+    def apply_run(
+        self,
+        query_hash: str,
+        threats: Iterable[Sequence[str]],
+        run_datetime: datetime.datetime,
+    ) -> dict:
+        """
+        Store the (atom_value, threat_hashkey) threats found by a watch run of query_hash.
+
+        Return the threats added and removed since the previous run, in the same format as SearchWatch.threats_diff,
+        or an empty dict for the first run of query_hash.
+        """
+        previous_run = self.last_run(query_hash)
+        run_timestamp = run_datetime.isoformat()
+        with self._connection:
+            self._connection.execute(
+                "CREATE TEMPORARY TABLE IF NOT EXISTS current_run "
+                "(atom_value TEXT NOT NULL, threat_hashkey TEXT NOT NULL, "
+                "PRIMARY KEY (atom_value, threat_hashkey))"
+            )
+            self._connection.execute("DELETE FROM current_run")
+            for threats_batch in split_iterable(threats, _INSERT_BATCH_SIZE):
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO current_run VALUES (?, ?)",
+                    (tuple(threat) for threat in threats_batch),
+                )
+
+            if previous_run is None:
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO threats "
+                    "SELECT ?, atom_value, threat_hashkey, ?, NULL FROM current_run",
+                    (query_hash, run_timestamp),
+                )
+            else:
+                added_threats = set(
+                    self._connection.execute(
+                        "SELECT atom_value, threat_hashkey FROM current_run AS c WHERE NOT EXISTS ("
+                        "SELECT 1 FROM threats AS t WHERE t.query_hash = ? AND t.atom_value = c.atom_value "
+                        "AND t.threat_hashkey = c.threat_hashkey AND t.last_seen IS NULL)",
+                        (query_hash,),
+                    )
+                )
+                removed_threats = set(
+                    self._connection.execute(
+                        "SELECT atom_value, threat_hashkey FROM threats AS t "
+                        "WHERE t.query_hash = ? AND t.last_seen IS NULL AND NOT EXISTS ("
+                        "SELECT 1 FROM current_run AS c WHERE c.atom_value = t.atom_value "
+                        "AND c.threat_hashkey = t.threat_hashkey)",
+                        (query_hash,),
+                    )
+                )
+                # only the difference is written
+                self._connection.executemany(
+                    "UPDATE threats SET last_seen = ? "
+                    "WHERE query_hash = ? AND atom_value = ? AND threat_hashkey = ?",
+                    (
+                        (
+                            previous_run.isoformat(),
+                            query_hash,
+                            atom_value,
+                            threat_hashkey,
+                        )
+                        for atom_value, threat_hashkey in removed_threats
+                    ),
+                )
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO threats VALUES (?, ?, ?, COALESCE(("
+                    "SELECT first_seen FROM threats "
+                    "WHERE query_hash = ? AND atom_value = ? AND threat_hashkey = ?), ?), NULL)",
+                    (
+                        (
+                            query_hash,
+                            atom_value,
+                            threat_hashkey,
+                            query_hash,
+                            atom_value,
+                            threat_hashkey,
+                            run_timestamp,
+                        )
+                        for atom_value, threat_hashkey in added_threats
+                    ),
+                )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO watches VALUES (?, ?)",
+                (query_hash, run_timestamp),
+            )
+            self._connection.execute("DELETE FROM current_run")
+
+        if previous_run is None:
+            return {}
+        return {
+            "from": previous_run.strftime("%Y-%m-%d %H:%M:%S"),
+            "to": run_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            "added": added_threats if added_threats else {},
+            "removed": removed_threats if removed_threats else {},
+        }
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,9 +2,22 @@ import logging
 
 from datalake.common.config import Config
 from datalake.common.logger import configure_logging
+from datalake.common.throttler import RateLimiter
 from datalake.common.token_manager import TokenManager
+from datalake.endpoints.endpoint import (
+    OCD_DTL_KEEP_ALIVE,
+    OCD_DTL_POOL_BLOCK,
+    OCD_DTL_POOL_CONNECTIONS,
+    OCD_DTL_POOL_MAXSIZE,
+    OCD_DTL_QUOTA_TIME,
+    OCD_DTL_REQUESTS_PER_QUOTA_TIME,
+    build_session,
+)
 from datalake.endpoints.threats import Threats
-from datalake.endpoints.bulk_search import BulkSearch
+from datalake.endpoints.bulk_search import (
+    OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES,
+    BulkSearch,
+)
 from datalake.endpoints.comments import Comments
 from datalake.endpoints.tags import Tags
 from datalake.endpoints.advanced_search import AdvancedSearch
@@ -12,6 +25,7 @@ from datalake.endpoints.sightings import Sightings
 from datalake.endpoints.sources import Sources
 from datalake.endpoints.filtered_threat_entity import FilteredThreatEntity
 from datalake.endpoints.my_account import MyAccount
+from datalake.miscellaneous.delta_fetch import DeltaFetch
 from datalake.miscellaneous.search_watch import SearchWatch
 
 
@@ -36,8 +50,26 @@ class Datalake:
         log_level=logging.WARNING,
         proxies: dict = None,
         verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        pool_connections: int = OCD_DTL_POOL_CONNECTIONS,
+        pool_maxsize: int = OCD_DTL_POOL_MAXSIZE,
+        pool_block: bool = OCD_DTL_POOL_BLOCK,
+        keep_alive: bool = OCD_DTL_KEEP_ALIVE,
+        max_in_memory_result_bytes: int = OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES,
     ):
         self.logger = configure_logging(log_level)
+        # All endpoints share the same connection pools
+        self.session = build_session(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            keep_alive=keep_alive,
+        )
+        # One quota per instance, pass the same rate_limiter to several instances using the same credentials
+        self.rate_limiter = rate_limiter or RateLimiter(
+            period=OCD_DTL_QUOTA_TIME,
+            call_per_period=OCD_DTL_REQUESTS_PER_QUOTA_TIME,
+        )
         endpoint_config = Config().load_config()
         try:
             token_manager = TokenManager(
@@ -49,6 +81,7 @@ class Datalake:
                 longterm_token=longterm_token,
                 proxies=proxies,
                 verify=verify,
+                session=self.session,
             )
         except Exception as e:
             if "Failed to resolve" in str(e) or "Failed to establish" in str(e):
@@ -66,6 +99,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.AdvancedSearch = AdvancedSearch(
             self.logger,
@@ -74,6 +109,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.BulkSearch = BulkSearch(
             self.logger,
@@ -82,6 +119,9 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
+            max_in_memory_result_bytes=max_in_memory_result_bytes,
         )
         self.FilteredThreatEntity = FilteredThreatEntity(
             self.logger,
@@ -90,6 +130,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.Comments = Comments(
             self.logger,
@@ -98,6 +140,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.Tags = Tags(
             self.logger,
@@ -106,6 +150,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.Sources = Sources(
             self.logger,
@@ -114,6 +160,8 @@ class Datalake:
             token_manager,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.Threats = Threats(
             self.logger,
@@ -123,6 +171,8 @@ class Datalake:
             self.Sources,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         self.Sightings = Sightings(
             self.logger,
@@ -132,8 +182,22 @@ class Datalake:
             self.Threats,
             proxies=proxies,
             verify=verify,
+            rate_limiter=self.rate_limiter,
+            session=self.session,
         )
         # Miscellaneous
-        self.SearchWatch = SearchWatch(self.logger, self.BulkSearch)
+        self.DeltaFetch = DeltaFetch(self.logger, self.BulkSearch, self.AdvancedSearch)
+        self.SearchWatch = SearchWatch(self.logger, self.BulkSearch, self.DeltaFetch)
 
         self.logger.debug("This is a debug message after init of dtl")
+
+    def close(self):
+        """Release the files and connections held by the instance"""
+        self.Threats.close()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,129 @@
+"""
+Asyncio counterparts of the endpoints, used by AsyncDatalake
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor
+
+from datalake.endpoints.advanced_search import AdvancedSearch
+from datalake.endpoints.bulk_search import BulkSearch
+from datalake.endpoints.comments import Comments
+from datalake.endpoints.endpoint import Endpoint
+from datalake.endpoints.filtered_threat_entity import FilteredThreatEntity
+from datalake.endpoints.my_account import MyAccount
+from datalake.endpoints.sightings import Sightings
+from datalake.endpoints.sources import Sources
+from datalake.endpoints.tags import Tags
+from datalake.endpoints.threats import Threats
+
+
+def _async_mirror(function):
+    """Expose a blocking endpoint method as a coroutine running on the executor of the async endpoint"""
+
+    @functools.wraps(function)
+    async def wrapper(self, *args, **kwargs):
+        return await self._run(function, self._endpoint, *args, **kwargs)
+
+    return wrapper
+
+
+_END = object()
+
+
+def _async_iter_mirror(function):
+    """Expose a blocking endpoint generator as an async generator, each item is produced on the executor"""
+
+    @functools.wraps(function)
+    async def wrapper(self, *args, **kwargs):
+        iterator = function(self._endpoint, *args, **kwargs)
+        try:
+            while True:
+                item = await self._run(next, iterator, _END)
+                if item is _END:
+                    return
+                yield item
+        finally:
+            await self._run(iterator.close)
+
+    return wrapper
+
+
+class AsyncEndpoint:
+    """
+    Wrap a blocking endpoint so its methods can be awaited from an event loop.
+
+    Requests are sent from a bounded executor shared by every async endpoint of an AsyncDatalake,
+    the throttling, retries and tokens are the ones of the wrapped endpoint.
+    """
+
+    def __init__(self, endpoint: Endpoint, executor: Executor):
+        self._endpoint = endpoint
+        self._executor = executor
+        self.logger = endpoint.logger
+
+    async def _run(self, function, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, *args, **kwargs)
+        )
+
+
+class AsyncAdvancedSearch(AsyncEndpoint):
+    advanced_search_from_query_body = _async_mirror(
+        AdvancedSearch.advanced_search_from_query_body
+    )
+    advanced_search_from_query_hash = _async_mirror(
+        AdvancedSearch.advanced_search_from_query_hash
+    )
+
+
+class AsyncBulkSearch(AsyncEndpoint):
+    create_task = _async_mirror(BulkSearch.create_task)
+    get_task = _async_mirror(BulkSearch.get_task)
+    download = _async_mirror(BulkSearch.download)
+
+
+class AsyncComments(AsyncEndpoint):
+    post_comments = _async_mirror(Comments.post_comments)
+
+
+class AsyncFilteredThreatEntity(AsyncEndpoint):
+    get_filtered_and_sorted_list = _async_mirror(
+        FilteredThreatEntity.get_filtered_and_sorted_list
+    )
+
+
+class AsyncMyAccount(AsyncEndpoint):
+    me = _async_mirror(MyAccount.me)
+
+
+class AsyncSightings(AsyncEndpoint):
+    submit_sighting = _async_mirror(Sightings.submit_sighting)
+    bulk_submit_sightings = _async_mirror(Sightings.bulk_submit_sightings)
+    sightings_filtered = _async_mirror(Sightings.sightings_filtered)
+    sightings_filtered_from_atom_value = _async_mirror(
+        Sightings.sightings_filtered_from_atom_value
+    )
+
+
+class AsyncSources(AsyncEndpoint):
+    check_sources = _async_mirror(Sources.check_sources)
+
+
+class AsyncTags(AsyncEndpoint):
+    add_to_threat = _async_mirror(Tags.add_to_threat)
+
+
+class AsyncThreats(AsyncEndpoint):
+    lookup = _async_mirror(Threats.lookup)
+    bulk_lookup = _async_mirror(Threats.bulk_lookup)
+    bulk_lookup_iter = _async_iter_mirror(Threats.bulk_lookup_iter)
+    edit_score_by_hashkeys = _async_mirror(Threats.edit_score_by_hashkeys)
+    bulk_edit_score_by_hashkeys = _async_mirror(Threats.bulk_edit_score_by_hashkeys)
+    edit_score_by_query_body_hash = _async_mirror(Threats.edit_score_by_query_body_hash)
+    add_threats = _async_mirror(Threats.add_threats)
+    add_threat = _async_mirror(Threats.add_threat)
+    atom_values = _async_mirror(Threats.atom_values)
+    get_threats_with_comments = _async_mirror(Threats.get_threats_with_comments)
+    iter_threats_with_comments = _async_iter_mirror(Threats.iter_threats_with_comments)
@@ -1,14 +1,62 @@
+import hashlib
+import json
+import os
 from http.client import ResponseNotReady
+from typing import Generator, List, Optional, Tuple
 
-from requests import Response
+from requests import Response, Session
 
 from datalake import BulkSearchNotFound
-from datalake.common.bulk_search_task import BulkSearchTask
+from datalake.common.bulk_search_cache import BulkSearchCache
+from datalake.common.bulk_search_scheduler import (
+    OCD_DTL_MAX_ACTIVE_BULK_SEARCHES,
+    BulkSearchScheduler,
+)
+from datalake.common.bulk_search_task import (
+    BULK_SEARCH_FAILED_STATE,
+    BulkSearchFailedError,
+    BulkSearchTask,
+    BulkSearchTaskState,
+)
 from datalake.common.output import parse_response, Output, output_supported
+from datalake.common.query_shard import QueryShard
+from datalake.common.throttler import RateLimiter
+from datalake.common.token_manager import TokenManager
 from datalake.endpoints import Endpoint
 
+OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES = (
+    int(os.environ["OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES"])
+    if os.getenv("OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES")
+    else None
+)
+
 
 class BulkSearch(Endpoint):
+    def __init__(
+        self,
+        logger,
+        endpoint_config: dict,
+        environment: str,
+        token_manager: TokenManager,
+        proxies: dict = None,
+        verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        session: Session = None,
+        max_in_memory_result_bytes: int = OCD_DTL_MAX_IN_MEMORY_RESULT_BYTES,
+    ):
+        super().__init__(
+            logger,
+            endpoint_config,
+            environment,
+            token_manager,
+            proxies,
+            verify,
+            rate_limiter,
+            session,
+        )
+        # bigger results are downloaded to a temporary file by BulkSearchTask.download_sync/download_async
+        self.max_in_memory_result_bytes = max_in_memory_result_bytes
+
     def create_task(
         self,
         for_stix_export: bool = False,
@@ -17,11 +65,39 @@ class BulkSearch(Endpoint):
         query_fields: list = None,
         indicators_only: bool = None,
         indicators_and_threat_entities_only: bool = None,
+        cache: BulkSearchCache = None,
     ) -> BulkSearchTask:
-        """Creates a bulk search task"""
+        """
+        Creates a bulk search task
+
+        With a cache, an identical bulk search created recently is reused instead, even if it is still running.
+        """
         if not query_body and not query_hash:
             raise ValueError("Either a query_body or query_hash is required")
 
+        if cache:
+            cache_key = cache.key(
+                query_body=query_body,
+                query_hash=query_hash,
+                query_fields=query_fields,
+                for_stix_export=for_stix_export,
+                indicators_only=indicators_only,
+                indicators_and_threat_entities_only=indicators_and_threat_entities_only,
+            )
+            task = self._get_cached_task(cache, cache_key)
+            if task:
+                return task
+            task = self.create_task(
+                for_stix_export=for_stix_export,
+                query_body=query_body,
+                query_hash=query_hash,
+                query_fields=query_fields,
+                indicators_only=indicators_only,
+                indicators_and_threat_entities_only=indicators_and_threat_entities_only,
+            )
+            cache.set(cache_key, task.uuid)
+            return task
+
         body = {"query_fields": query_fields} if query_fields else {}
         if query_body:
             body["query_body"] = query_body
@@ -42,6 +118,72 @@ class BulkSearch(Endpoint):
         ).json()
         return self.get_task(response["task_uuid"])
 
+    def sharded_search(
+        self,
+        query_body: dict,
+        shards: List[QueryShard],
+        query_fields: list = None,
+        max_active: int = OCD_DTL_MAX_ACTIVE_BULK_SEARCHES,
+        timeout=15 * 60,
+    ) -> Generator[dict, None, None]:
+        """
+        Run the bulk search of query_body as one bulk search per shard and yield their results without duplicates.
+
+        Up to max_active shards run at the same time. A shard failing with FAILED_TOO_MANY_RESULTS is split
+        and its parts are run instead, a shard that can't be split anymore raises BulkSearchFailedError.
+        The results of a shard are yielded as soon as it is done, keyed by the query_fields, like iter_results.
+        """
+        if not shards:
+            raise ValueError("At least one shard is required")
+        scheduler = BulkSearchScheduler(self, max_active=max_active, timeout=timeout)
+        shard_of_future = {}
+
+        def submit(shard: QueryShard):
+            future = scheduler.submit(
+                query_body=shard.query_body(query_body), query_fields=query_fields
+            )
+            shard_of_future[future] = shard
+
+        for shard in shards:
+            submit(shard)
+        seen_digests = set()
+        for future in scheduler.as_completed():
+            shard = shard_of_future.pop(future)
+            try:
+                task = future.result()
+            except BulkSearchFailedError as e:
+                if e.failed_state != BulkSearchTaskState.FAILED_TOO_MANY_RESULTS:
+                    raise
+                smaller_shards = shard.split()
+                if not smaller_shards:
+                    raise
+                self.logger.info(f"Too many results for {shard}, splitting it")
+                for smaller_shard in smaller_shards:
+                    submit(smaller_shard)
+                continue
+            for row in task.iter_results(timeout=timeout):
+                digest = hashlib.blake2b(
+                    json.dumps(list(row.values())).encode(), digest_size=16
+                ).digest()
+                if digest not in seen_digests:
+                    seen_digests.add(digest)
+                    yield row
+
+    def _get_cached_task(self, cache: BulkSearchCache, cache_key: str):
+        """Return the task cached for cache_key if its result is, or will be, available"""
+        task_uuid = cache.get(cache_key)
+        if not task_uuid:
+            return None
+        try:
+            task = self.get_task(task_uuid)
+        except BulkSearchNotFound:
+            task = None
+        if task is None or task.state in BULK_SEARCH_FAILED_STATE or task.file_deleted:
+            cache.delete(cache_key)
+            return None
+        self.logger.debug(f"Reusing the bulk search task {task_uuid}")
+        return task
+
     def get_task(self, task_uuid) -> BulkSearchTask:
         url = self._build_url_for_endpoint("bulk-search-tasks")
         body = {"task_uuid": task_uuid}
@@ -63,15 +205,31 @@ class BulkSearch(Endpoint):
             Output.CSV_ZIP,
         }
     )
-    def download(self, task_uuid, output=Output.JSON, stream=False):
+    def download(
+        self,
+        task_uuid,
+        output=Output.JSON,
+        stream=False,
+        byte_range: Tuple[int, Optional[int]] = None,
+    ):
         """
         Download the bulk search task with the given uuid.
         Stream parameter enables the raw stream to be returned, allowing it to be processed by chunks.
+        byte_range (first byte, last byte included or None for the end of the file) sends an HTTP Range request,
+        the server may still answer with the whole file. The file isn't compressed for the transfer then, so that
+        the range matches the bytes received.
         """
         url = self._build_url_for_endpoint("bulk-search-task")
         url = url.format(task_uuid=task_uuid)
+        headers = self._get_headers(output=output)
+        if byte_range:
+            first_byte, last_byte = byte_range
+            headers["Range"] = (
+                f"bytes={first_byte}-{'' if last_byte is None else last_byte}"
+            )
+            headers["Accept-Encoding"] = "identity"
         response: Response = self.datalake_requests(
-            url, "get", headers=self._get_headers(output=output), stream=stream
+            url, "get", headers=headers, stream=stream
         )
         if response.status_code == 202:
             raise ResponseNotReady(response.json().get("message", ""))
@@ -12,13 +12,76 @@ from requests import Response
 from requests.adapters import HTTPAdapter, Retry
 
 from datalake.common.output import Output
-from datalake.common.throttler import throttle
+from datalake.common.throttler import RateLimiter
 from datalake.common.token_manager import TokenManager
 from datalake.common.utils import get_error_message
 
 OCD_DTL_QUOTA_TIME = int(os.getenv("OCD_DTL_QUOTA_TIME", 1))
 OCD_DTL_REQUESTS_PER_QUOTA_TIME = int(os.getenv("OCD_DTL_REQUESTS_PER_QUOTA_TIME", 5))
 OCD_DTL_MAX_RETRIES = int(os.getenv("OCD_DTL_MAX_RETRIES", 3))
+OCD_DTL_MAX_WORKERS = int(os.getenv("OCD_DTL_MAX_WORKERS", 1))
+OCD_DTL_POOL_CONNECTIONS = int(os.getenv("OCD_DTL_POOL_CONNECTIONS", 10))
+OCD_DTL_POOL_MAXSIZE = int(os.getenv("OCD_DTL_POOL_MAXSIZE", 10))
+OCD_DTL_POOL_BLOCK = os.getenv("OCD_DTL_POOL_BLOCK", "False").lower() in (
+    "true",
+    "1",
+    "t",
+)
+OCD_DTL_KEEP_ALIVE = os.getenv("OCD_DTL_KEEP_ALIVE", "True").lower() in (
+    "true",
+    "1",
+    "t",
+)
+
+
+def build_session(
+    pool_connections: int = OCD_DTL_POOL_CONNECTIONS,
+    pool_maxsize: int = OCD_DTL_POOL_MAXSIZE,
+    pool_block: bool = OCD_DTL_POOL_BLOCK,
+    keep_alive: bool = OCD_DTL_KEEP_ALIVE,
+) -> requests.Session:
+    """
+    Create the HTTP session shared by the endpoints of a Datalake instance
+
+    :param pool_connections: number of hosts for which a connection pool is kept
+    :param pool_maxsize: number of connections kept open per host
+    :param pool_block: if True, no more than pool_maxsize connections are opened per host, callers wait for a free one
+    :param keep_alive: if False, connections are closed after each request
+    """
+    session = requests.Session()
+
+    # Configure HTTP retry policy
+    retry_policy = Retry(
+        total=OCD_DTL_MAX_RETRIES,  # Number of retries
+        backoff_factor=1,  # How much time between retries (exponential)
+        raise_on_status=False,  # Raise an error when the number of retries is exhausted
+        status_forcelist=[
+            429,
+            500,
+            502,
+            503,
+            504,
+        ],  # Retry for those HTTP status codes
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block,
+        max_retries=retry_policy,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+    return session
+
+
+class UnprocessableEntityError(ValueError):
+    """422 response of the API, response_body holds its json body"""
+
+    def __init__(self, message: str, response_body):
+        super().__init__(message)
+        self.response_body = response_body
 
 
 class Endpoint:
@@ -31,10 +94,16 @@ class Endpoint:
         token_manager: TokenManager,
         proxies: dict = None,
         verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        session: requests.Session = None,
     ):
         self.logger = logger
+        self.rate_limiter = rate_limiter or RateLimiter(
+            period=OCD_DTL_QUOTA_TIME,
+            call_per_period=OCD_DTL_REQUESTS_PER_QUOTA_TIME,
+        )
         self.logger.debug(
-            f"Throttle selected: {OCD_DTL_REQUESTS_PER_QUOTA_TIME} queries per {OCD_DTL_QUOTA_TIME}s"
+            f"Throttle selected: {self.rate_limiter.call_per_period} queries per {self.rate_limiter.period}s"
         )
         self.endpoint_config = endpoint_config
         self.environment = environment
@@ -42,23 +111,7 @@ class Endpoint:
         self.token_manager = token_manager
         self.proxies = proxies
         self.verify = verify
-        self.session = requests.Session()
-
-        # Configure HTTP retry policy
-        retry_policy = Retry(
-            total=OCD_DTL_MAX_RETRIES,  # Number of retries
-            backoff_factor=1,  # How much time between retries (exponential)
-            raise_on_status=False,  # Raise an error when the number of retries is exhausted
-            status_forcelist=[
-                429,
-                500,
-                502,
-                503,
-                504,
-            ],  # Retry for those HTTP status codes
-        )
-        self.session.mount("http://", HTTPAdapter(max_retries=retry_policy))
-        self.session.mount("https://", HTTPAdapter(max_retries=retry_policy))
+        self.session = session or build_session()
 
     def _get_terminal_size(self) -> int:
         """Return the terminal size for pretty print"""
@@ -72,10 +125,6 @@ class Endpoint:
             )
         return 80
 
-    @throttle(
-        period=OCD_DTL_QUOTA_TIME,
-        call_per_period=OCD_DTL_REQUESTS_PER_QUOTA_TIME,
-    )
     def datalake_requests(
         self,
         url: str,
@@ -86,6 +135,8 @@ class Endpoint:
     ) -> Response:
         """
         Use it to request the API
+
+        Each request sent waits for a token of the rate limiter shared by the endpoints.
         """
 
         self.logger.debug(self._pretty_debug_request(url, method, post_body, headers))
@@ -99,6 +150,7 @@ class Endpoint:
                 self.token_manager.access_token or self.token_manager.longterm_token
             )
 
+            self.rate_limiter.acquire()
             response = self._send_request(
                 self,
                 url=url,
@@ -117,7 +169,9 @@ class Endpoint:
                 self.logger.warning(
                     "Missing authorization header or Token Error. Updating token"
                 )
-                self.token_manager.process_auth_error(response.json())
+                self.token_manager.process_auth_error(
+                    response.json(), used_token=headers["Authorization"]
+                )
             else:
                 break
             retry_auth_count -= 1
@@ -128,7 +182,7 @@ class Endpoint:
                 error_msg = get_error_message(json_resp)
             except ValueError:
                 error_msg = response.text
-            raise ValueError(f"422 HTTP code: {error_msg}")
+            raise UnprocessableEntityError(f"422 HTTP code: {error_msg}", json_resp)
         elif response.status_code < 200 or response.status_code > 299:
             self.logger.error(
                 f"API returned non 2xx response code : {response.status_code}\n{response.text}"
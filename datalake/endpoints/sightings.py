@@ -1,3 +1,5 @@
+import os
+
 from datalake import (
     ThreatType,
     SightingType,
@@ -6,14 +8,40 @@ from datalake import (
     AtomType,
     Output,
 )
-from datalake.endpoints.endpoint import Endpoint
+from datalake.endpoints.endpoint import Endpoint, OCD_DTL_MAX_WORKERS
+from requests import RequestException, Session
+from datalake.common.throttler import RateLimiter
 from datalake.common.token_manager import TokenManager
 from datalake.common.atom_type import Atom
+from datalake.common.utils import concurrent_map
 from datetime import datetime
 from typing import List
 
 
+class BulkSightingsError(ValueError):
+    """
+    Raised by bulk_submit_sightings when some of the requests it was split in failed.
+
+    errors maps the index of the sightings rejected to their error, in the same format as the API errors.
+    results holds the result of each sighting in the order of the input, None for the sightings not submitted:
+    all the sightings of a failed request are rejected with it.
+    """
+
+    def __init__(self, errors: dict, results: list):
+        self.errors = errors
+        self.results = results
+        not_submitted = sum(result is None for result in results)
+        super().__init__(
+            f"{not_submitted} of {len(results)} sightings were not submitted: {errors}"
+        )
+
+
 class Sightings(Endpoint):
+    OCD_DTL_MAX_BULK_SIGHTINGS = int(os.getenv("OCD_DTL_MAX_BULK_SIGHTINGS", 100))
+    OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS = int(
+        os.getenv("OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS", 10000)
+    )
+
     def __init__(
         self,
         logger,
@@ -23,9 +51,18 @@ class Sightings(Endpoint):
         threats_instance,  # Threats class
         proxies: dict = None,
         verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        session: Session = None,
     ):
         super().__init__(
-            logger, endpoint_config, environment, token_manager, proxies, verify
+            logger,
+            endpoint_config,
+            environment,
+            token_manager,
+            proxies,
+            verify,
+            rate_limiter,
+            session,
         )
         self.threats_instance = threats_instance  # Store the Threats instance
 
@@ -76,13 +113,21 @@ class Sightings(Endpoint):
     def bulk_submit_sightings(
         self,
         sightings: List[dict] = [],
+        max_workers: int = None,
     ):
         """
         Submit a list of Sightings.
         Input must be a list of valid dict.
         Each dict is a sighting.
+
+        The sightings are sent in requests of up to OCD_DTL_MAX_BULK_SIGHTINGS sightings and
+        OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS atoms and hashkeys, up to max_workers requests at the same time
+        (default to the OCD_DTL_MAX_WORKERS environment variable).
+        The results of the requests are merged, in the order of the sightings, and returned as a dict with the
+        count and the results of the sightings, whether the sightings were sent in one request or several.
+        If some requests fail, the other ones are still submitted and a BulkSightingsError is raised, with the errors
+        indexed by the position of the sightings in the input and the results of the sightings submitted.
         """
-        payload = {}
         list_sightings_for_url_call = []
         for sighting in sightings:
             payload_item = self._prepare_sightings_payload(
@@ -101,10 +146,103 @@ class Sightings(Endpoint):
                 sighting.get("impersonate_id"),
             )
             list_sightings_for_url_call.append(payload_item)
-        payload["data"] = list_sightings_for_url_call
         url = self._build_url_for_endpoint("threats-bulk-sighting")
-        res = self.datalake_requests(url, "post", self._post_headers(), payload).json()
-        return res
+
+        def submit_chunk(sightings_chunk):
+            payload = {"data": sightings_chunk}
+            chunk_res = self.datalake_requests(
+                url, "post", self._post_headers(), payload
+            ).json()
+            chunk_results = chunk_res.get("results", [])
+            if len(chunk_results) != len(sightings_chunk):
+                raise ValueError(
+                    f"{len(chunk_results)} results returned for {len(sightings_chunk)} sightings submitted"
+                )
+            return chunk_res
+
+        chunks = list(self._split_sightings_payloads(list_sightings_for_url_call))
+        if len(chunks) <= 1:
+            chunk_res = submit_chunk(chunks[0] if chunks else [])
+            return {
+                "count": chunk_res.get("count", 0),
+                "results": chunk_res.get("results", []),
+            }
+
+        chunks_offsets = []
+        sightings_count = 0
+        for chunk in chunks:
+            chunks_offsets.append((sightings_count, chunk))
+            sightings_count += len(chunk)
+
+        def submit_chunk_at_offset(chunk_offset):
+            offset, sightings_chunk = chunk_offset
+            try:
+                return offset, sightings_chunk, submit_chunk(sightings_chunk), None
+            except (ValueError, RequestException) as e:
+                self.logger.error(
+                    f"Bulk sightings request of {len(sightings_chunk)} sightings failed: {e}"
+                )
+                return offset, sightings_chunk, None, e
+
+        count = 0
+        results = [None] * sightings_count
+        errors = {}
+        for offset, sightings_chunk, chunk_res, error in concurrent_map(
+            submit_chunk_at_offset,
+            chunks_offsets,
+            max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+            ordered=True,
+        ):
+            if error is None:
+                count += chunk_res.get("count", 0)
+                for index, result in enumerate(chunk_res["results"]):
+                    results[offset + index] = result
+            else:
+                errors.update(
+                    self._bulk_sightings_errors(error, offset, len(sightings_chunk))
+                )
+        if errors:
+            raise BulkSightingsError(errors, results)
+        return {"count": count, "results": results}
+
+    @staticmethod
+    def _bulk_sightings_errors(error: Exception, offset: int, size: int) -> dict:
+        """Return the errors of a failed request of size sightings, indexed by their position in the whole input"""
+        response_body = getattr(error, "response_body", None)
+        if isinstance(response_body, dict) and isinstance(
+            response_body.get("data"), dict
+        ):
+            return {
+                str(int(index) + offset): sighting_error
+                for index, sighting_error in response_body["data"].items()
+            }
+        return {str(index): str(error) for index in range(offset, offset + size)}
+
+    def _split_sightings_payloads(self, sightings_payloads: List[dict]):
+        """
+        Yield the lists of sightings payloads of each bulk request, in order.
+
+        A sighting with more atoms than OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS is sent alone.
+        """
+        chunk = []
+        chunk_atoms = 0
+        for sighting_payload in sightings_payloads:
+            sighting_atoms = sum(
+                len(value)
+                for key, value in sighting_payload.items()
+                if key == "hashkeys" or key.endswith("_list")
+            )
+            if chunk and (
+                len(chunk) >= self.OCD_DTL_MAX_BULK_SIGHTINGS
+                or chunk_atoms + sighting_atoms > self.OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS
+            ):
+                yield chunk
+                chunk = []
+                chunk_atoms = 0
+            chunk.append(sighting_payload)
+            chunk_atoms += sighting_atoms
+        if chunk:
+            yield chunk
 
     @staticmethod
     def _check_sightings_payload_parameters(
@@ -181,14 +319,11 @@ class Sightings(Endpoint):
             for atom in atoms:
                 if type(atom) == Atom or not isinstance(atom, Atom):
                     raise TypeError('"atoms" needs to be a list of Atom subclasses.')
-                atom_dict = atom.generate_atom_json(for_sightings=True)
-                if not payload:
-                    payload = atom_dict
-                else:
-                    payload = {
-                        key: payload.get(key, []) + atom_dict.get(key, [])
-                        for key in set(list(payload.keys()) + list(atom_dict.keys()))
-                    }
+                # extended in place, merging by building new lists is quadratic in the number of atoms
+                for key, atoms_list in atom.generate_atom_json(
+                    for_sightings=True
+                ).items():
+                    payload.setdefault(key, []).extend(atoms_list)
 
         if hashkeys:
             payload["hashkeys"] = hashkeys
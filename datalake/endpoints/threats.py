@@ -1,20 +1,29 @@
+import datetime
 import os
-from typing import List, Union, Dict
-from time import time, sleep
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, Union
 
+from requests import Session
 from requests.sessions import PreparedRequest
 
 from datalake import AtomType, ThreatType, OverrideType, Atom
+from datalake.common.atom_classifier import AtomClassifier
+from datalake.common.task_poller import TaskPoller
+from datalake.common.throttler import RateLimiter
 from datalake.common.token_manager import TokenManager
 from datalake.common.atom import ScoreMap
+from datalake.common.journal import BulkThreatsJournal
 from datalake.common.output import Output, output_supported, parse_response
 from datalake.common.utils import (
+    concurrent_map,
+    split_iterable,
     split_list,
-    aggregate_csv_or_json_api_response,
-    save_output,
+    split_time_range,
+    CsvHeaderDedupWriter,
+    JsonListWriter,
+    ResponseAggregator,
     check_normalized_timestamp,
 )
-from datalake.endpoints.endpoint import Endpoint
+from datalake.endpoints.endpoint import Endpoint, OCD_DTL_MAX_WORKERS
 
 
 class Threats(Endpoint):
@@ -27,6 +36,8 @@ class Threats(Endpoint):
     OCD_DTL_MAX_EDIT_SCORE_HASHKEYS = int(
         os.getenv("OCD_DTL_MAX_EDIT_SCORE_HASHKEYS", 100)
     )
+    EDIT_SCORE_OK = "OK"
+    EDIT_SCORE_FAILED = "FAILED"
 
     def __init__(
         self,
@@ -37,11 +48,25 @@ class Threats(Endpoint):
         sources_instance,  # Sources class
         proxies: dict = None,
         verify: bool = True,
+        rate_limiter: RateLimiter = None,
+        session: Session = None,
     ):
         super().__init__(
-            logger, endpoint_config, environment, token_manager, proxies, verify
+            logger,
+            endpoint_config,
+            environment,
+            token_manager,
+            proxies,
+            verify,
+            rate_limiter,
+            session,
         )
         self.sources_instance = sources_instance  # Store the Sources instance
+        self.atom_classifier = AtomClassifier()
+
+    def close(self):
+        """Close the file of the atom type memo"""
+        self.atom_classifier.close()
 
     def _bulk_lookup_batch(
         self,
@@ -63,8 +88,19 @@ class Threats(Endpoint):
             raise ValueError(f"{atom_type} atom_type could not be treated")
         else:
             typed_atoms[atom_type.value] = atom_values
+        return self._bulk_lookup_typed_atoms(
+            typed_atoms, hashkey_only, output, return_search_hashkey
+        )
 
-        body: dict = typed_atoms
+    def _bulk_lookup_typed_atoms(
+        self,
+        typed_atoms: Dict[str, list],
+        hashkey_only=False,
+        output=Output.JSON,
+        return_search_hashkey=False,
+    ) -> dict:
+        """Bulk lookup of atoms grouped by atom type, several atom types can be sent at once"""
+        body: dict = dict(typed_atoms)
         body["hashkey_only"] = hashkey_only
         body["return_search_hashkey"] = return_search_hashkey
         url = self._build_url_for_endpoint("threats-bulk-lookup")
@@ -81,6 +117,7 @@ class Threats(Endpoint):
         hashkey_only=False,
         output=Output.JSON,
         return_search_hashkey=False,
+        max_workers: int = None,
     ) -> Union[dict, str]:
         """
         Look up multiple threats at once in the API, returning :
@@ -93,32 +130,80 @@ class Threats(Endpoint):
 
         Compared to the lookup endpoint, it allow to lookup big batch of values faster as fewer API calls are made.
         However, fewer outputs types are supported as of now.
+        Up to max_workers batches are sent at the same time (default to the OCD_DTL_MAX_WORKERS environment variable),
+        the results are still aggregated in the order of atom_values.
         """
-        aggregated_response = [] if output is Output.CSV else {}
+        aggregator = ResponseAggregator()
         search_hashkey_list = []
-        for atom_values_batch in split_list(
-            atom_values, self._NB_ATOMS_PER_BULK_LOOKUP
+        for batch_result in self._bulk_lookup_batches(
+            atom_values,
+            atom_type,
+            hashkey_only,
+            output,
+            return_search_hashkey,
+            max_workers,
+            ordered=True,
         ):
-            batch_result = self._bulk_lookup_batch(
+            if isinstance(batch_result, dict) and "search_hashkey" in batch_result:
+                search_hashkey_list.append(batch_result.pop("search_hashkey"))
+            aggregator.add(batch_result)
+        if output is Output.CSV:
+            return aggregator.csv()  # a string is expected for CSV output
+        aggregated_response = aggregator.json()
+        if search_hashkey_list:
+            aggregated_response["search_hashkey"] = search_hashkey_list
+        return aggregated_response
+
+    @output_supported({Output.JSON, Output.CSV})
+    def bulk_lookup_iter(
+        self,
+        atom_values: Iterable[str],
+        atom_type: AtomType = None,
+        hashkey_only=False,
+        output=Output.JSON,
+        return_search_hashkey=False,
+        max_workers: int = None,
+    ) -> Generator[Union[dict, str], None, None]:
+        """
+        Same as bulk_lookup, but yield the API response of each batch of atoms as soon as it is received.
+
+        atom_values can be any iterable, it is consumed batch by batch to keep the memory usage flat.
+        Batches results are yielded in completion order, each CSV batch result keeps its header.
+        """
+        yield from self._bulk_lookup_batches(
+            atom_values,
+            atom_type,
+            hashkey_only,
+            output,
+            return_search_hashkey,
+            max_workers,
+        )
+
+    def _bulk_lookup_batches(
+        self,
+        atom_values: Iterable[str],
+        atom_type: AtomType,
+        hashkey_only: bool,
+        output: Output,
+        return_search_hashkey: bool,
+        max_workers: int = None,
+        ordered=False,
+    ):
+        def lookup_batch(atom_values_batch):
+            return self._bulk_lookup_batch(
                 atom_values_batch,
                 atom_type,
                 hashkey_only,
                 output,
                 return_search_hashkey,
             )
-            if "search_hashkey" in batch_result:
-                search_hashkey_list.append(batch_result.pop("search_hashkey"))
-            aggregated_response = aggregate_csv_or_json_api_response(
-                aggregated_response,
-                batch_result,
-            )
-        if search_hashkey_list:
-            aggregated_response["search_hashkey"] = search_hashkey_list
-        if output is Output.CSV:
-            aggregated_response = "\n".join(
-                aggregated_response
-            )  # a string is expected for CSV output
-        return aggregated_response
+
+        return concurrent_map(
+            lookup_batch,
+            split_iterable(atom_values, self._NB_ATOMS_PER_BULK_LOOKUP),
+            max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+            ordered=ordered,
+        )
 
     @output_supported({Output.JSON, Output.CSV, Output.MISP, Output.STIX})
     def lookup(
@@ -132,7 +217,7 @@ class Threats(Endpoint):
         Look up a threat in the API, returning its id (called threat's hashkey) and if it is present in Datalake.
 
         The hashkey is also based on the threat type.
-        If atom_type is not specified, another query to the API will be made to determine it.
+        If atom_type is not specified and can't be determined locally, another query to the API will be made to determine it.
         With hashkey_only = False, the full threat details are returned in the requested format.
         """
         atom_type_str = None
@@ -170,7 +255,39 @@ class Threats(Endpoint):
         Determines the types of atoms passed.
 
         values that are believed to be hashes will be returned as the AtomType provided in <treat_hashes_like>
+        Values are typed locally when possible, only the remaining ones are sent to the API.
         """
+        results = {}
+        not_found = []
+        untyped_residue = []
+        for atom_value in dict.fromkeys(
+            untyped_atoms
+        ):  # deduplicate, keeping the order
+            atom_type = self.atom_classifier.classify(atom_value, treat_hashes_like)
+            if atom_type:
+                results.setdefault(atom_type.value, []).append(atom_value)
+            else:
+                untyped_residue.append(atom_value)
+        if untyped_residue:
+            api_response = self._atom_values_extract_from_api(
+                untyped_residue, treat_hashes_like
+            )
+            for atom_type_str, atom_values in api_response["results"].items():
+                results.setdefault(atom_type_str, []).extend(atom_values)
+                for atom_value in atom_values:
+                    self.atom_classifier.remember(
+                        atom_value, treat_hashes_like, AtomType(atom_type_str)
+                    )
+            not_found = api_response["not_found"]
+        return {
+            "found": sum(len(atom_values) for atom_values in results.values()),
+            "not_found": not_found,
+            "results": results,
+        }
+
+    def _atom_values_extract_from_api(
+        self, untyped_atoms: List[str], treat_hashes_like: AtomType
+    ) -> dict:
         url = self._build_url_for_endpoint("threats-atom-values-extract")
         payload = {
             "content": " ".join(untyped_atoms),
@@ -188,11 +305,65 @@ class Threats(Endpoint):
         Edit the score of a list of threats using the API. Default is 100. This function will receive a list of
         hashkey to edit, a list of dictionaries defining the scores to set and an override type. Can only process a
         limited number of hashkeys at one time. Can be modified with the environment variable
-        OCD_DTL_MAX_EDIT_SCORE_HASHKEYS.
+        OCD_DTL_MAX_EDIT_SCORE_HASHKEYS. Use bulk_edit_score_by_hashkeys for more hashkeys.
+        """
+        self._check_edit_score_params(hashkeys, override_type, check_size=True)
+        scores = self._build_scores(scores_list)
+        return self._edit_score_chunk(hashkeys, scores, override_type)
+
+    def bulk_edit_score_by_hashkeys(
+        self,
+        hashkeys: List[str],
+        scores_list: List[ScoreMap],
+        override_type: OverrideType = OverrideType.TEMPORARY,
+        max_workers: int = None,
+        retries: int = 1,
+    ) -> Dict[str, str]:
         """
+        Edit the score of any number of threats using the API.
+
+        The hashkeys are split in chunks of OCD_DTL_MAX_EDIT_SCORE_HASHKEYS hashkeys,
+        up to max_workers chunks are sent at the same time (default to the OCD_DTL_MAX_WORKERS environment variable).
+        The chunks that failed are sent again, up to <retries> times.
+        Return the outcome of each hashkey: EDIT_SCORE_OK or EDIT_SCORE_FAILED.
+        """
+        self._check_edit_score_params(hashkeys, override_type)
+        scores = self._build_scores(scores_list)
+
+        def edit_score_chunk(hashkeys_chunk):
+            try:
+                self._edit_score_chunk(hashkeys_chunk, scores, override_type)
+            except ValueError as e:
+                self.logger.error(
+                    f"Score edition failed for {len(hashkeys_chunk)} hashkeys: {e}"
+                )
+                return hashkeys_chunk, self.EDIT_SCORE_FAILED
+            return hashkeys_chunk, self.EDIT_SCORE_OK
+
+        outcomes = {}
+        chunks = list(split_list(hashkeys, self.OCD_DTL_MAX_EDIT_SCORE_HASHKEYS))
+        for attempt in range(retries + 1):
+            failed_chunks = []
+            for hashkeys_chunk, outcome in concurrent_map(
+                edit_score_chunk,
+                chunks,
+                max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+            ):
+                if outcome == self.EDIT_SCORE_FAILED:
+                    failed_chunks.append(hashkeys_chunk)
+                for hashkey in hashkeys_chunk:
+                    outcomes[hashkey] = outcome
+            if not failed_chunks:
+                break
+            chunks = failed_chunks
+            if attempt < retries:
+                self.logger.warning(f"Retrying {len(chunks)} failed chunks")
+        return {hashkey: outcomes[hashkey] for hashkey in hashkeys}
+
+    def _check_edit_score_params(self, hashkeys, override_type, check_size=False):
         if type(hashkeys) is not list or not hashkeys:
             raise ValueError("Hashkeys has to be a list of string")
-        if len(hashkeys) > self.OCD_DTL_MAX_EDIT_SCORE_HASHKEYS:
+        if check_size and len(hashkeys) > self.OCD_DTL_MAX_EDIT_SCORE_HASHKEYS:
             raise ValueError(
                 f"Can't process more than {self.OCD_DTL_MAX_EDIT_SCORE_HASHKEYS} hashkeys at one time."
             )
@@ -200,10 +371,12 @@ class Threats(Endpoint):
             raise ValueError("Hashkeys has to be a list of string")
         if not isinstance(override_type, OverrideType):
             raise ValueError("Invalid OverrideType input")
+
+    def _edit_score_chunk(self, hashkeys, scores, override_type: OverrideType):
         req_body = {
             "override_type": override_type.value,
             "hashkeys": hashkeys,
-            "scores": self._build_scores(scores_list),
+            "scores": scores,
         }
         url = self._build_url_for_endpoint("threats-bulk-scoring-edits")
         response = self.datalake_requests(url, "post", self._post_headers(), req_body)
@@ -265,10 +438,16 @@ class Threats(Endpoint):
         public: bool = True,
         tags: List = None,
         external_analysis_link: List = None,
+        journal_path: str = None,
+        resume: bool = False,
     ):
         """
         Add a list of threats to datalake using the API.
         The type of atom provided in the list of threats to add need to be the same, for example a list of IPs.
+
+        If journal_path is set, the tasks created for each batch of atoms and their outcome are recorded in that file.
+        With resume, an existing journal is reused: the batches already added are not submitted again
+        and the tasks still in flight are checked instead of being created again.
         """
         self._check_add_threats_params(
             atom_list, override_type, threat_types, whitelist
@@ -280,7 +459,14 @@ class Threats(Endpoint):
         else:
             scores = self._build_scores(threat_types)
         return self._bulk_add_threat(
-            atom_list, atom_type, payload, tags, scores, external_analysis_link
+            atom_list,
+            atom_type,
+            payload,
+            tags,
+            scores,
+            external_analysis_link,
+            journal_path,
+            resume,
         )
 
     @staticmethod
@@ -302,6 +488,8 @@ class Threats(Endpoint):
         tags: List,
         scores: List[Dict],
         external_analysis_link: List = None,
+        journal_path: str = None,
+        resume: bool = False,
     ):
         url = self._build_url_for_endpoint("bulk-manual-threats")
         payload["atom_type"] = atom_type.value
@@ -315,33 +503,89 @@ class Threats(Endpoint):
                     }
                 }
             }
-        hashkey_created = self._queue_bulk_threats(atom_list, payload, url)
-        return hashkey_created
+        if not journal_path:
+            return self._queue_bulk_threats(atom_list, payload, url)
+        with BulkThreatsJournal(journal_path, resume=resume) as journal:
+            return self._queue_bulk_threats(atom_list, payload, url, journal)
 
-    def _queue_bulk_threats(self, atom_list, payload, url):
-        """Creates the manual bulk tasks to add threats then checks if those sucessfully created suceeded"""
-        bulk_response = []
-        bulk_in_flight = []  # bulk task uuid unchecked
+    def _queue_bulk_threats(
+        self, atom_list, payload, url, journal: BulkThreatsJournal = None
+    ):
+        """
+        Creates the manual bulk tasks to add threats then checks if those sucessfully created suceeded
+
+        The tasks in flight are polled between the submissions, each with its own back-off.
+        """
+        task_status_url = self._build_url_for_endpoint("bulk-manual-threats-task")
+        batch_keys = {}  # task uuid -> journal batch key
+
+        def poll(task_uuid):
+            task_status = self._poll_bulk_task(task_uuid, task_status_url)
+            if journal and task_status:
+                if task_status["state"] == "DONE":
+                    journal.done(batch_keys[task_uuid], task_uuid, task_status)
+                else:
+                    journal.cancelled(batch_keys[task_uuid], task_uuid)
+            return task_status
+
+        task_poller = TaskPoller(
+            poll,
+            timeout=self.OCD_DTL_MAX_BULK_THREATS_TIME,
+            max_back_off_time=self.OCD_DTL_MAX_BACK_OFF_TIME,
+        )
+        batch_outcomes = (
+            []
+        )  # for each batch, its task uuid or its journaled task status
         failed_batch = []
         for batch in split_list(atom_list, 100):
-            if len(bulk_in_flight) >= self.OCD_DTL_MAX_BULK_THREATS_IN_FLIGHT:
-                bulk_threat_task_uuid = bulk_in_flight.pop(0)
-                bulk_response.append(
-                    self._check_bulk_threats_added(bulk_threat_task_uuid)
+            payload["atom_values"] = "\n".join(batch)  # Raw csv expected
+            task_uid = None
+            if journal:
+                batch_key = journal.batch_key(
+                    payload["atom_type"], payload["atom_values"]
                 )
+                task_status = journal.task_status(batch_key)
+                if task_status:
+                    batch_outcomes.append((None, task_status))
+                    continue
+                task_uid = journal.task_uuid(batch_key)
+                if task_uid and not self._is_task_known(task_uid, task_status_url):
+                    task_uid = None
+
+            if len(task_poller) >= self.OCD_DTL_MAX_BULK_THREATS_IN_FLIGHT:
+                task_poller.wait_for_one()
 
-            payload["atom_values"] = "\n".join(batch)  # Raw csv expected
-            response = self.datalake_requests(
-                url, "post", self._post_headers(), payload
-            )
-            self.logger.debug(f"_queue_bulk_threats, response : {str(response)}")
-            response = parse_response(response)
-            self.logger.debug(f"_queue_bulk_threats, response parsed : {str(response)}")
-            task_uid = response.get("task_uuid")
             if task_uid:
-                bulk_in_flight.append(response["task_uuid"])
+                self.logger.debug(f"_queue_bulk_threats, resuming task {task_uid}")
             else:
-                failed_batch.append(batch)
+                response = self.datalake_requests(
+                    url, "post", self._post_headers(), payload
+                )
+                self.logger.debug(f"_queue_bulk_threats, response : {str(response)}")
+                response = parse_response(response)
+                self.logger.debug(
+                    f"_queue_bulk_threats, response parsed : {str(response)}"
+                )
+                task_uid = response.get("task_uuid")
+                if not task_uid:
+                    failed_batch.append(batch)
+                    continue
+                if journal:
+                    journal.submitted(batch_key, task_uid)
+            if journal:
+                batch_keys[task_uid] = batch_key
+            batch_outcomes.append((task_uid, None))
+            task_poller.add(task_uid)
+            task_poller.poll_due()
+
+        # Finish to check the other bulk tasks
+        task_results = task_poller.wait_for_all()
+        bulk_response = [
+            self._check_bulk_threats_added(
+                task_uuid, task_status or task_results[task_uuid]
+            )
+            for task_uuid, task_status in batch_outcomes
+        ]
         if failed_batch:
             bulk_response.append(
                 {
@@ -352,25 +596,41 @@ class Threats(Endpoint):
                     },
                 }
             )
-
-        # Finish to check the other bulk tasks
-        for bulk_threat_task_uuid in bulk_in_flight:
-            bulk_response.append(self._check_bulk_threats_added(bulk_threat_task_uuid))
         return bulk_response
 
-    def _check_bulk_threats_added(self, bulk_threat_task_uuid) -> dict:
+    def _is_task_known(self, task_uuid, task_status_url) -> bool:
+        """Check that a task of the journal can still be polled, a task expired or unknown needs to be submitted again"""
+        try:
+            self._poll_bulk_task(task_uuid, task_status_url)
+        except ValueError as e:
+            self.logger.warning(
+                f"Task {task_uuid} of the journal can't be resumed, its batch is submitted again: {e}"
+            )
+            return False
+        return True
+
+    def _poll_bulk_task(self, task_uuid, task_status_url) -> Optional[dict]:
+        """Return the bulk task status once it is finished, None while it is still running"""
+        response = self.datalake_requests(
+            task_status_url.format(task_uuid=task_uuid), "get", self._get_headers()
+        )
+        if response.status_code == 200:
+            json_response = response.json()
+            if json_response["state"] in ("DONE", "CANCELLED"):
+                return json_response
+        return None
+
+    def _check_bulk_threats_added(
+        self, bulk_threat_task_uuid, response: Optional[dict]
+    ) -> dict:
         """Check if the bulk manual threat submission completed successfully and if so return the hashkeys created"""
         success = []
         failed = []
-        url = self._build_url_for_endpoint("bulk-manual-threats-task")
-
-        try:
-            response = self._handle_bulk_task(
-                bulk_threat_task_uuid,
-                url,
-                timeout=self.OCD_DTL_MAX_BULK_THREATS_TIME,
+        if response is None:
+            self.logger.warning(
+                f"No bulk result after waiting {self.OCD_DTL_MAX_BULK_THREATS_TIME / 60:.0f} mins\n"
+                f'task_uuid: "{bulk_threat_task_uuid}"'
             )
-        except TimeoutError:
             response = {}
 
         hashkeys = response.get("hashkeys")
@@ -398,30 +658,6 @@ class Threats(Endpoint):
         response_dict = {"success": success, "failed": failed}
         return response_dict
 
-    def _handle_bulk_task(self, task_uuid, retrieve_bulk_result_url, timeout):
-        retrieve_bulk_result_url = retrieve_bulk_result_url.format(task_uuid=task_uuid)
-        start_time = time()
-        back_off_time = 1
-        json_response = None
-        while not json_response:
-            response = self.datalake_requests(
-                retrieve_bulk_result_url, "get", self._get_headers()
-            )
-            if response.status_code == 200:
-                potential_json_response = response.json()
-                if not potential_json_response["state"] in ("DONE", "CANCELLED"):
-                    continue
-                json_response = response.json()
-            elif time() - start_time + back_off_time < timeout:
-                sleep(back_off_time)
-                back_off_time = min(back_off_time * 2, self.OCD_DTL_MAX_BACK_OFF_TIME)
-            else:
-                raise TimeoutError(
-                    f"No bulk result after waiting {timeout / 60:.0f} mins\n"
-                    f'task_uuid: "{task_uuid}"'
-                )
-        return json_response
-
     @staticmethod
     def _check_add_threat_params(atom, override_type, threat_types, whitelist):
         if not threat_types and not whitelist:
@@ -491,9 +727,17 @@ class Threats(Endpoint):
         normalized_timestamp_until: str = None,
         output: Output = Output.JSON,
         output_path: str = None,
+        window: datetime.timedelta = None,
+        max_workers: int = None,
     ):
         """
         Get all atom values based on given source id list and from time range.
+
+        If window is set, the time range is split in windows of that duration and up to max_workers windows
+        are retrieved at the same time (default to the OCD_DTL_MAX_WORKERS environment variable).
+        The results of the windows are merged in time order.
+        With output_path, the results are written to that file window by window, as a JSON list or a CSV, and
+        only the number of atom values written is returned: the results are not kept in memory.
         """
         self._check_atom_values_params(
             source_id,
@@ -502,6 +746,12 @@ class Threats(Endpoint):
             output,
             output_path,
         )
+        if window:
+            time_ranges = split_time_range(
+                normalized_timestamp_since, normalized_timestamp_until, window
+            )
+        else:
+            time_ranges = [(normalized_timestamp_since, normalized_timestamp_until)]
 
         (
             all_sources_are_valid,
@@ -512,21 +762,52 @@ class Threats(Endpoint):
                 f"The following sources are invalid : {list_invalid_sources}"
             )
 
-        payload = {
-            "source_id": source_id,
-            "normalized_timestamp_since": normalized_timestamp_since,
-            "normalized_timestamp_until": normalized_timestamp_until,
-            "ordering": ["atom_type"],
-        }
         url = self._build_url_for_endpoint("atom-values")
-        response = self.datalake_requests(
-            url, "post", self._post_headers(output), payload
+
+        def get_window_atom_values(time_range):
+            since, until = time_range
+            payload = {
+                "source_id": source_id,
+                "normalized_timestamp_since": since,
+                "normalized_timestamp_until": until,
+                "ordering": ["atom_type"],
+            }
+            response = self.datalake_requests(
+                url, "post", self._post_headers(output), payload
+            )
+            return parse_response(response)
+
+        windows_atom_values = concurrent_map(
+            get_window_atom_values,
+            time_ranges,
+            max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+            ordered=True,
         )
+        if len(time_ranges) == 1 and not output_path:
+            return next(windows_atom_values)
 
         if output_path:
-            save_output(output_path, parse_response(response))
+            with open(output_path, "w+") as output_file:
+                if output is Output.CSV:
+                    writer = CsvHeaderDedupWriter(output_file)
+                else:
+                    writer = JsonListWriter(output_file)
+                for window_atom_values in windows_atom_values:
+                    writer.write(window_atom_values)
+                if output is not Output.CSV:
+                    writer.close()
+            return writer.count
 
-        return parse_response(response)
+        if output is Output.CSV:
+            aggregator = ResponseAggregator()
+            for window_atom_values in windows_atom_values:
+                aggregator.add(window_atom_values)
+            return aggregator.csv()
+
+        atom_values = []
+        for window_atom_values in windows_atom_values:
+            atom_values.extend(window_atom_values)
+        return atom_values
 
     def _get_threat_with_comments(self, hashkey: str):
         """
@@ -551,25 +832,59 @@ class Threats(Endpoint):
             threat_dict["comments"] = parse_response(comments_dict)
         return threat_dict
 
-    def get_threats_with_comments(self, hashkeys: list):
+    def get_threats_with_comments(self, hashkeys: list, max_workers: int = None):
         """
         Retrieve the JSON file of a list of threats and their comments.
         Return dict containing threats found and a list of threats' hashkey not found
+
+        Up to max_workers threats are retrieved at the same time (default to the OCD_DTL_MAX_WORKERS environment variable),
+        the threats are still returned in the order of hashkeys.
         """
-        terminal_size = self._get_terminal_size()
         dict_threats = {"count": 0, "results": []}
         list_of_not_found_threats_hashkeys = []
-        for index, hashkey in enumerate(hashkeys):
+        for hashkey, threat_dict in self._threats_with_comments(
+            hashkeys, max_workers, ordered=True
+        ):
+            if threat_dict is None:
+                list_of_not_found_threats_hashkeys.append(hashkey)
+            else:
+                dict_threats["count"] += 1
+                dict_threats["results"].append(threat_dict)
+        return dict_threats, list_of_not_found_threats_hashkeys
+
+    def iter_threats_with_comments(
+        self, hashkeys: Iterable[str], max_workers: int = None
+    ) -> Generator[Tuple[str, Optional[dict]], None, None]:
+        """
+        Same as get_threats_with_comments, but yield each hashkey with its threat and comments as soon as they are retrieved.
+
+        The threat is None if it was not found. hashkeys can be any iterable, it is consumed lazily.
+        """
+        yield from self._threats_with_comments(hashkeys, max_workers)
+
+    def _threats_with_comments(
+        self, hashkeys: Iterable[str], max_workers: int = None, ordered=False
+    ) -> Generator[Tuple[str, Optional[dict]], None, None]:
+        def get_threat(hashkey):
             try:
                 threat_dict = self._get_threat_with_comments(hashkey)
             except Exception as e:
                 self.logger.error(
                     f"Error occured for hashkey {hashkey}, error : {str(e)}"
                 )
-                list_of_not_found_threats_hashkeys.append(hashkey)
-                continue
-            if not threat_dict.get("hashkey"):
-                list_of_not_found_threats_hashkeys.append(hashkey)
+                return hashkey, None
+            return hashkey, threat_dict if threat_dict.get("hashkey") else None
+
+        terminal_size = self._get_terminal_size()
+        for index, (hashkey, threat_dict) in enumerate(
+            concurrent_map(
+                get_threat,
+                hashkeys,
+                max_workers=max_workers or OCD_DTL_MAX_WORKERS,
+                ordered=ordered,
+            )
+        ):
+            if threat_dict is None:
                 self.logger.debug(
                     f"{str(index).ljust(5)}:{hashkey.ljust(terminal_size - 11)}\x1b[0;30;41mERROR\x1b[0m"
                 )
@@ -577,6 +892,4 @@ class Threats(Endpoint):
                 self.logger.debug(
                     f"{str(index).ljust(5)}:{hashkey.ljust(terminal_size - 10)}\x1b[0;30;42m OK \x1b[0m"
                 )
-                dict_threats["count"] += 1
-                dict_threats["results"].append(threat_dict)
-        return dict_threats, list_of_not_found_threats_hashkeys
+            yield hashkey, threat_dict
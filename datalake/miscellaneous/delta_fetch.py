@@ -0,0 +1,218 @@
+import datetime
+import os
+from typing import Callable, Generator, Iterable, List, Optional, Sequence
+
+from datalake.common.query_shard import TimeRangeShard
+from datalake.common.snapshot import (
+    iter_snapshot_rows,
+    read_snapshot_header,
+    write_snapshot,
+)
+from datalake.common.utils import format_normalized_timestamp
+
+OCD_DTL_DELTA_FETCH_OVERLAP = float(os.getenv("OCD_DTL_DELTA_FETCH_OVERLAP", 300))
+
+
+def _parse_timestamp(timestamp: str) -> datetime.datetime:
+    return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _merge_sorted_rows(
+    previous_rows: Iterable[list],
+    fetched_rows: List[list],
+    row_key: Callable[[Sequence], str],
+    keep_previous: bool,
+    added: list,
+    removed: list,
+) -> Generator[list, None, None]:
+    """
+    Merge fetched_rows into previous_rows, both sorted by row_key without duplicates, and yield the merged rows sorted.
+
+    A fetched row replaces the previous row with the same key and is appended to added if there is none.
+    The previous rows not fetched are yielded if keep_previous, else they are appended to removed.
+    """
+    previous_rows = iter(previous_rows)
+    previous_row = next(previous_rows, None)
+    for fetched_row in fetched_rows:
+        fetched_key = row_key(fetched_row)
+        while previous_row is not None and row_key(previous_row) < fetched_key:
+            if keep_previous:
+                yield previous_row
+            else:
+                removed.append(previous_row)
+            previous_row = next(previous_rows, None)
+        if previous_row is not None and row_key(previous_row) == fetched_key:
+            previous_row = next(previous_rows, None)
+        else:
+            added.append(fetched_row)
+        yield fetched_row
+    while previous_row is not None:
+        if keep_previous:
+            yield previous_row
+        else:
+            removed.append(previous_row)
+        previous_row = next(previous_rows, None)
+
+
+class DeltaFetch:
+    """
+    Keep the result of a bulk search in a local snapshot, downloading only the threats updated since the previous fetch.
+    """
+
+    def __init__(
+        self,
+        logger,
+        BulkSearch,
+        AdvancedSearch,
+        overlap: datetime.timedelta = datetime.timedelta(
+            seconds=OCD_DTL_DELTA_FETCH_OVERLAP
+        ),
+    ):
+        self.BulkSearch = BulkSearch
+        self.AdvancedSearch = AdvancedSearch
+        self.logger = logger
+        self.overlap = overlap
+
+    def delta_query_body(
+        self,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        query_body: dict = None,
+        query_hash: str = None,
+    ) -> dict:
+        """Return the query body of query_body or query_hash restricted to the threats updated in [since, until)"""
+        if bool(query_body) == bool(query_hash):
+            raise ValueError("Either a query_body or query_hash is required")
+        if query_hash:
+            query_body = self.AdvancedSearch.advanced_search_from_query_hash(
+                query_hash, limit=0
+            )["query_body"]
+        return TimeRangeShard("last_updated", since, until).query_body(query_body)
+
+    @staticmethod
+    def _previous_header(
+        snapshot_path: str, query_body: dict, query_hash: str, query_fields: list
+    ) -> Optional[dict]:
+        """Return the header of the snapshot if it holds the result of the same bulk search"""
+        if not os.path.isfile(snapshot_path):
+            return None
+        header = read_snapshot_header(snapshot_path)
+        if header.get("query_fields") != query_fields:
+            return None
+        if query_hash:
+            return header if header.get("query_hash") == query_hash else None
+        return header if header.get("query_body") == query_body else None
+
+    def fetch(
+        self,
+        snapshot_path: str,
+        query_body: dict = None,
+        query_hash: str = None,
+        query_fields: list = None,
+        full_refresh_interval: datetime.timedelta = None,
+        timeout=15 * 60,
+    ) -> dict:
+        """
+        Update the snapshot at snapshot_path with the threats of query_body or query_hash, and return what changed.
+
+        The first fetch downloads every threat. The next ones restrict the query to the threats updated since the
+        previous fetch (minus the overlap) and merge them into the snapshot by threat_hashkey, so the download scales
+        with the number of updated threats. A threat that stopped matching the query can't be seen by a delta fetch:
+        it is only removed by a full fetch, done every full_refresh_interval if set.
+
+        Return a dict with from and to, the UTC datetimes of the previous fetch (None for the first one) and of this
+        one, full_fetch, fetched (the number of threats downloaded), count (the number of threats in the snapshot),
+        and the added and removed rows, with the values of query_fields.
+        """
+        if bool(query_body) == bool(query_hash):
+            raise ValueError("Either a query_body or query_hash is required")
+        query_fields = list(query_fields or ["threat_hashkey"])
+        if "threat_hashkey" not in query_fields:
+            raise ValueError("query_fields needs to contain threat_hashkey")
+        key_index = query_fields.index("threat_hashkey")
+
+        def row_key(row: Sequence) -> str:
+            return row[key_index]
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        # rounded to the precision of the timestamps stored in the snapshot
+        fetch_datetime = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        header = self._previous_header(
+            snapshot_path, query_body, query_hash, query_fields
+        )
+        previous_datetime = _parse_timestamp(header["fetched_at"]) if header else None
+        full_fetch = header is None or (
+            full_refresh_interval is not None
+            and fetch_datetime - _parse_timestamp(header["full_fetched_at"])
+            >= full_refresh_interval
+        )
+
+        if full_fetch:
+            task = self.BulkSearch.create_task(
+                query_body=query_body, query_hash=query_hash, query_fields=query_fields
+            )
+            header = {
+                "advanced_query_hash": task.advanced_query_hash,
+                "full_fetched_at": format_normalized_timestamp(fetch_datetime),
+                "query_body": query_body,
+                "query_hash": query_hash,
+                "query_fields": query_fields,
+            }
+        else:
+            if not header.get("query_body"):
+                # the query body of a query hash doesn't change, it is resolved once and kept in the snapshot
+                header["query_body"] = (
+                    self.AdvancedSearch.advanced_search_from_query_hash(
+                        query_hash, limit=0
+                    )["query_body"]
+                )
+            task = self.BulkSearch.create_task(
+                query_body=self.delta_query_body(
+                    previous_datetime - self.overlap,
+                    fetch_datetime,
+                    query_body=header["query_body"],
+                ),
+                query_fields=query_fields,
+            )
+        header["fetched_at"] = format_normalized_timestamp(fetch_datetime)
+
+        fetched_rows = {}
+        for threat in task.iter_results(timeout):
+            row = [threat[field] for field in query_fields]
+            fetched_rows[row_key(row)] = row
+        fetched_rows = sorted(fetched_rows.values(), key=row_key)
+
+        added, removed = [], []
+        count = 0
+
+        def counted(rows: Iterable[list]) -> Generator[list, None, None]:
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row
+
+        merged_rows = _merge_sorted_rows(
+            iter_snapshot_rows(snapshot_path) if previous_datetime else (),
+            fetched_rows,
+            row_key,
+            not full_fetch,
+            added,
+            removed,
+        )
+        # the previous snapshot is read while the new one is written
+        write_snapshot(snapshot_path + ".tmp", header, counted(merged_rows))
+        os.replace(snapshot_path + ".tmp", snapshot_path)
+        self.logger.info(
+            f"{'Full' if full_fetch else 'Delta'} fetch of {len(fetched_rows)} threats in {snapshot_path}: "
+            f"{len(added)} added, {len(removed)} removed, {count} in total"
+        )
+
+        return {
+            "from": previous_datetime,
+            "to": fetch_datetime,
+            "full_fetch": full_fetch,
+            "fetched": len(fetched_rows),
+            "count": count,
+            "added": added,
+            "removed": removed,
+        }
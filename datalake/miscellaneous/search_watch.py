@@ -1,23 +1,52 @@
+import functools
+import hashlib
+import json
 import os
-from typing import Optional
+import tempfile
+from heapq import heapify, heappop, heappush
+from time import monotonic, sleep
+from typing import (
+    Callable,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from datalake import Output
-from datalake.common.utils import load_json, datetime, save_output, SetEncoder
+from datalake.common.fingerprint_diff import iter_rows_diff
+from datalake.common.output import iter_json_list
+from datalake.common.snapshot import (
+    SNAPSHOT_EXTENSION,
+    is_snapshot,
+    iter_snapshot_rows,
+    write_sorted_snapshot,
+)
+from datalake.common.utils import datetime, save_output, SetEncoder
+from datalake.common.watch_state import WatchStateStore
+
+READ_CHUNK_SIZE = 1024 * 1024
 
 
 class SearchWatch:
-    def __init__(self, logger, BulkSearch):
+    def __init__(self, logger, BulkSearch, DeltaFetch=None):
         self.BulkSearch = BulkSearch
+        self.DeltaFetch = DeltaFetch
         self.logger = logger
 
     def _find_latest_json_file(self, directory_path: str) -> Optional[str]:
         """
-        Find the latest json file in the directory given as argument.
-        json files must have this format: `<query_hash>-<timestamp>.json`, because
-        the `<timestamp>` part of the format is use to find the latest.
-        Return the filename of that latest json file.
+        Find the latest json file or snapshot in the directory given as argument.
+        files must have this format: `<query_hash>-<timestamp>.json` or `<query_hash>-<timestamp>.ndjson.gz`,
+        because the `<timestamp>` part of the format is use to find the latest.
+        Return the filename of that latest file.
         """
         files = os.listdir(directory_path)
-        json_files = [f for f in files if f.endswith(".json") and "-" in f]
+        json_files = [
+            f for f in files if (f.endswith(".json") or is_snapshot(f)) and "-" in f
+        ]
 
         timestamps = []
         for file in json_files:
@@ -51,8 +80,8 @@ class SearchWatch:
 
     def threats_diff(
         self,
-        previous_bulk_search_output: dict,
-        new_bulk_search_output: dict,
+        previous_bulk_search_output: Union[dict, str],
+        new_bulk_search_output: Union[dict, str],
         previous_datetime: datetime,
         new_datetime: datetime,
     ) -> dict:
@@ -60,21 +89,36 @@ class SearchWatch:
         Takes two dictionaries (D1 and D2) which are suppose to be the result of
         two bulk search (a previous one and a new one), and two datetimes.
         Return a dictionary which contains information about `D1-D2` and `D2-D1`.
+        Each result can also be given as the path of a json file or snapshot saved by search_watch.
         """
-        previous_threats = []
-        new_threats = []
-
-        for threat in previous_bulk_search_output["results"]:
-            previous_threats.append(tuple(threat))
-
-        for threat in new_bulk_search_output["results"]:
-            new_threats.append(tuple(threat))
+        return self._threats_diff(
+            self._rows_callable(previous_bulk_search_output),
+            self._rows_callable(new_bulk_search_output),
+            previous_datetime,
+            new_datetime,
+        )
 
-        previous_threats_set = set(previous_threats)
-        new_threats_set = set(new_threats)
+    def _rows_callable(
+        self, bulk_search_output: Union[dict, str]
+    ) -> Callable[[], Iterable[Sequence]]:
+        if isinstance(bulk_search_output, str):
+            return functools.partial(self._iter_result_file, bulk_search_output)
+        return lambda: bulk_search_output["results"]
 
-        added_threats = new_threats_set - previous_threats_set
-        removed_threats = previous_threats_set - new_threats_set
+    def _threats_diff(
+        self,
+        previous_rows: Callable[[], Iterable[Sequence]],
+        new_rows: Callable[[], Iterable[Sequence]],
+        previous_datetime: datetime,
+        new_datetime: datetime,
+    ) -> dict:
+        added_threats = set()
+        removed_threats = set()
+        for change, threat in iter_rows_diff(previous_rows, new_rows):
+            if change == "added":
+                added_threats.add(threat)
+            else:
+                removed_threats.add(threat)
 
         return {
             "from": previous_datetime.strftime("%Y-%m-%d %H:%M:%S"),
@@ -83,6 +127,31 @@ class SearchWatch:
             "removed": removed_threats if removed_threats else {},
         }
 
+    @staticmethod
+    def _iter_result_file(file_path: str) -> Generator[list, None, None]:
+        """Yield the threats of a bulk search JSON result file or snapshot without loading the whole file"""
+        if is_snapshot(file_path):
+            yield from iter_snapshot_rows(file_path)
+            return
+        with open(file_path, "rb") as result_file:
+            chunks = iter(functools.partial(result_file.read, READ_CHUNK_SIZE), b"")
+            yield from iter_json_list(chunks, "results")
+
+    def iter_threats_diff_files(
+        self, previous_file_path: str, new_file_path: str
+    ) -> Generator[Tuple[str, tuple], None, None]:
+        """
+        Stream the difference between two bulk search JSON result files or snapshots, without loading them.
+
+        Yield ("added", threat) for each threat only in new_file_path, then ("removed", threat)
+        for each threat only in previous_file_path.
+        Each file is read twice and only 8 bytes per threat of one of the files are held in memory.
+        """
+        return iter_rows_diff(
+            functools.partial(self._iter_result_file, previous_file_path),
+            functools.partial(self._iter_result_file, new_file_path),
+        )
+
     def search_watch(
         self,
         query_body: dict = None,
@@ -90,9 +159,24 @@ class SearchWatch:
         output_folder: str = ".",
         reference_file: str = None,
         save_diff_threats: bool = False,
+        state_store: WatchStateStore = None,
+        compact: bool = False,
+        delta: bool = False,
+        full_refresh_interval: datetime.timedelta = None,
     ) -> dict:
         """
         Monitor (watch) a search to find new iocs (ones not present in your latest reference file) that match your search criteria.
+
+        The new result is downloaded to a file, then compared with the previous one without loading either of them:
+        only a 64 bits fingerprint per threat of one of the results is held in memory.
+
+        With a state_store, the threats of the previous run are taken from the store instead of a reference file,
+        and no result file is saved in output_folder.
+        With compact, the result is saved as a gzip compressed snapshot `<query_hash>-<timestamp>.ndjson.gz`
+        with one threat per line, sorted by hashkey, instead of an indented json file.
+        With delta, only the threats updated since the previous run are downloaded and merged in a snapshot
+        `<query_hash>-delta.ndjson.gz` kept in output_folder, see DeltaFetch.fetch. The threats that stopped matching
+        the search are only found by the full search done every full_refresh_interval.
         """
         if bool(query_body) == bool(query_hash):
             raise ValueError("Either a query_body or query_hash is required")
@@ -100,6 +184,20 @@ class SearchWatch:
         output_type = Output.JSON
         query_fields = ["atom_value", "threat_hashkey"]
 
+        if delta:
+            if reference_file or state_store:
+                raise ValueError(
+                    "delta can't be used with a reference_file or a state_store"
+                )
+            return self._delta_search_watch(
+                query_body,
+                query_hash,
+                query_fields,
+                output_folder,
+                save_diff_threats,
+                full_refresh_interval,
+            )
+
         if query_body:
             task = self.BulkSearch.create_task(
                 query_body=query_body, query_fields=query_fields
@@ -109,35 +207,38 @@ class SearchWatch:
                 query_hash=query_hash, query_fields=query_fields
             )
         actual_datetime = datetime.datetime.now()
-        bulk_search_result_json = task.download_sync(output=output_type)
-        filepath = (
+        file_prefix = (
             output_folder
             + "/"
-            + bulk_search_result_json["advanced_query_hash"]
+            + task.advanced_query_hash
             + "-"
             + str(int(round(datetime.datetime.timestamp(actual_datetime))))
-            + ".json"
         )
-        diff_threats = {}
+        filepath = file_prefix + (SNAPSHOT_EXTENSION if compact else ".json")
 
-        if reference_file:
-            try:
-                file_to_compare_with_data = load_json(reference_file)
-            except FileNotFoundError as e:
-                raise FileNotFoundError(
-                    f"Reference file not found: {reference_file}"
-                ) from e
+        if state_store:
+            with tempfile.TemporaryDirectory() as download_folder:
+                download_path = os.path.join(download_folder, "result.json")
+                task.download_to_file(download_path, output=output_type)
+                diff_threats = state_store.apply_run(
+                    task.advanced_query_hash,
+                    self._iter_result_file(download_path),
+                    actual_datetime,
+                )
+            if save_diff_threats:
+                self._save_diff_threats(
+                    output_folder,
+                    task.advanced_query_hash,
+                    actual_datetime,
+                    diff_threats,
+                )
+            return diff_threats
 
-            self.logger.info(
-                f"\x1b[0;30;47m File to compare with {reference_file} \x1b[0m"
-            )
-            previous_datetime = self._extract_timestamp(reference_file)
-            diff_threats = self.threats_diff(
-                file_to_compare_with_data,
-                bulk_search_result_json,
-                previous_datetime,
-                actual_datetime,
-            )
+        reference_path = None
+        if reference_file:
+            if not os.path.isfile(reference_file):
+                raise FileNotFoundError(f"Reference file not found: {reference_file}")
+            reference_path = reference_file
         else:
             try:
                 file_to_compare_with_json = self._find_latest_json_file(output_folder)
@@ -145,20 +246,22 @@ class SearchWatch:
                 raise FileNotFoundError(
                     f"Error with the output folder: {output_folder}"
                 ) from e
-
             if file_to_compare_with_json:
-                file_to_compare_with_json_path = (
-                    output_folder + "/" + file_to_compare_with_json
-                )
-                file_to_compare_with_data = load_json(file_to_compare_with_json_path)
+                reference_path = output_folder + "/" + file_to_compare_with_json
+
+        # not named .json until complete, so it is never taken as the reference of another run
+        download_path = file_prefix + ".json.part"
+        try:
+            task.download_to_file(download_path, output=output_type)
+            diff_threats = {}
+            if reference_path:
                 self.logger.info(
-                    f"\x1b[0;30;47m File to compare with {file_to_compare_with_json_path} \x1b[0m"
+                    f"\x1b[0;30;47m File to compare with {reference_path} \x1b[0m"
                 )
-                previous_datetime = self._extract_timestamp(file_to_compare_with_json)
-                diff_threats = self.threats_diff(
-                    file_to_compare_with_data,
-                    bulk_search_result_json,
-                    previous_datetime,
+                diff_threats = self._threats_diff(
+                    functools.partial(self._iter_result_file, reference_path),
+                    functools.partial(self._iter_result_file, download_path),
+                    self._extract_timestamp(os.path.basename(reference_path)),
                     actual_datetime,
                 )
             else:
@@ -166,25 +269,145 @@ class SearchWatch:
                     f"\x1b[0;30;43m No file to compare with {filepath} \x1b[0m"
                 )
 
-        if save_diff_threats:
-            diff_threats_path = (
-                output_folder
-                + "/"
-                + bulk_search_result_json["advanced_query_hash"]
-                + "-"
-                + "diff_threats"
-                + "-"
-                + str(int(round(datetime.datetime.timestamp(actual_datetime))))
-                + ".json"
-            )
-            save_output(diff_threats_path, diff_threats, cls=SetEncoder)
-            self.logger.info(
-                f"\x1b[0;37;42m OK: DIFF THREATS SAVED IN {diff_threats_path} \x1b[0m"
-            )
+            if save_diff_threats:
+                self._save_diff_threats(
+                    output_folder,
+                    task.advanced_query_hash,
+                    actual_datetime,
+                    diff_threats,
+                )
 
-        save_output(filepath, bulk_search_result_json)
+            if compact:
+                write_sorted_snapshot(
+                    filepath,
+                    {
+                        "advanced_query_hash": task.advanced_query_hash,
+                        "query_fields": query_fields,
+                    },
+                    self._iter_result_file(download_path),
+                    sort_key=lambda threat: (threat[1], threat[0]),
+                )
+            else:
+                os.replace(download_path, filepath)
+        finally:
+            if os.path.exists(download_path):
+                os.remove(download_path)
         self.logger.info(
             f"\x1b[0;37;42m OK: MATCHING THREATS SAVED IN {filepath} \x1b[0m"
         )
 
         return diff_threats
+
+    def _save_diff_threats(
+        self,
+        output_folder: str,
+        advanced_query_hash: str,
+        actual_datetime: datetime.datetime,
+        diff_threats: dict,
+    ):
+        diff_threats_path = (
+            output_folder
+            + "/"
+            + advanced_query_hash
+            + "-"
+            + "diff_threats"
+            + "-"
+            + str(int(round(datetime.datetime.timestamp(actual_datetime))))
+            + ".json"
+        )
+        save_output(diff_threats_path, diff_threats, cls=SetEncoder)
+        self.logger.info(
+            f"\x1b[0;37;42m OK: DIFF THREATS SAVED IN {diff_threats_path} \x1b[0m"
+        )
+
+    def _delta_search_watch(
+        self,
+        query_body: dict,
+        query_hash: str,
+        query_fields: list,
+        output_folder: str,
+        save_diff_threats: bool,
+        full_refresh_interval: datetime.timedelta,
+    ) -> dict:
+        if not self.DeltaFetch:
+            raise ValueError("delta requires a DeltaFetch")
+        if not os.path.isdir(output_folder):
+            raise FileNotFoundError(f"Error with the output folder: {output_folder}")
+        snapshot_name = (
+            query_hash
+            or hashlib.md5(json.dumps(query_body, sort_keys=True).encode()).hexdigest()
+        )
+        snapshot_path = os.path.join(
+            output_folder, f"{snapshot_name}-delta{SNAPSHOT_EXTENSION}"
+        )
+        fetch_result = self.DeltaFetch.fetch(
+            snapshot_path,
+            query_body=query_body,
+            query_hash=query_hash,
+            query_fields=query_fields,
+            full_refresh_interval=full_refresh_interval,
+        )
+        self.logger.info(
+            f"\x1b[0;37;42m OK: MATCHING THREATS SAVED IN {snapshot_path} \x1b[0m"
+        )
+        if fetch_result["from"] is None:
+            return {}
+
+        added_threats = {tuple(threat) for threat in fetch_result["added"]}
+        removed_threats = {tuple(threat) for threat in fetch_result["removed"]}
+        diff_threats = {
+            "from": fetch_result["from"].strftime("%Y-%m-%d %H:%M:%S"),
+            "to": fetch_result["to"].strftime("%Y-%m-%d %H:%M:%S"),
+            "added": added_threats if added_threats else {},
+            "removed": removed_threats if removed_threats else {},
+        }
+        if save_diff_threats:
+            self._save_diff_threats(
+                output_folder, snapshot_name, datetime.datetime.now(), diff_threats
+            )
+        return diff_threats
+
+    def run_watches(
+        self,
+        watches: List[dict],
+        state_store: WatchStateStore,
+        on_diff: Callable[[dict, dict], None] = None,
+        max_runs: int = None,
+    ):
+        """
+        Run several search watches in the same process, each one every `interval` seconds.
+
+        Each watch is a dict with either a query_body or a query_hash and an interval in seconds.
+        on_diff is called with the watch and its diff_threats after each run, a failed run is logged and the watch
+        is run again at its next interval. The watches run forever, or until max_runs runs are done.
+        """
+        for watch in watches:
+            if bool(watch.get("query_body")) == bool(watch.get("query_hash")):
+                raise ValueError("Either a query_body or query_hash is required")
+            if not watch.get("interval") or watch["interval"] <= 0:
+                raise ValueError("The interval of a watch needs to be positive")
+
+        now = monotonic()
+        schedule = [(now, index) for index in range(len(watches))]
+        heapify(schedule)
+        runs = 0
+        while schedule and (max_runs is None or runs < max_runs):
+            next_run, index = heappop(schedule)
+            wait_time = next_run - monotonic()
+            if wait_time > 0:
+                sleep(wait_time)
+            watch = watches[index]
+            try:
+                diff_threats = self.search_watch(
+                    query_body=watch.get("query_body"),
+                    query_hash=watch.get("query_hash"),
+                    state_store=state_store,
+                )
+            except Exception:
+                self.logger.exception(f"Search watch {watch} failed")
+            else:
+                if on_diff:
+                    on_diff(watch, diff_threats)
+            runs += 1
+            # a run longer than the interval delays the next one instead of running it several times in a row
+            heappush(schedule, (max(next_run + watch["interval"], monotonic()), index))
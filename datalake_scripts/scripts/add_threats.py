@@ -201,6 +201,15 @@ def main(override_args=None):
         help="force an api call for each threats, useful to retrieve the details of threats created",
         action="store_true",
     )
+    parser.add_argument(
+        "--journal",
+        help="record the batches submitted and their outcome in FILE, to be able to resume the run",
+    )
+    parser.add_argument(
+        "--resume",
+        help="resume the run recorded in the journal, skipping the batches already added",
+        action="store_true",
+    )
     if override_args:
         args = parser.parse_args(override_args)
     else:
@@ -212,6 +221,10 @@ def main(override_args=None):
 
     if not args.threat_types and not args.whitelist:
         parser.error("threat types is required if the atom is not for whitelisting")
+    if args.resume and not args.journal:
+        parser.error("--resume requires a --journal file")
+    if args.journal and args.no_bulk:
+        parser.error("--journal can't be used with --no-bulk")
 
     if args.lock:
         override_type = OverrideType.LOCK
@@ -280,6 +293,8 @@ def main(override_args=None):
                 public=args.public,
                 tags=args.tag,
                 external_analysis_link=args.link,
+                journal_path=args.journal,
+                resume=args.resume,
             )
             spinner.succeed()
             failed = []
@@ -4,7 +4,7 @@ import logging
 
 from halo import Halo
 from datalake import Datalake, AtomType, Output
-from datalake.common.utils import join_dicts, aggregate_csv_or_json_api_response
+from datalake.common.utils import CsvHeaderDedupWriter, ResponseAggregator
 from datalake_scripts.common.base_script import BaseScripts
 from datalake_scripts.helper_scripts.utils import split_input_file, save_output
 from urllib.parse import urlparse
@@ -193,7 +193,9 @@ def main(override_args=None):
         input_atom_type, atom = get_atom_type_from_filename(untyped_atom, dtl.logger)
         if input_atom_type == UNTYPED_ATOM_TYPE:
             untyped.append(atom)
-    typed_atoms_to_look_up = join_dicts(typed_atoms, lookup_atom_types(dtl, untyped))
+    typed_atoms_to_look_up = ResponseAggregator()
+    typed_atoms_to_look_up.add(typed_atoms)
+    typed_atoms_to_look_up.add(lookup_atom_types(dtl, untyped))
 
     # process input files
     if has_file:
@@ -204,33 +206,45 @@ def main(override_args=None):
             dtl.logger.debug(f"file {filename} was recognized as {file_atom_type}")
             if file_atom_type == UNTYPED_ATOM_TYPE:
                 for atom_chunk in split_input_file(filename, size_limit):
-                    untyped_atoms = atom_chunk
-                    typed_atoms_to_look_up = join_dicts(
-                        lookup_atom_types(dtl, untyped_atoms), typed_atoms_to_look_up
-                    )
+                    typed_atoms_to_look_up.add(lookup_atom_types(dtl, atom_chunk))
             else:
                 for atom_chunk in split_input_file(filename, size_limit):
-                    typed_atoms_to_look_up = join_dicts(
-                        {file_atom_type: atom_chunk}, typed_atoms_to_look_up
-                    )
+                    typed_atoms_to_look_up.add({file_atom_type: atom_chunk})
 
     # Query each atom type
-    full_response = {}
+    full_response = ResponseAggregator()
+    csv_output_file = None
+    if args.output and output_type is Output.CSV:
+        # CSV results are streamed to the output file instead of being kept in memory
+        csv_output_file = open(args.output, "w+")
+        csv_writer = CsvHeaderDedupWriter(csv_output_file)
     if spinner:
         spinner.text = f"Executing bulk search..."
-    for atom_type, atoms in typed_atoms_to_look_up.items():
-        response = dtl.Threats.bulk_lookup(
-            atom_values=atoms,
-            atom_type=AtomType[atom_type.upper()],
-            hashkey_only=hashkey_only,
-            output=output_type,
-            return_search_hashkey=True,
-        )
-        full_response = aggregate_csv_or_json_api_response(full_response, response)
+    try:
+        for atom_type, atoms in typed_atoms_to_look_up.json().items():
+            response = dtl.Threats.bulk_lookup(
+                atom_values=atoms,
+                atom_type=AtomType[atom_type.upper()],
+                hashkey_only=hashkey_only,
+                output=output_type,
+                return_search_hashkey=True,
+            )
+            if csv_output_file:
+                csv_writer.write(response)
+            else:
+                full_response.add(response)
+    finally:
+        if csv_output_file:
+            csv_output_file.close()
     if spinner:
         spinner.succeed("Done.")
+    if output_type is Output.CSV:
+        full_response = full_response.csv()
+    else:
+        full_response = full_response.json()
     if args.output:
-        save_output(args.output, full_response)
+        if not csv_output_file:
+            save_output(args.output, full_response)
         dtl.logger.debug(f"Results saved in {args.output}\n")
     else:
         pretty_print(full_response, args.output_type, args.env, dtl)
@@ -7,7 +7,6 @@ from datalake_scripts.common.base_script import BaseScripts
 from datalake_scripts.helper_scripts.utils import (
     save_output,
     parse_threat_types,
-    split_list,
     flatten_list,
     retrieve_hashkeys_from_file,
 )
@@ -53,6 +52,11 @@ def main(override_args=None):
             Default is "temporary" (all values should override any values provided by older IOCs)""",
         action="store_true",
     )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="number of chunks of hashkeys edited at the same time, default to the OCD_DTL_MAX_WORKERS environment variable",
+    )
     if override_args:
         args = parser.parse_args(override_args)
     else:
@@ -64,6 +68,8 @@ def main(override_args=None):
 
     if not args.hashkeys and not args.input:
         parser.error("either a hashkey or an input file is required")
+    if args.max_workers is not None and args.max_workers < 1:
+        parser.error("The number of workers needs to be a positive integer")
 
     if args.lock:
         override_type = OverrideType.LOCK
@@ -83,28 +89,28 @@ def main(override_args=None):
         retrieve_hashkeys_from_file(args.input, hashkeys)
         if not hashkeys:
             raise parser.error("No hashkey found in the input file.")
-    hashkeys_chunks = list(split_list(hashkeys, 100))
+    try:
+        outcomes = dtl.Threats.bulk_edit_score_by_hashkeys(
+            hashkeys, parsed_threat_type, override_type, max_workers=args.max_workers
+        )
+    except ValueError as e:
+        dtl.logger.error(e)
+        return
 
     response_list = []
-    for index, hashkeys in enumerate(hashkeys_chunks):
-        try:
-            dtl.Threats.edit_score_by_hashkeys(
-                hashkeys, parsed_threat_type, override_type
-            )
-        except ValueError as e:
-            dtl.logger.warning(
-                f"\x1b[6;30;41mBATCH {str(index+1)}/{len(list(hashkeys_chunks))}: FAILED\x1b[0m"
-            )
-            for hashkey in hashkeys:
-                response_list.append(hashkey + ": FAILED")
-                dtl.logger.warning(f"\x1b[6;30;41m{hashkey} : FAILED\x1b[0m")
-            dtl.logger.error(e)
-        else:
-            dtl.logger.info(
-                f"\x1b[6;30;42mBATCH {str(index+1)}/{len(list(hashkeys_chunks))}: OK\x1b[0m"
-            )
-            for hashkey in hashkeys:
-                response_list.append(hashkey + ": OK")
+    for hashkey, outcome in outcomes.items():
+        response_list.append(f"{hashkey}: {outcome}")
+        if outcome == dtl.Threats.EDIT_SCORE_FAILED:
+            dtl.logger.warning(f"\x1b[6;30;41m{hashkey} : FAILED\x1b[0m")
+    failed_count = sum(
+        outcome == dtl.Threats.EDIT_SCORE_FAILED for outcome in outcomes.values()
+    )
+    if failed_count:
+        dtl.logger.warning(
+            f"\x1b[6;30;41m{failed_count}/{len(outcomes)} HASHKEYS: FAILED\x1b[0m"
+        )
+    else:
+        dtl.logger.info(f"\x1b[6;30;42m{len(outcomes)} HASHKEYS: OK\x1b[0m")
 
     if args.output:
         save_output(args.output, response_list)
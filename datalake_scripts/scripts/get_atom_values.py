@@ -1,3 +1,4 @@
+import datetime
 import sys
 
 from datalake import Datalake
@@ -7,7 +8,7 @@ from datalake.common.utils import (
     convert_date_to_normalized_timestamp,
 )
 from datalake_scripts.common.base_script import BaseScripts
-from datalake_scripts.helper_scripts.utils import load_list, save_output
+from datalake_scripts.helper_scripts.utils import load_list
 
 
 def main(override_args=None):
@@ -41,6 +42,16 @@ def main(override_args=None):
         default="json",
         help="set to the output type desired {json,csv}. Default is json if not specified",
     )
+    parser.add_argument(
+        "--window",
+        type=float,
+        help="split the time range in windows of WINDOW hours, retrieved separately",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="number of windows retrieved at the same time, default to the OCD_DTL_MAX_WORKERS environment variable",
+    )
     if override_args:
         args = parser.parse_args(override_args)
     else:
@@ -86,18 +97,31 @@ def main(override_args=None):
         Output.JSON if (not args.output_type or args.output_type) else Output.CSV
     )
 
+    window = None
+    if args.window is not None:
+        if args.window <= 0:
+            parser.error("The time window needs to be a positive number of hours")
+        window = datetime.timedelta(hours=args.window)
+    if args.max_workers is not None and args.max_workers < 1:
+        parser.error("The number of workers needs to be a positive integer")
+
     try:
         # Checking if sources are valid is done in atom_values method
         list_atom_values = dtl.Threats.atom_values(
-            sources_list, since_ts, until_ts, output_type
+            sources_list,
+            since_ts,
+            until_ts,
+            output_type,
+            output_path=args.output,
+            window=window,
+            max_workers=args.max_workers,
         )
     except ValueError as e:
         dtl.logger.error(e)
         list_atom_values = None
 
-    if args.output and list_atom_values:
-        save_output(args.output, list_atom_values)
-        dtl.logger.debug(f"Atom values saved in {args.output}\n")
+    if args.output and list_atom_values is not None:
+        dtl.logger.debug(f"{list_atom_values} atom values saved in {args.output}\n")
     dtl.logger.debug(f"END: get_atom_values.py")
 
 
@@ -1,4 +1,6 @@
+import json
 import sys
+from contextlib import ExitStack
 
 from datalake import Datalake
 from datalake.common.logger import logger, configure_logging
@@ -6,6 +8,25 @@ from datalake_scripts.common.base_script import BaseScripts
 from datalake_scripts.helper_scripts.utils import load_list, save_output
 
 
+def stream_threats(
+    dtl: Datalake, hashkeys, output_path=None, lost_path=None, max_workers=None
+):
+    """Write each threat found in output_path and each hashkey not found in lost_path as soon as they are retrieved"""
+    with ExitStack() as stack:
+        output_file = (
+            stack.enter_context(open(output_path, "w+")) if output_path else None
+        )
+        lost_file = stack.enter_context(open(lost_path, "w+")) if lost_path else None
+        for hashkey, threat in dtl.Threats.iter_threats_with_comments(
+            hashkeys, max_workers=max_workers
+        ):
+            if threat is None:
+                if lost_file:
+                    lost_file.write(f"{hashkey}\n")
+            elif output_file:
+                output_file.write(json.dumps(threat, sort_keys=True) + "\n")
+
+
 def main(override_args=None):
     """Method to start the script"""
 
@@ -27,6 +48,16 @@ def main(override_args=None):
         "--lost",
         help="file path to save hashkeys that were not found into",
     )
+    parser.add_argument(
+        "--ndjson",
+        help="write each threat on its own line as soon as it is retrieved, instead of a single JSON at the end",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="number of threats retrieved at the same time, default to the OCD_DTL_MAX_WORKERS environment variable",
+    )
     if override_args:
         args = parser.parse_args(override_args)
     else:
@@ -38,18 +69,24 @@ def main(override_args=None):
 
     if not args.hashkeys and not args.input:
         parser.error("either a hashkey or an input (file) is required")
+    if args.max_workers is not None and args.max_workers < 1:
+        parser.error("The number of workers needs to be a positive integer")
     threats_list = load_list(args.input) if args.input else args.hashkeys
     dtl.logger.debug(f"TOTAL: {len(threats_list)} threats in parameters")
 
-    list_threats, list_not_found_hashkeys = dtl.Threats.get_threats_with_comments(
-        threats_list
-    )
-
+    if args.ndjson:
+        stream_threats(dtl, threats_list, args.output, args.lost, args.max_workers)
+    else:
+        list_threats, list_not_found_hashkeys = dtl.Threats.get_threats_with_comments(
+            threats_list, max_workers=args.max_workers
+        )
+        if args.output:
+            save_output(args.output, list_threats)
+        if args.lost:
+            save_output(args.lost, list_not_found_hashkeys)
     if args.output:
-        save_output(args.output, list_threats)
         dtl.logger.debug(f"Threats JSON saved in {args.output}\n")
     if args.lost:
-        save_output(args.lost, list_not_found_hashkeys)
         dtl.logger.debug(f"Threats not found saved in {args.lost}\n")
     dtl.logger.debug(f"END: get_threats.py")
 
@@ -1,3 +1,4 @@
+import datetime
 import json
 import logging
 import os
@@ -6,6 +7,7 @@ import sys
 from halo import Halo
 
 from datalake import Datalake
+from datalake.common.snapshot import iter_snapshot_rows
 from datalake_scripts.common.base_script import BaseScripts
 
 
@@ -20,6 +22,17 @@ def format_output(response: dict, one_threat_per_line=False) -> str:
         return json.dumps(response, sort_keys=True, indent=4)
 
 
+def write_output(dtl: Datalake, args, response: dict):
+    formatted_output = format_output(response, args.list)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(formatted_output)
+        dtl.logger.info(f"Threats saved in {args.output}")
+    else:
+        dtl.logger.info(formatted_output)
+        dtl.logger.info("Done")
+
+
 def main(override_args=None):
     """Method to start the script"""
 
@@ -37,6 +50,17 @@ def main(override_args=None):
         help="Turn the output in a list (require query_fields to be a single element)",
         action="store_true",
     )
+    parser.add_argument(
+        "--delta-snapshot",
+        help="gzip snapshot file kept between runs: only the threats updated since the previous run are downloaded"
+        " and merged in it, the output is the whole snapshot",
+    )
+    parser.add_argument(
+        "--full-refresh-interval",
+        type=int,
+        help="with --delta-snapshot, seconds after which all the threats are downloaded again to drop the ones"
+        " not matching the query anymore",
+    )
     required_named = parser.add_argument_group("required arguments")
     required_named.add_argument(
         "query_hash",
@@ -68,6 +92,24 @@ def main(override_args=None):
             exit(1)
 
     dtl.logger.debug(f"Start to search for threat from the query hash:{query_hash}")
+    if args.delta_snapshot:
+        if query_body:
+            query_hash = None
+        dtl.DeltaFetch.fetch(
+            args.delta_snapshot,
+            query_body=query_body,
+            query_hash=query_hash,
+            query_fields=args.query_fields,
+            full_refresh_interval=(
+                datetime.timedelta(seconds=args.full_refresh_interval)
+                if args.full_refresh_interval
+                else None
+            ),
+        )
+        results = list(iter_snapshot_rows(args.delta_snapshot))
+        write_output(dtl, args, {"count": len(results), "results": results})
+        return
+
     spinner = None
     if dtl.logger.isEnabledFor(logging.INFO):
         spinner = Halo(text=f"Creating bulk task", spinner="dots")
@@ -84,14 +126,7 @@ def main(override_args=None):
         spinner.succeed()
         spinner.info(f"Number of threat that have been retrieved: {original_count}")
 
-    formatted_output = format_output(response, args.list)
-    if args.output:
-        with open(args.output, "w") as output:
-            output.write(formatted_output)
-        dtl.logger.info(f"Threats saved in {args.output}")
-    else:
-        dtl.logger.info(formatted_output)
-        dtl.logger.info("Done")
+    write_output(dtl, args, response)
 
 
 if __name__ == "__main__":
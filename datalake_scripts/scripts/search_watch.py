@@ -1,8 +1,10 @@
+import datetime
+import os
 import sys
 import logging
 from prettytable import PrettyTable
 from itertools import zip_longest
-from datalake import Datalake
+from datalake import Datalake, WatchStateStore
 from datalake_scripts.common.base_script import BaseScripts
 from datalake_scripts.helper_scripts.utils import load_json
 
@@ -35,6 +37,39 @@ def pretty_output_tabular(data: dict):
     print(table)
 
 
+def load_watches(watches_path: str) -> list:
+    """Load the watches of the daemon mode, reading the query body of the watches with an input file"""
+    watches = load_json(watches_path)
+    if not isinstance(watches, list):
+        raise ValueError(f"{watches_path} needs to contain a list of watches")
+    for watch in watches:
+        if watch.get("input"):
+            watch["query_body"] = load_json(watch.pop("input"))
+    return watches
+
+
+def run_daemon(dtl: Datalake, args):
+    try:
+        watches = load_watches(args.watches)
+    except (OSError, ValueError) as e:
+        dtl.logger.error(e)
+        exit(1)
+    state_path = args.state or os.path.join(args.output_folder, "search_watch.sqlite")
+
+    def print_diff(watch: dict, diff_threats: dict):
+        if diff_threats:
+            pretty_output_tabular(diff_threats)
+
+    with WatchStateStore(state_path) as state_store:
+        try:
+            dtl.SearchWatch.run_watches(watches, state_store, on_diff=print_diff)
+        except ValueError as e:
+            dtl.logger.error(e)
+            exit(1)
+        except KeyboardInterrupt:
+            dtl.logger.info("Search watch daemon stopped")
+
+
 def main(override_args=None):
     parser = BaseScripts.start(
         "Watch or monitor a search from given query body or query hash."
@@ -61,15 +96,57 @@ def main(override_args=None):
         help="If set, will create a file `<queryhashkey>-diff_threats-<timestamp>.json` containing added and removed threats",
     )
 
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="save the results as gzip compressed snapshots `<queryhashkey>-<timestamp>.ndjson.gz` instead of json files",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="only download the threats updated since the previous run, merged in `<queryhashkey>-delta.ndjson.gz`"
+        " in the output folder",
+    )
+    parser.add_argument(
+        "--full-refresh-interval",
+        type=int,
+        help="with --delta, seconds after which all the threats are downloaded again to find the removed ones",
+    )
+    parser.add_argument(
+        "--state",
+        help="SQLite file keeping the threats of each watched query between runs, used instead of reference files."
+        " Default is `search_watch.sqlite` in the output folder with --daemon",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="run the watches of --watches in one process, each one at its own interval, until interrupted",
+    )
+    parser.add_argument(
+        "--watches",
+        help="json file with the list of watches of --daemon, each one with a query_hash, a query_body or an input"
+        " json file of the query body and an interval in seconds",
+    )
+
     if override_args:
         args = parser.parse_args(override_args)
     else:
         args = parser.parse_args()
 
+    if args.daemon and not args.watches:
+        parser.error("--daemon requires --watches")
+    if args.delta and (args.filename or args.state):
+        parser.error("--delta can't be used with --filename or --state")
+
     dtl = Datalake(env=args.env, log_level=args.loglevel)
 
     dtl.logger.debug(f"START: search_watch.py")
 
+    if args.daemon:
+        run_daemon(dtl, args)
+        dtl.logger.debug(f"END: search_watch.py")
+        return
+
     query_body = {}
     if args.input:
         try:
@@ -78,6 +155,7 @@ def main(override_args=None):
             dtl.logger.error(e)
             exit(1)
 
+    state_store = WatchStateStore(args.state) if args.state else None
     try:
         diff_threats = dtl.SearchWatch.search_watch(
             query_body=query_body,
@@ -85,6 +163,14 @@ def main(override_args=None):
             output_folder=args.output_folder,
             reference_file=args.filename,
             save_diff_threats=args.save_diff_threats,
+            state_store=state_store,
+            compact=args.compact,
+            delta=args.delta,
+            full_refresh_interval=(
+                datetime.timedelta(seconds=args.full_refresh_interval)
+                if args.full_refresh_interval
+                else None
+            ),
         )
     except FileNotFoundError as e:
         if "Reference file not found" in str(e):
@@ -98,6 +184,9 @@ def main(override_args=None):
         else:
             dtl.logger.error(f"\x1b[0;37;41m An error occured : {e} \x1b[0m")
         exit(1)
+    finally:
+        if state_store:
+            state_store.close()
 
     pretty_output_tabular(diff_threats)
     dtl.logger.debug(f"END: search_watch.py")
@@ -4,7 +4,7 @@ import responses
 
 from unittest.mock import patch
 
-from datalake import Datalake
+from datalake import Datalake, AsyncDatalake
 from datalake.common.config import Config
 from datalake.common.token_manager import TokenManager
 
@@ -94,3 +94,24 @@ def datalake_longterm_token():
     with patch.object(Config, "_CONFIG_ENDPOINTS", test_config_path):
         # Now when Config accesses _CONFIG_ENDPOINTS, it will use the test_config_path
         return Datalake(longterm_token="longterm_token1234", env=TestData.TEST_ENV)
+
+
+@pytest.fixture
+@responses.activate
+def async_datalake():
+    # Path to the test-specific config file
+    test_config_path = "tests/common/tests_endpoints.json"
+
+    with patch.object(Config, "_CONFIG_ENDPOINTS", test_config_path):
+        url = (
+            TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+            + TestData.TEST_CONFIG["api_version"]
+            + TestData.TEST_CONFIG["endpoints"]["token"]
+        )
+
+        auth_response = {"access_token": "12345", "refresh_token": "123456"}
+
+        responses.add(responses.POST, url, json=auth_response, status=200)
+        return AsyncDatalake(
+            username="username", password="password", env=TestData.TEST_ENV
+        )
@@ -0,0 +1,108 @@
+import pytest
+
+from datalake import AtomType
+from datalake.common.atom_classifier import AtomClassifier, classify_atom_value
+
+
+@pytest.mark.parametrize(
+    "atom_value,expected_atom_type",
+    [
+        ("8.8.8.8", AtomType.IP),
+        ("2001:db8::1", AtomType.IP),
+        ("192.168.0.0/16", AtomType.IP_RANGE),
+        ("2001:db8::/32", AtomType.IP_RANGE),
+        ("d41d8cd98f00b204e9800998ecf8427e", AtomType.FILE),
+        ("https://mayoclinic.org/some/path?q=1", AtomType.URL),
+        ("john.doe@mayoclinic.org", AtomType.EMAIL),
+        ("mayoclinic.org", AtomType.DOMAIN),
+        ("sub.xn--bcher-kva.ch", AtomType.DOMAIN),
+        ("example.fr", AtomType.DOMAIN),
+        ("setup.exe", None),
+        ("readme.txt", None),
+        ("invoice.pdf", None),
+        ("script.sh", None),
+        ("12345", None),
+        ("+33612345678", None),
+        ("1BoatSLRHtKNngkdXEeobR76b53LETtpyT", None),
+        ("mayoclinic[.]org", None),
+        ("not an atom", None),
+        ("", None),
+    ],
+)
+def test_classify_atom_value(atom_value, expected_atom_type):
+    assert classify_atom_value(atom_value) == expected_atom_type
+
+
+def test_classify_hash_like_certificate():
+    atom_value = "d41d8cd98f00b204e9800998ecf8427e"
+    assert (
+        classify_atom_value(atom_value, treat_hashes_like=AtomType.CERTIFICATE)
+        == AtomType.CERTIFICATE
+    )
+
+
+def test_atom_classifier_memo():
+    classifier = AtomClassifier(memo_size=2)
+    classifier.remember("AS1234", AtomType.FILE, AtomType.AS)
+    classifier.remember("+33612345678", AtomType.FILE, AtomType.PHONE_NUMBER)
+    assert classifier.classify("AS1234") == AtomType.AS  # AS1234 is now the most recent
+
+    classifier.remember("12345", AtomType.FILE, AtomType.AS)
+
+    assert classifier.classify("AS1234") == AtomType.AS
+    assert classifier.classify("12345") == AtomType.AS
+    assert classifier.classify("+33612345678") is None
+    assert classifier.classify("mayoclinic.org") == AtomType.DOMAIN
+
+
+def test_atom_classifier_memo_path(tmp_path):
+    memo_path = str(tmp_path / "atom_types.ndjson")
+    with AtomClassifier(memo_path=memo_path) as classifier:
+        classifier.remember("AS1234", AtomType.FILE, AtomType.AS)
+        classifier.remember("AS1234", AtomType.FILE, AtomType.AS)
+        classifier.remember("12345", AtomType.CERTIFICATE, AtomType.AS)
+    with open(memo_path, "a") as memo_file:
+        memo_file.write('["+3361')  # interrupted while writing
+
+    with AtomClassifier(memo_path=memo_path) as classifier:
+        assert classifier.classify("AS1234") == AtomType.AS
+        assert classifier.classify("12345") is None
+        assert classifier.classify("12345", AtomType.CERTIFICATE) == AtomType.AS
+        classifier.remember("+33612345678", AtomType.FILE, AtomType.PHONE_NUMBER)
+
+    with AtomClassifier(memo_path=memo_path) as classifier:
+        assert classifier.classify("+33612345678") == AtomType.PHONE_NUMBER
+    with open(memo_path) as memo_file:
+        assert len(memo_file.read().splitlines()) == 4
+
+
+def test_atom_classifier_memo_path_compaction(tmp_path):
+    memo_path = str(tmp_path / "atom_types.ndjson")
+    with AtomClassifier(memo_size=2, memo_path=memo_path) as classifier:
+        for i in range(5):
+            classifier.remember(f"AS{i}", AtomType.FILE, AtomType.AS)
+
+    with AtomClassifier(memo_size=2, memo_path=memo_path) as classifier:
+        assert classifier.classify("AS3") == AtomType.AS
+        assert classifier.classify("AS4") == AtomType.AS
+        assert classifier.classify("AS2") is None
+    with open(memo_path) as memo_file:
+        assert memo_file.read().splitlines() == [
+            '["AS3", "file", "as"]',
+            '["AS4", "file", "as"]',
+        ]
+
+
+def test_atom_classifier_memo_path_folder(tmp_path):
+    memo_path = str(tmp_path / "memo" / "atom_types.ndjson")
+    with AtomClassifier(memo_path=memo_path) as classifier:
+        classifier.remember("AS1234", AtomType.FILE, AtomType.AS)
+
+    with AtomClassifier(memo_path=memo_path) as classifier:
+        assert classifier.classify("AS1234") == AtomType.AS
+
+
+def test_atom_classifier_invalid_memo_path(tmp_path):
+    with pytest.raises(ValueError) as err:
+        AtomClassifier(memo_path=str(tmp_path))
+    assert str(err.value).startswith(f"Can't use {tmp_path} as atom type memo:")
@@ -0,0 +1,39 @@
+from unittest.mock import patch
+
+from datalake.common.bulk_search_cache import BulkSearchCache
+
+
+def test_bulk_search_cache_key():
+    key = BulkSearchCache.key(query_hash="123", query_fields=["atom_value"])
+
+    assert key == BulkSearchCache.key(
+        query_hash="123", query_fields=["atom_value"], for_stix_export=False
+    )
+    assert key != BulkSearchCache.key(query_hash="123")
+    assert key != BulkSearchCache.key(query_hash="456", query_fields=["atom_value"])
+    assert key != BulkSearchCache.key(
+        query_hash="123", query_fields=["atom_value"], for_stix_export=True
+    )
+    assert BulkSearchCache.key(
+        query_hash="123", query_fields=["atom_value", "threat_hashkey"]
+    ) != BulkSearchCache.key(
+        query_hash="123", query_fields=["threat_hashkey", "atom_value"]
+    )
+
+
+def test_bulk_search_cache_ttl(tmp_path):
+    cache = BulkSearchCache(str(tmp_path / "cache"), ttl=60)
+    assert cache.get("key") is None
+
+    with patch("datalake.common.bulk_search_cache.time.time", return_value=1000):
+        cache.set("key", "task_uuid")
+    with patch("datalake.common.bulk_search_cache.time.time", return_value=1060):
+        assert cache.get("key") == "task_uuid"
+        # shared with the other caches of the same directory
+        assert BulkSearchCache(str(tmp_path / "cache")).get("key") == "task_uuid"
+    with patch("datalake.common.bulk_search_cache.time.time", return_value=1061):
+        assert cache.get("key") is None
+
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert list((tmp_path / "cache").iterdir()) == []
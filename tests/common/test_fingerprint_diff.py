@@ -0,0 +1,43 @@
+from unittest.mock import patch
+
+from datalake.common.fingerprint_diff import (
+    contains,
+    iter_rows_diff,
+    row_fingerprint,
+    sorted_fingerprints,
+)
+
+
+def test_row_fingerprint():
+    assert row_fingerprint(["8.8.8.8", "hashkey"]) == row_fingerprint(
+        ("8.8.8.8", "hashkey")
+    )
+    assert row_fingerprint(["8.8.8.8", "hashkey"]) != row_fingerprint(
+        ["hashkey", "8.8.8.8"]
+    )
+    assert 0 <= row_fingerprint(["8.8.8.8"]) < 2**64
+
+
+def test_sorted_fingerprints():
+    rows = [[str(i % 7)] for i in range(30)]
+
+    with patch("datalake.common.fingerprint_diff.SORT_CHUNK_SIZE", 4):
+        fingerprints = sorted_fingerprints(rows)
+
+    assert list(fingerprints) == sorted({row_fingerprint(row) for row in rows})
+    assert fingerprints.itemsize == 8
+    assert contains(fingerprints, row_fingerprint(["3"]))
+    assert not contains(fingerprints, row_fingerprint(["7"]))
+
+
+def test_iter_rows_diff():
+    previous_rows = [["1.1.1.1", "a"], ["8.8.8.8", "b"], ["8.8.8.8", "b"]]
+    new_rows = [["8.8.8.8", "b"], ["9.9.9.9", "c"], ["9.9.9.9", "c"], ["0.0.0.0", "d"]]
+
+    diff = list(iter_rows_diff(lambda: iter(previous_rows), lambda: iter(new_rows)))
+
+    assert diff == [
+        ("added", ("9.9.9.9", "c")),
+        ("added", ("0.0.0.0", "d")),
+        ("removed", ("1.1.1.1", "a")),
+    ]
@@ -1,10 +1,11 @@
+import json
 from unittest.mock import create_autospec, Mock
 
 import pytest
 from requests import Response
 
 from datalake import Output
-from datalake.common.output import parse_response
+from datalake.common.output import iter_json_list, parse_response
 
 
 @pytest.mark.parametrize(
@@ -31,3 +32,57 @@ def test_parse_response_default(method, content_type):
     res = parse_response(mock)
 
     assert res == expected_res
+
+
+def _chunks(data: bytes, chunk_size: int):
+    return (data[i : i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_iter_json_list(chunk_size):
+    document = {
+        "advanced_query_hash": "528f01bf39572d6c9026b0097117d863",
+        "count": 12345,
+        "results": [
+            ["0.0.10.240", "eff1572f48d3118eb4aa23d63aa5f58b", 1.5],
+            ["xn--caf-dma.com", "caf\u00e9 \u2603", None],
+            [],
+        ],
+        "nested": {"results": ["not", "this", "one"]},
+    }
+    data = json.dumps(document, ensure_ascii=False, indent=1).encode()
+
+    assert (
+        list(iter_json_list(_chunks(data, chunk_size), "results"))
+        == document["results"]
+    )
+
+
+def test_iter_json_list_numbers_split_between_chunks():
+    numbers = [12.5, 1e5, -3.25e-2, 7, 0.125, 6.02e23, -1, 2.5e-7]
+    data = json.dumps({"results": numbers}).encode()
+    for chunk_size in range(1, len(data) + 1):
+        for first_chunk_size in range(1, 30):
+            chunks = [data[:first_chunk_size]] + list(
+                _chunks(data[first_chunk_size:], chunk_size)
+            )
+            assert list(iter_json_list(chunks, "results")) == numbers
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (b"{}", []),
+        (b'{"results": []}', []),
+        (b'{"count": 0}', []),
+        (b' { "results" : [ 1 , 22 ] } ', [1, 22]),
+    ],
+)
+def test_iter_json_list_edge_cases(data, expected):
+    assert list(iter_json_list(_chunks(data, 1), "results")) == expected
+
+
+@pytest.mark.parametrize("data", [b"", b"[]", b'{"results": [1, 2', b'{"results": 1}'])
+def test_iter_json_list_invalid(data):
+    with pytest.raises(ValueError):
+        list(iter_json_list(_chunks(data, 3), "results"))
@@ -0,0 +1,60 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from datalake.common.polling_strategy import (
+    AdaptivePolling,
+    FixedPolling,
+    PollingStrategy,
+)
+
+
+def _task(eta_in=None, started_ago=None, progress=0, queue_position=None):
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return SimpleNamespace(
+        eta=now + datetime.timedelta(seconds=eta_in) if eta_in is not None else None,
+        started_at=(
+            now - datetime.timedelta(seconds=started_ago)
+            if started_ago is not None
+            else None
+        ),
+        progress=progress,
+        queue_position=queue_position,
+    )
+
+
+@pytest.mark.parametrize(
+    "task_kwargs, expected_interval",
+    [
+        (dict(), 1),  # just created
+        (dict(queue_position=3), 60),
+        (dict(eta_in=20, started_ago=5, progress=10), 20),
+        (dict(eta_in=3600), 60),
+        (dict(eta_in=-10), 1),  # late
+        (dict(started_ago=10, progress=50), 10),
+        (dict(started_ago=2, progress=99), 1),
+    ],
+)
+def test_adaptive_polling(task_kwargs, expected_interval):
+    task = _task(**task_kwargs)
+    polling_strategy = AdaptivePolling(min_interval=1, max_interval=60)
+
+    assert polling_strategy.next_interval(task) == pytest.approx(
+        expected_interval, abs=0.5
+    )
+
+
+def test_adaptive_polling_invalid_bounds():
+    with pytest.raises(ValueError) as err:
+        AdaptivePolling(min_interval=10, max_interval=1)
+    assert str(err.value) == "min_interval can't be greater than max_interval"
+
+
+def test_fixed_polling():
+    assert FixedPolling(5).next_interval(_task(eta_in=20)) == 5
+
+
+def test_polling_strategy_is_abstract():
+    with pytest.raises(TypeError):
+        PollingStrategy()
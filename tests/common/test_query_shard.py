@@ -0,0 +1,118 @@
+import datetime
+
+import pytest
+
+from datalake import AtomType
+from datalake.common.query_shard import AtomTypeShard, QueryShard, TimeRangeShard
+
+query_body = {
+    "AND": [{"AND": [{"field": "risk", "range": {"gt": 60}, "type": "filter"}]}]
+}
+
+
+def test_time_range_shard():
+    shard = TimeRangeShard(
+        "first_seen", datetime.datetime(2023, 1, 1), datetime.datetime(2023, 1, 3)
+    )
+
+    assert shard.query_body(query_body) == {
+        "AND": [
+            {"AND": [{"field": "risk", "range": {"gt": 60}, "type": "filter"}]},
+            {
+                "AND": [
+                    {
+                        "field": "first_seen",
+                        "range": {
+                            "gte": "2023-01-01T00:00:00.000Z",
+                            "lt": "2023-01-03T00:00:00.000Z",
+                        },
+                        "type": "filter",
+                    }
+                ]
+            },
+        ]
+    }
+    first_half, second_half = shard.split()
+    assert (first_half.start, first_half.end) == (
+        datetime.datetime(2023, 1, 1),
+        datetime.datetime(2023, 1, 2),
+    )
+    assert (second_half.start, second_half.end) == (
+        datetime.datetime(2023, 1, 2),
+        datetime.datetime(2023, 1, 3),
+    )
+
+
+def test_time_range_shard_min_duration():
+    shard = TimeRangeShard(
+        "last_updated",
+        datetime.datetime(2023, 1, 1, 0, 0),
+        datetime.datetime(2023, 1, 1, 0, 3),
+    )
+    assert len(shard.split()) == 2
+    assert shard.split()[0].split() == []
+
+
+def test_time_range_shard_windows():
+    shards = TimeRangeShard.windows(
+        "first_seen",
+        datetime.datetime(2023, 1, 1),
+        datetime.datetime(2023, 1, 1, 5),
+        datetime.timedelta(hours=2),
+    )
+    assert [(shard.start.hour, shard.end.hour) for shard in shards] == [
+        (0, 2),
+        (2, 4),
+        (4, 5),
+    ]
+
+
+@pytest.mark.parametrize(
+    "args, error",
+    [
+        (
+            ("risk", datetime.datetime(2023, 1, 1), datetime.datetime(2023, 1, 2)),
+            "field needs to be one of first_seen, last_updated",
+        ),
+        (
+            (
+                "first_seen",
+                datetime.datetime(2023, 1, 2),
+                datetime.datetime(2023, 1, 1),
+            ),
+            "start needs to be before end",
+        ),
+    ],
+)
+def test_time_range_shard_invalid(args, error):
+    with pytest.raises(ValueError) as err:
+        TimeRangeShard(*args)
+    assert str(err.value) == error
+
+
+def test_atom_type_shard():
+    shard = AtomTypeShard([AtomType.IP, AtomType.DOMAIN, AtomType.URL])
+
+    assert shard.query_body({"OR": []}) == {
+        "AND": [
+            {"OR": []},
+            {
+                "AND": [
+                    {
+                        "field": "atom_type",
+                        "multi_values": ["ip", "domain", "url"],
+                        "type": "filter",
+                    }
+                ]
+            },
+        ]
+    }
+    ip_shard, other_shard = shard.split()
+    assert ip_shard.atom_types == [AtomType.IP]
+    assert other_shard.atom_types == [AtomType.DOMAIN, AtomType.URL]
+    assert ip_shard.split() == []
+
+
+def test_query_shard_is_abstract():
+    with pytest.raises(TypeError):
+        QueryShard()
@@ -0,0 +1,36 @@
+from datalake.endpoints.endpoint import build_session
+from tests.common.fixture import datalake  # noqa needed fixture import
+
+
+def test_endpoints_share_the_datalake_session(datalake):
+    endpoints = [
+        datalake.MyAccount,
+        datalake.AdvancedSearch,
+        datalake.BulkSearch,
+        datalake.FilteredThreatEntity,
+        datalake.Comments,
+        datalake.Tags,
+        datalake.Sources,
+        datalake.Threats,
+        datalake.Sightings,
+    ]
+    assert all(endpoint.session is datalake.session for endpoint in endpoints)
+    assert datalake.Threats.token_manager.session is datalake.session
+
+
+def test_build_session_pool_settings():
+    session = build_session(pool_connections=2, pool_maxsize=50, pool_block=True)
+
+    adapter = session.get_adapter("https://datalake.cert.orangecyberdefense.com/")
+    assert adapter is session.get_adapter("http://some.host/")  # a single transport
+    assert adapter._pool_connections == 2
+    assert adapter._pool_maxsize == 50
+    assert adapter._pool_block is True
+    assert adapter.max_retries.status_forcelist == [429, 500, 502, 503, 504]
+    assert session.headers["Connection"] == "keep-alive"
+
+
+def test_build_session_without_keep_alive():
+    session = build_session(keep_alive=False)
+
+    assert session.headers["Connection"] == "close"
@@ -0,0 +1,90 @@
+import gzip
+import json
+import random
+from unittest import mock
+
+from datalake.common.snapshot import (
+    is_snapshot,
+    iter_snapshot_rows,
+    load_snapshot,
+    read_snapshot_header,
+    save_snapshot,
+    write_sorted_snapshot,
+)
+
+bulk_search_result = {
+    "advanced_query_hash": "528f01bf39572d6c9026b0097117d863",
+    "bulk_search_hash": "9b35f62fe46ee8fe361787b0882ceda7",
+    "results": [
+        ["0.0.10.240", "eff1572f48d3118eb4aa23d63aa5f58b"],
+        ["0.0.10.45", "ca24f9dc63198ecc0572a29f4deaaa54"],
+        ["0.0.10.244", "7c678c25e5c5a05952dea784934f880b"],
+    ],
+}
+
+
+def test_is_snapshot():
+    assert is_snapshot("hash-1700046310.ndjson.gz")
+    assert not is_snapshot("hash-1700046310.json")
+
+
+def test_save_snapshot(tmp_path):
+    snapshot_path = str(tmp_path / "hash-1700046310.ndjson.gz")
+
+    save_snapshot(snapshot_path, bulk_search_result, sort_key=lambda row: row[1])
+
+    with gzip.open(snapshot_path, "rt") as snapshot_file:
+        lines = snapshot_file.read().splitlines()
+    assert json.loads(lines[0]) == {
+        "advanced_query_hash": "528f01bf39572d6c9026b0097117d863",
+        "bulk_search_hash": "9b35f62fe46ee8fe361787b0882ceda7",
+    }
+    assert lines[1:] == [
+        '["0.0.10.244","7c678c25e5c5a05952dea784934f880b"]',
+        '["0.0.10.45","ca24f9dc63198ecc0572a29f4deaaa54"]',
+        '["0.0.10.240","eff1572f48d3118eb4aa23d63aa5f58b"]',
+    ]
+
+
+def test_iter_snapshot_rows(tmp_path):
+    snapshot_path = str(tmp_path / "hash-1700046310.ndjson.gz")
+    save_snapshot(snapshot_path, bulk_search_result)
+
+    rows = list(iter_snapshot_rows(snapshot_path))
+
+    assert rows == sorted(bulk_search_result["results"])
+    assert load_snapshot(snapshot_path) == {
+        **bulk_search_result,
+        "results": sorted(bulk_search_result["results"]),
+    }
+
+
+def test_empty_snapshot(tmp_path):
+    snapshot_path = str(tmp_path / "hash-1700046310.ndjson.gz")
+    save_snapshot(snapshot_path, {"advanced_query_hash": "hash", "results": []})
+
+    assert list(iter_snapshot_rows(snapshot_path)) == []
+    assert load_snapshot(snapshot_path) == {
+        "advanced_query_hash": "hash",
+        "results": [],
+    }
+
+
+def test_write_sorted_snapshot_spills_chunks(tmp_path):
+    snapshot_path = str(tmp_path / "hash-1700046310.ndjson.gz")
+    rows = [[f"atom_{i}", f"hashkey_{i:03}"] for i in range(100)]
+    random.seed(0)
+    random.shuffle(rows)
+
+    with mock.patch("datalake.common.snapshot.SORT_CHUNK_SIZE", 7):
+        write_sorted_snapshot(
+            snapshot_path,
+            {"query_fields": ["atom_value"]},
+            iter(rows),
+            lambda row: row[1],
+        )
+
+    assert read_snapshot_header(snapshot_path) == {"query_fields": ["atom_value"]}
+    assert list(iter_snapshot_rows(snapshot_path)) == sorted(
+        rows, key=lambda row: row[1]
+    )
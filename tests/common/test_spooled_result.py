@@ -0,0 +1,42 @@
+import io
+import json
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from datalake import Output
+from datalake.common.spooled_result import SpooledResult, iter_result_file
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_iter_result_file_csv(chunk_size):
+    content = 'atom_value,description\r\n8.8.8.8,"multi\nline é"\r\n1.1.1.1,\r\n'
+
+    with patch("datalake.common.spooled_result.CHUNK_SIZE", chunk_size):
+        rows = list(iter_result_file(io.BytesIO(content.encode()), Output.CSV, []))
+
+    assert rows == [
+        {"atom_value": "8.8.8.8", "description": "multi\nline é"},
+        {"atom_value": "1.1.1.1", "description": ""},
+    ]
+
+
+def test_spooled_result(tmp_path):
+    content = json.dumps(
+        {"results": [["hashkey1", "8.8.8.8"], ["hashkey2", "1.1.1.1"]]}
+    )
+    spool = tempfile.SpooledTemporaryFile()
+    spool.write(content.encode())
+    expected_results = [
+        {"threat_hashkey": "hashkey1", "atom_value": "8.8.8.8"},
+        {"threat_hashkey": "hashkey2", "atom_value": "1.1.1.1"},
+    ]
+
+    with SpooledResult(spool, Output.JSON, ["threat_hashkey", "atom_value"]) as result:
+        assert list(result) == expected_results
+        assert list(result) == expected_results  # can be read several times
+        result.save(tmp_path / "result.json")
+
+    assert spool.closed
+    assert (tmp_path / "result.json").read_text() == content
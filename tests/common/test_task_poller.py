@@ -0,0 +1,52 @@
+from datalake.common.task_poller import TaskPoller
+
+
+def test_task_poller_polls_each_task_until_finished():
+    remaining_polls = {"task_a": 3, "task_b": 1}
+    polls = []
+
+    def poll(task_uuid):
+        polls.append(task_uuid)
+        remaining_polls[task_uuid] -= 1
+        if remaining_polls[task_uuid] == 0:
+            return {"state": "DONE", "uuid": task_uuid}
+        return None
+
+    task_poller = TaskPoller(poll, timeout=10, max_back_off_time=0.01)
+    task_poller.add("task_a")
+    task_poller.add("task_b")
+    assert len(task_poller) == 2
+
+    assert task_poller.wait_for_one() == "task_b"
+    assert task_poller.wait_for_all() == {
+        "task_a": {"state": "DONE", "uuid": "task_a"},
+        "task_b": {"state": "DONE", "uuid": "task_b"},
+    }
+    assert len(task_poller) == 0
+    assert polls == ["task_a", "task_b", "task_a", "task_a"]
+
+
+def test_task_poller_back_off():
+    polls = []
+    task_poller = TaskPoller(
+        lambda task_uuid: polls.append(task_uuid),
+        timeout=60,
+        max_back_off_time=30,
+        initial_back_off_time=10,
+    )
+    task_poller.add("task_a")
+
+    task_poller.poll_due()
+    task_poller.poll_due()  # the next poll is not due yet
+
+    assert polls == ["task_a"]
+    assert len(task_poller) == 1
+
+
+def test_task_poller_timeout():
+    task_poller = TaskPoller(
+        lambda task_uuid: None, timeout=0.05, max_back_off_time=0.01
+    )
+    task_poller.add("task_a")
+
+    assert task_poller.wait_for_all() == {"task_a": None}
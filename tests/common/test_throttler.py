@@ -0,0 +1,128 @@
+import asyncio
+import random
+import threading
+from time import monotonic
+
+import pytest
+
+from datalake.common import throttler
+from datalake.common.throttler import RateLimiter, throttle
+from tests.common.fixture import datalake  # noqa needed fixture import
+
+
+def test_rate_limiter_invalid_parameters():
+    with pytest.raises(ValueError) as err:
+        RateLimiter(period=0, call_per_period=5)
+    assert str(err.value) == "period and call_per_period need to be positive"
+
+
+def test_rate_limiter_try_acquire():
+    rate_limiter = RateLimiter(period=60, call_per_period=3)
+
+    assert [rate_limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_rate_limiter_acquire_waits_for_a_token():
+    rate_limiter = RateLimiter(period=0.2, call_per_period=2)
+    start = monotonic()
+    for _ in range(4):
+        rate_limiter.acquire()
+    assert monotonic() - start >= 0.19  # the last two calls had to wait for a refill
+
+
+def test_rate_limiter_acquire_async():
+    rate_limiter = RateLimiter(period=0.2, call_per_period=2)
+
+    async def acquire_all():
+        await asyncio.gather(*(rate_limiter.acquire_async() for _ in range(4)))
+
+    start = monotonic()
+    asyncio.run(acquire_all())
+    assert monotonic() - start >= 0.19
+
+
+def test_rate_limiter_is_shared_between_threads():
+    rate_limiter = RateLimiter(period=0.5, call_per_period=5)
+    call_times = []
+    lock = threading.Lock()
+
+    def call():
+        rate_limiter.acquire()
+        with lock:
+            call_times.append(monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(10)]
+    start = monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([t for t in call_times if t - start < 0.09]) <= 5  # only the burst
+    assert max(call_times) - start >= 0.49
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(throttler, "monotonic", fake_clock.monotonic)
+    monkeypatch.setattr(throttler, "sleep", fake_clock.sleep)
+    return fake_clock
+
+
+def test_rate_limiter_no_burst_over_the_quota(clock):
+    rate_limiter = RateLimiter(period=1, call_per_period=5)
+    start = clock.now
+    call_times = []
+    for _ in range(20):
+        rate_limiter.acquire()
+        call_times.append(clock.now)
+
+    assert len([t for t in call_times if t < start + 1]) == 5
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rate_limiter_sliding_window(clock, seed):
+    random.seed(seed)
+    period, call_per_period = 1, 5
+    rate_limiter = RateLimiter(period=period, call_per_period=call_per_period)
+    call_times = []
+    for _ in range(200):
+        clock.now += random.choice([0, 0, 0, 0.125, 0.25, 0.5, 1.5])
+        if random.random() < 0.3:
+            if rate_limiter.try_acquire():
+                call_times.append(clock.now)
+        else:
+            rate_limiter.acquire()
+            call_times.append(clock.now)
+
+    for i, call_time in enumerate(call_times):
+        in_window = [t for t in call_times[i:] if t < call_time + period]
+        assert len(in_window) <= call_per_period
+
+
+def test_throttle_decorator():
+    @throttle(period=0.2, call_per_period=1)
+    def f():
+        return "hello world"
+
+    start = monotonic()
+    assert [f() for _ in range(2)] == ["hello world", "hello world"]
+    assert monotonic() - start >= 0.19
+
+
+def test_endpoints_share_the_datalake_rate_limiter(datalake):
+    assert datalake.Threats.rate_limiter is datalake.rate_limiter
+    assert datalake.BulkSearch.rate_limiter is datalake.rate_limiter
+    assert datalake.Sightings.rate_limiter is datalake.rate_limiter
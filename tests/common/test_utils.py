@@ -1,4 +1,18 @@
+import datetime
+import io
+import json
+import threading
+import time
+
+import pytest
+
 from datalake.common.utils import (
+    CsvHeaderDedupWriter,
+    JsonListWriter,
+    ResponseAggregator,
+    concurrent_map,
+    split_iterable,
+    split_time_range,
     join_dicts,
     check_normalized_timestamp,
     convert_date_to_normalized_timestamp,
@@ -41,6 +55,98 @@ def test_join_dicts():
     }
 
 
+def test_response_aggregator_json():
+    aggregator = ResponseAggregator()
+    aggregator.add({"ip": [{"atom_value": "1.1.1.1"}], "search_hashkey": ["h1"]})
+    aggregator.add(
+        {"ip": [{"atom_value": "1.1.1.2"}], "domain": [{"atom_value": "a.com"}]}
+    )
+    aggregator.add({"search_hashkey": ["h2"]})
+
+    assert aggregator.json() == {
+        "ip": [{"atom_value": "1.1.1.1"}, {"atom_value": "1.1.1.2"}],
+        "domain": [{"atom_value": "a.com"}],
+        "search_hashkey": ["h1", "h2"],
+    }
+
+
+def test_response_aggregator_csv():
+    aggregator = ResponseAggregator()
+    aggregator.add("atom_value,hashkey\n1.1.1.1,h1\n")
+    aggregator.add("atom_value,hashkey\n1.1.1.2,h2\n1.1.1.3,h3")
+
+    assert aggregator.csv() == "atom_value,hashkey\n1.1.1.1,h1\n1.1.1.2,h2\n1.1.1.3,h3"
+
+
+def test_response_aggregator_csv_empty_and_header_only_responses():
+    aggregator = ResponseAggregator()
+    aggregator.add("")
+    aggregator.add("atom_value,hashkey\n")
+    aggregator.add("\n")
+    aggregator.add("atom_value,hashkey\n1.1.1.1,h1\n")
+    aggregator.add("atom_value,hashkey")
+    aggregator.add("atom_value,hashkey\n1.1.1.2,h2")
+
+    assert aggregator.csv() == "atom_value,hashkey\n1.1.1.1,h1\n1.1.1.2,h2"
+
+
+def test_csv_header_dedup_writer():
+    output = io.StringIO()
+    writer = CsvHeaderDedupWriter(output)
+    writer.write("atom_value,hashkey\n1.1.1.1,h1\n")
+    writer.write("atom_value,hashkey\n1.1.1.2,h2")
+
+    assert writer.header == "atom_value,hashkey"
+    assert output.getvalue() == "atom_value,hashkey\n1.1.1.1,h1\n1.1.1.2,h2\n"
+
+
+def test_csv_header_dedup_writer_empty_response():
+    output = io.StringIO()
+    writer = CsvHeaderDedupWriter(output)
+    writer.write("")
+    writer.write("atom_value,hashkey\n1.1.1.1,h1\n")
+
+    assert writer.count == 1
+    assert output.getvalue() == "atom_value,hashkey\n1.1.1.1,h1\n"
+
+
+def test_json_list_writer():
+    output = io.StringIO()
+    writer = JsonListWriter(output)
+    writer.write([{"a": 1}])
+    writer.write([])
+    writer.write([{"b": 2}, {"c": 3}])
+    writer.close()
+
+    assert json.loads(output.getvalue()) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+
+def test_split_time_range():
+    assert split_time_range(
+        "2023-09-14T00:00:00.000Z",
+        "2023-09-14T23:59:59.999Z",
+        datetime.timedelta(hours=8),
+    ) == [
+        ("2023-09-14T00:00:00.000Z", "2023-09-14T07:59:59.999Z"),
+        ("2023-09-14T08:00:00.000Z", "2023-09-14T15:59:59.999Z"),
+        ("2023-09-14T16:00:00.000Z", "2023-09-14T23:59:59.999Z"),
+    ]
+    assert split_time_range(
+        "2023-09-14T00:00:00.000Z",
+        "2023-09-14T10:00:00.000Z",
+        datetime.timedelta(hours=8),
+    ) == [
+        ("2023-09-14T00:00:00.000Z", "2023-09-14T07:59:59.999Z"),
+        ("2023-09-14T08:00:00.000Z", "2023-09-14T10:00:00.000Z"),
+    ]
+    with pytest.raises(ValueError):
+        split_time_range(
+            "2023-09-14T00:00:00.000Z",
+            "2023-09-14T10:00:00.000Z",
+            datetime.timedelta(0),
+        )
+
+
 def test_normalized_timestamp():
     assert check_normalized_timestamp("2023-09-14T15:00:00.000Z") == True
     assert check_normalized_timestamp("2023-09-15T15:12:13.825Z") == True
@@ -59,3 +165,57 @@ def test_convert_date_to_normalized_timestamp():
         convert_date_to_normalized_timestamp("2023-07-18", False)
         == "2023-07-18T23:59:59.999Z"
     )
+
+
+def test_split_iterable():
+    assert list(split_iterable(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(split_iterable([], 2)) == []
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_concurrent_map_ordered(max_workers):
+    def slow_square(x):
+        time.sleep(0.002 * (5 - x % 5))
+        return x * x
+
+    results = concurrent_map(
+        slow_square, range(20), max_workers=max_workers, ordered=True
+    )
+
+    assert list(results) == [x * x for x in range(20)]
+
+
+def test_concurrent_map_unordered_is_lazy():
+    consumed = []
+    running = []
+    max_running = []
+    lock = threading.Lock()
+
+    def items():
+        for i in range(50):
+            consumed.append(i)
+            yield i
+
+    def work(x):
+        with lock:
+            running.append(x)
+            max_running.append(len(running))
+        time.sleep(0.005)
+        with lock:
+            running.remove(x)
+        return x
+
+    results = concurrent_map(work, items(), max_workers=3)
+    first = next(results)
+
+    assert len(consumed) <= 12  # pending calls and their refills, not the 50 items
+    assert sorted([first] + list(results)) == list(range(50))
+    assert max(max_running) <= 3
+
+
+def test_concurrent_map_raises_errors():
+    def fail(x):
+        raise ValueError(f"error {x}")
+
+    with pytest.raises(ValueError):
+        list(concurrent_map(fail, range(3), max_workers=2))
@@ -0,0 +1,74 @@
+import datetime
+
+from datalake.common.watch_state import WatchStateStore
+
+first_run = datetime.datetime(2023, 11, 14, 13, 49, 35)
+second_run = datetime.datetime(2023, 11, 15, 12, 5, 10)
+third_run = datetime.datetime(2023, 11, 16, 8, 0, 0)
+
+
+def test_watch_state_first_run(tmp_path):
+    with WatchStateStore(str(tmp_path / "state.sqlite")) as store:
+        assert store.last_run("hash") is None
+
+        diff = store.apply_run("hash", [["1.1.1.1", "a"], ["2.2.2.2", "b"]], first_run)
+
+        assert diff == {}
+        assert store.last_run("hash") == first_run
+        assert list(store.threats("hash")) == [
+            ("1.1.1.1", "a", first_run, first_run),
+            ("2.2.2.2", "b", first_run, first_run),
+        ]
+        assert list(store.threats("other_hash")) == []
+
+
+def test_watch_state_delta(tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    with WatchStateStore(path) as store:
+        store.apply_run("hash", [["1.1.1.1", "a"], ["2.2.2.2", "b"]], first_run)
+    with WatchStateStore(path) as store:
+        diff = store.apply_run(
+            "hash", [["2.2.2.2", "b"], ["3.3.3.3", "c"], ["3.3.3.3", "c"]], second_run
+        )
+
+        assert diff == {
+            "from": "2023-11-14 13:49:35",
+            "to": "2023-11-15 12:05:10",
+            "added": {("3.3.3.3", "c")},
+            "removed": {("1.1.1.1", "a")},
+        }
+        assert list(store.threats("hash")) == [
+            ("2.2.2.2", "b", first_run, second_run),
+            ("3.3.3.3", "c", second_run, second_run),
+        ]
+        assert list(store.threats("hash", include_removed=True))[0] == (
+            "1.1.1.1",
+            "a",
+            first_run,
+            first_run,
+        )
+
+
+def test_watch_state_threat_added_again(tmp_path):
+    with WatchStateStore(str(tmp_path / "state.sqlite")) as store:
+        store.apply_run("hash", [["1.1.1.1", "a"]], first_run)
+        store.apply_run("hash", [], second_run)
+        diff = store.apply_run("hash", [["1.1.1.1", "a"]], third_run)
+
+        assert diff["added"] == {("1.1.1.1", "a")}
+        assert diff["removed"] == {}
+        assert list(store.threats("hash")) == [("1.1.1.1", "a", first_run, third_run)]
+
+
+def test_watch_state_unchanged_run(tmp_path):
+    with WatchStateStore(str(tmp_path / "state.sqlite")) as store:
+        store.apply_run("hash", [["1.1.1.1", "a"]], first_run)
+        store.apply_run("other_hash", [["2.2.2.2", "b"]], first_run)
+        diff = store.apply_run("hash", [["1.1.1.1", "a"]], second_run)
+
+        assert diff["added"] == {}
+        assert diff["removed"] == {}
+        assert store.last_run("other_hash") == first_run
+        assert list(store.threats("other_hash")) == [
+            ("2.2.2.2", "b", first_run, first_run)
+        ]
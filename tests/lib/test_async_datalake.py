@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+import pytest
+import responses
+
+from datalake import AsyncDatalake, AtomType
+from tests.common.fixture import TestData, async_datalake  # noqa needed fixture import
+
+bulk_lookup_url = (
+    TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+    + TestData.TEST_CONFIG["api_version"]
+    + TestData.TEST_CONFIG["endpoints"]["threats-bulk-lookup"]
+)
+tags_url = (
+    TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+    + TestData.TEST_CONFIG["api_version"]
+    + TestData.TEST_CONFIG["endpoints"]["threats-tags"]
+)
+
+
+@responses.activate
+def test_async_bulk_lookup(async_datalake: AsyncDatalake):
+    def request_callback(req):
+        body = json.loads(req.body)
+        resp = {
+            "domain": [
+                {"atom_value": domain, "threat_found": False}
+                for domain in body["domain"]
+            ]
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps(resp)
+
+    responses.add_callback(responses.POST, bulk_lookup_url, callback=request_callback)
+
+    async def lookup_all():
+        return await asyncio.gather(
+            *(
+                async_datalake.Threats.bulk_lookup(
+                    [f"domain{i}.com"], atom_type=AtomType.DOMAIN
+                )
+                for i in range(10)
+            )
+        )
+
+    results = asyncio.run(lookup_all())
+    async_datalake.close()
+
+    assert len(responses.calls) == 10
+    assert [result["domain"][0]["atom_value"] for result in results] == [
+        f"domain{i}.com" for i in range(10)
+    ]
+
+
+@responses.activate
+def test_async_endpoint_errors_are_raised(async_datalake: AsyncDatalake):
+    responses.add(
+        responses.POST,
+        tags_url.replace("{hashkey}", "some_hashkey"),
+        json={"message": "some error"},
+        status=422,
+    )
+
+    async def add_tag():
+        async with async_datalake as dtl:
+            return await dtl.Tags.add_to_threat("some_hashkey", ["some_tag"])
+
+    with pytest.raises(ValueError) as err:
+        asyncio.run(add_tag())
+    assert str(err.value) == "422 HTTP code: some error"
+
+
+@responses.activate
+def test_async_bulk_lookup_iter(async_datalake: AsyncDatalake):
+    def request_callback(req):
+        body = json.loads(req.body)
+        resp = {
+            "domain": [
+                {"atom_value": domain, "threat_found": False}
+                for domain in body["domain"]
+            ]
+        }
+        return 200, {"Content-Type": "application/json"}, json.dumps(resp)
+
+    responses.add_callback(responses.POST, bulk_lookup_url, callback=request_callback)
+    atom_values = [f"domain{i}.com" for i in range(250)]
+
+    async def lookup_all():
+        async with async_datalake as dtl:
+            return [
+                batch_result
+                async for batch_result in dtl.Threats.bulk_lookup_iter(
+                    atom_values, atom_type=AtomType.DOMAIN
+                )
+            ]
+
+    results = asyncio.run(lookup_all())
+
+    assert len(results) == len(responses.calls) == 3
+    assert sorted(
+        threat["atom_value"] for result in results for threat in result["domain"]
+    ) == sorted(atom_values)
+
+
+@responses.activate
+def test_async_iter_threats_with_comments(async_datalake: AsyncDatalake):
+    threats_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats"]
+    )
+    comments_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-comments"]
+    )
+    responses.add(
+        responses.GET,
+        threats_url.format(hashkey="hashkey_1"),
+        json={"hashkey": "hashkey_1"},
+    )
+    responses.add(
+        responses.GET,
+        comments_url.format(hashkey="hashkey_1"),
+        json={"count": 0, "results": []},
+    )
+    responses.add(responses.GET, threats_url.format(hashkey="hashkey_2"), json={})
+
+    async def get_all():
+        async with async_datalake as dtl:
+            return {
+                hashkey: threat
+                async for hashkey, threat in dtl.Threats.iter_threats_with_comments(
+                    ["hashkey_1", "hashkey_2"]
+                )
+            }
+
+    assert asyncio.run(get_all()) == {
+        "hashkey_1": {
+            "hashkey": "hashkey_1",
+            "comments": {"count": 0, "results": []},
+        },
+        "hashkey_2": None,
+    }
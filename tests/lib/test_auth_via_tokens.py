@@ -1,5 +1,7 @@
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 import pytest
@@ -123,6 +125,61 @@ def test_access_token_expired(datalake, caplog):
     ]
 
 
+@responses.activate
+def test_access_token_expired_concurrent_requests(datalake):
+    expected_json = {"wow.com": "bad"}
+    responses.add_callback(
+        responses.GET,
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-lookup"],
+        callback=partial(
+            lookup_callback,
+            expired_token="12345",
+            valid_token="refreshed_token",
+            response_on_valid_token=expected_json,
+        ),
+        content_type="application/json",
+    )
+    refresh_calls = []
+    requests_rejected = threading.Barrier(8, timeout=5)
+
+    def refresh_token_callback(request):
+        refresh_calls.append(request)
+        return 200, {}, json.dumps({"access_token": "refreshed_token"})
+
+    responses.add_callback(
+        responses.POST,
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["refresh-token"],
+        callback=refresh_token_callback,
+        content_type="application/json",
+    )
+    token_manager = datalake.Threats.token_manager
+    process_auth_error = token_manager.process_auth_error
+
+    def process_auth_error_together(*args, **kwargs):
+        requests_rejected.wait()  # every request got a 401 before the token is refreshed
+        return process_auth_error(*args, **kwargs)
+
+    with patch.object(
+        token_manager, "process_auth_error", side_effect=process_auth_error_together
+    ):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: datalake.Threats.lookup(
+                        atom_value="wow.com", atom_type=AtomType.DOMAIN
+                    ),
+                    range(8),
+                )
+            )
+
+    assert results == [expected_json] * 8
+    assert len(refresh_calls) == 1
+
+
 @responses.activate
 def test_refresh_token_expired(datalake, caplog):
     caplog.set_level(level=logging.INFO, logger="OCD_DTL")
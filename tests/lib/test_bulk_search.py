@@ -1,8 +1,12 @@
 import asyncio
 import copy
 import datetime
+import gzip
+import io
 import json
+import re
 import tempfile
+import zipfile
 from http.client import ResponseNotReady
 
 import pytest
@@ -15,6 +19,11 @@ from datalake import (
     Output,
     BulkSearchFailedError,
     BulkSearchNotFound,
+    BulkSearchScheduler,
+    BulkSearchCache,
+    PollingStrategy,
+    TimeRangeShard,
+    SpooledResult,
 )
 from tests.common.fixture import TestData, datalake  # noqa needed fixture import
 
@@ -174,6 +183,55 @@ def test_bulk_search_query_body(datalake: Datalake):
     assert bs.uuid == "d9c00380-2784-4386-9bc3-aff35cfeeb41"
 
 
+@pytest.mark.parametrize(
+    "cached_state, reused",
+    [("IN_PROGRESS", True), ("DONE", True), ("CANCELLED", False)],
+)
+@responses.activate
+def test_bulk_search_cache(datalake: Datalake, tmp_path, cached_state, reused):
+    bs_creation_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search"]
+    )
+    bs_status_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-tasks"]
+    )
+    created_uuids = []
+
+    def create_callback(request):
+        created_uuids.append(f"uuid{len(created_uuids)}")
+        return 200, {}, json.dumps({"task_uuid": created_uuids[-1]})
+
+    def status_callback(request):
+        result = copy.deepcopy(bs_status_json["results"][0])
+        result["uuid"] = json.loads(request.body)["task_uuid"]
+        result["state"] = cached_state
+        return 200, {}, json.dumps({"count": 1, "results": [result]})
+
+    responses.add_callback(responses.POST, bs_creation_url, callback=create_callback)
+    responses.add_callback(responses.POST, bs_status_url, callback=status_callback)
+    cache = BulkSearchCache(str(tmp_path))
+
+    first_task = datalake.BulkSearch.create_task(
+        query_hash="123", query_fields=["atom_value"], cache=cache
+    )
+    second_task = datalake.BulkSearch.create_task(
+        query_hash="123", query_fields=["atom_value"], cache=cache
+    )
+    other_task = datalake.BulkSearch.create_task(query_hash="123", cache=cache)
+
+    assert first_task.uuid == "uuid0"
+    if reused:
+        assert second_task.uuid == "uuid0"
+        assert other_task.uuid == "uuid1"
+    else:
+        assert second_task.uuid == "uuid1"
+        assert other_task.uuid == "uuid2"
+
+
 @responses.activate
 def test_bulk_search_task_update(bulk_search_task: BulkSearchTask):
     assert bulk_search_task.queue_position is None
@@ -328,6 +386,77 @@ def test_bulk_search_task_download_sync(bulk_search_task: BulkSearchTask):
     assert download_result == expected_result
 
 
+@pytest.mark.parametrize("file_size, spooled", [(1000, True), (10, False)])
+@responses.activate
+def test_bulk_search_task_download_sync_max_in_memory_result_bytes(
+    bulk_search_task: BulkSearchTask, file_size, spooled
+):
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", bulk_search_task.uuid
+        )
+    )
+    result = {"results": [["eff1572f48d3118eb4aa23d63aa5f58b", "0.0.10.240"]]}
+    responses.add(responses.GET, bs_download_url, json=result, status=200)
+    bulk_search_task._endpoint.max_in_memory_result_bytes = 100
+    bulk_search_task.file_size = file_size
+
+    download_result = bulk_search_task.download_sync()
+
+    if spooled:
+        assert isinstance(download_result, SpooledResult)
+        with download_result:
+            assert list(download_result) == [
+                {
+                    "threat_hashkey": "eff1572f48d3118eb4aa23d63aa5f58b",
+                    "atom_value": "0.0.10.240",
+                }
+            ]
+    else:
+        assert download_result == result
+
+
+@responses.activate
+def test_bulk_search_task_download_sync_polling_strategy(
+    bulk_search_task: BulkSearchTask,
+):
+    bs_status_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-tasks"]
+    )
+    bs_update_json = copy.deepcopy(bs_status_json)
+    bs_update_json["results"][0]["state"] = "IN_PROGRESS"
+    bs_update_json["results"][0]["progress"] = 50
+    responses.add(responses.POST, bs_status_url, json=bs_update_json, status=200)
+    responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", bulk_search_task.uuid
+        )
+    )
+    responses.add(responses.GET, bs_download_url, json="result", status=200)
+    bulk_search_task.state = BulkSearchTaskState.IN_PROGRESS
+    bulk_search_task.progress = 10
+
+    class RecordingPolling(PollingStrategy):
+        def __init__(self):
+            self.progresses = []
+
+        def next_interval(self, task):
+            self.progresses.append(task.progress)
+            return 0
+
+    polling_strategy = RecordingPolling()
+
+    assert bulk_search_task.download_sync(polling_strategy=polling_strategy) == "result"
+    assert polling_strategy.progresses == [10, 50]
+
+
 @responses.activate
 def test_bulk_search_task_download_sync_stream_to_file(
     bulk_search_task: BulkSearchTask,
@@ -400,6 +529,341 @@ def test_bulk_search_task_download_sync_stream_to_file_zip(
     assert download_result == expected_result
 
 
+@responses.activate
+def test_bulk_search_task_iter_results(bulk_search_task: BulkSearchTask):
+    task_uuid = bulk_search_task.uuid
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", task_uuid
+        )
+    )
+    result = {
+        "advanced_query_hash": "de70393f1c250ae67566ec37c2032d1b",
+        "bulk_search_hash": "ff2d2dc27f17f115d85647dced7a3106",
+        "results": [
+            ["eff1572f48d3118eb4aa23d63aa5f58b", "0.0.10.240"],
+            ["ca24f9dc63198ecc0572a29f4deaaa54", "0.0.10.45"],
+        ],
+    }
+    responses.add(responses.GET, bs_download_url, json=result, status=200)
+    bulk_search_task.STREAM_CHUNK_SIZE = 8
+
+    results = list(bulk_search_task.iter_results())
+
+    assert results == [
+        {
+            "threat_hashkey": "eff1572f48d3118eb4aa23d63aa5f58b",
+            "atom_value": "0.0.10.240",
+        },
+        {
+            "threat_hashkey": "ca24f9dc63198ecc0572a29f4deaaa54",
+            "atom_value": "0.0.10.45",
+        },
+    ]
+
+
+def _zip_archive(files: dict) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zip_file:
+        for name, content in files.items():
+            zip_file.writestr(name, content)
+    return archive.getvalue()
+
+
+@pytest.mark.parametrize(
+    "output, files, expected_results",
+    [
+        (
+            Output.JSON_ZIP,
+            {
+                "result.json": json.dumps(
+                    {
+                        "bulk_search_hash": "ff2d2dc27f17f115d85647dced7a3106",
+                        "results": [["eff1572f48d3118eb4aa23d63aa5f58b", "0.0.10.240"]],
+                    }
+                )
+            },
+            [
+                {
+                    "threat_hashkey": "eff1572f48d3118eb4aa23d63aa5f58b",
+                    "atom_value": "0.0.10.240",
+                }
+            ],
+        ),
+        (
+            Output.CSV_ZIP,
+            {
+                "result.csv": "threat_hashkey,atom_value\r\n"
+                "eff1572f48d3118eb4aa23d63aa5f58b,0.0.10.240\r\n"
+            },
+            [
+                {
+                    "threat_hashkey": "eff1572f48d3118eb4aa23d63aa5f58b",
+                    "atom_value": "0.0.10.240",
+                }
+            ],
+        ),
+        (
+            Output.STIX_ZIP,
+            {
+                "bundle_1.json": json.dumps(
+                    {"type": "bundle", "objects": [{"type": "indicator", "id": "1"}]}
+                ),
+                "bundle_2.json": json.dumps(
+                    {"type": "bundle", "objects": [{"type": "indicator", "id": "2"}]}
+                ),
+            },
+            [{"type": "indicator", "id": "1"}, {"type": "indicator", "id": "2"}],
+        ),
+    ],
+)
+@responses.activate
+def test_bulk_search_task_iter_zip_results(
+    bulk_search_task: BulkSearchTask, output, files, expected_results
+):
+    task_uuid = bulk_search_task.uuid
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", task_uuid
+        )
+    )
+    responses.add(
+        responses.GET,
+        bs_download_url,
+        body=_zip_archive(files),
+        status=200,
+        content_type=output.value,
+    )
+    bulk_search_task.ZIP_SPOOL_MAX_SIZE = 16  # spooled to a temporary file
+
+    results = list(bulk_search_task.iter_zip_results(output=output))
+
+    assert results == expected_results
+    assert responses.calls[0].request.headers["Accept"] == output.value
+
+
+def test_bulk_search_task_iter_zip_results_invalid_output(
+    bulk_search_task: BulkSearchTask,
+):
+    with pytest.raises(ValueError) as err:
+        next(bulk_search_task.iter_zip_results(output=Output.JSON))
+    assert (
+        str(err.value)
+        == "JSON output type is not supported. Outputs supported are: CSV_ZIP, JSON_ZIP, STIX_ZIP"
+    )
+
+
+def _mock_ranged_download(
+    task_uuid: str, content: bytes, accept_ranges=True, broken_responses=0
+):
+    """Mock the download of content, answering range requests and breaking the first broken_responses connections"""
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", task_uuid
+        )
+    )
+    requested_ranges = []
+    remaining_broken_responses = [broken_responses]
+
+    def download_callback(request):
+        byte_range = request.headers.get("Range")
+        requested_ranges.append(byte_range)
+        if not accept_ranges or not byte_range:
+            return 200, {}, content
+        first_byte, last_byte = byte_range[len("bytes=") :].split("-")
+        first_byte = int(first_byte)
+        last_byte = int(last_byte) if last_byte else len(content) - 1
+        body = content[first_byte : last_byte + 1]
+        if remaining_broken_responses[0]:
+            remaining_broken_responses[0] -= 1
+            body = body[: len(body) // 2]
+        headers = {"Content-Range": f"bytes {first_byte}-{last_byte}/{len(content)}"}
+        return 206, headers, body
+
+    responses.add_callback(responses.GET, bs_download_url, callback=download_callback)
+    return requested_ranges
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file(bulk_search_task: BulkSearchTask, tmp_path):
+    content = bytes(range(256)) * 4
+    requested_ranges = _mock_ranged_download(bulk_search_task.uuid, content)
+    output_path = tmp_path / "result.json"
+
+    size = bulk_search_task.download_to_file(output_path, buffer_size=100)
+
+    assert size == len(content)
+    assert output_path.read_bytes() == content
+    assert requested_ranges == ["bytes=0-"]
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_retry(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    content = bytes(range(256)) * 4
+    requested_ranges = _mock_ranged_download(
+        bulk_search_task.uuid, content, broken_responses=1
+    )
+    output_path = tmp_path / "result.json"
+
+    bulk_search_task.download_to_file(output_path, buffer_size=100)
+
+    assert output_path.read_bytes() == content
+    # the broken connection is resumed after the bytes written
+    assert requested_ranges == ["bytes=0-", "bytes=511-"]
+    assert not (tmp_path / "result.json.download").exists()
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_resume(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    content = bytes(range(256)) * 4
+    requested_ranges = _mock_ranged_download(
+        bulk_search_task.uuid, content, broken_responses=1
+    )
+    bulk_search_task.file_size = len(content)
+    output_path = tmp_path / "result.json"
+    with pytest.raises(ConnectionError):
+        bulk_search_task.download_to_file(output_path, buffer_size=100, retries=0)
+    assert output_path.read_bytes() == content[:512]
+
+    bulk_search_task.download_to_file(output_path, buffer_size=100, resume=True)
+
+    assert output_path.read_bytes() == content
+    assert requested_ranges == ["bytes=0-", "bytes=511-"]
+
+
+@pytest.mark.parametrize(
+    "download_state",
+    [
+        None,
+        {"uuid": "another task uuid", "output": "JSON", "file_size": 1024},
+        {"uuid": "{uuid}", "output": "CSV", "file_size": 1024},
+        {"uuid": "{uuid}", "output": "JSON", "file_size": 2048},
+    ],
+)
+@responses.activate
+def test_bulk_search_task_download_to_file_resume_other_download(
+    bulk_search_task: BulkSearchTask, tmp_path, download_state
+):
+    content = bytes(range(256)) * 4
+    requested_ranges = _mock_ranged_download(bulk_search_task.uuid, content)
+    bulk_search_task.file_size = len(content)
+    output_path = tmp_path / "result.json"
+    output_path.write_bytes(b"x" * 300)  # an older export, not a partial download
+    if download_state:
+        download_state["uuid"] = download_state["uuid"].format(
+            uuid=bulk_search_task.uuid
+        )
+        (tmp_path / "result.json.download").write_text(json.dumps(download_state))
+
+    bulk_search_task.download_to_file(output_path, buffer_size=100, resume=True)
+
+    assert output_path.read_bytes() == content
+    assert requested_ranges == ["bytes=0-"]
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_gzip_encoding(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    content = b"".join(f"threat {i}\n".encode() for i in range(500))
+    encoded_content = gzip.compress(content)
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", bulk_search_task.uuid
+        )
+    )
+    requests_headers = []
+
+    def download_callback(request):
+        requests_headers.append(request.headers)
+        first_byte = int(request.headers["Range"][len("bytes=") : -1])
+        body = encoded_content[first_byte:]
+        if len(requests_headers) == 1:
+            body = body[: len(body) // 2]  # broken connection
+        headers = {
+            "Content-Encoding": "gzip",
+            "Content-Range": f"bytes {first_byte}-{len(encoded_content) - 1}/{len(encoded_content)}",
+        }
+        return 206, headers, body
+
+    responses.add_callback(responses.GET, bs_download_url, callback=download_callback)
+    output_path = tmp_path / "result.json"
+
+    size = bulk_search_task.download_to_file(output_path, buffer_size=100)
+
+    assert output_path.read_bytes() == content
+    assert size == len(content)
+    assert len(requests_headers) == 2
+    assert all(headers["Accept-Encoding"] == "identity" for headers in requests_headers)
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_ranges_not_accepted(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    content = bytes(range(256)) * 4
+    _mock_ranged_download(bulk_search_task.uuid, content, accept_ranges=False)
+    bulk_search_task.file_size = len(content)
+    output_path = tmp_path / "result.json"
+    output_path.write_bytes(b"x" * 2000)  # longer than the file
+
+    bulk_search_task.download_to_file(output_path, max_workers=4, buffer_size=100)
+
+    assert output_path.read_bytes() == content
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_parallel(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    content = bytes(range(256)) * 4
+    requested_ranges = _mock_ranged_download(bulk_search_task.uuid, content)
+    bulk_search_task.file_size = len(content)
+    output_path = tmp_path / "result.json"
+
+    bulk_search_task.download_to_file(output_path, max_workers=4, buffer_size=100)
+
+    assert output_path.read_bytes() == content
+    assert sorted(requested_ranges) == [
+        "bytes=0-255",
+        "bytes=255-511",
+        "bytes=511-767",
+        "bytes=767-1023",
+    ]
+
+
+@responses.activate
+def test_bulk_search_task_download_to_file_size_mismatch(
+    bulk_search_task: BulkSearchTask, tmp_path
+):
+    bs_download_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-task"].replace(
+            "{task_uuid}", bulk_search_task.uuid
+        )
+    )
+    responses.add(responses.GET, bs_download_url, body=b"truncated", status=200)
+    bulk_search_task.file_size = 1000
+    output_path = tmp_path / "result.json"
+
+    with pytest.raises(ValueError) as err:
+        bulk_search_task.download_to_file(output_path, resume=False)
+    assert str(err.value) == "Downloaded file size is 9 bytes, 1000 bytes were expected"
+
+
 @pytest.mark.asyncio
 async def test_bulk_search_task_download_async_timeout(
     bulk_search_task: BulkSearchTask,
@@ -457,3 +921,208 @@ def test_bulk_search_task_download_sync_failed(bulk_search_task: BulkSearchTask)
     with pytest.raises(BulkSearchFailedError) as err:
         bulk_search_task.download_sync()
     assert err.value.failed_state == BulkSearchTaskState.CANCELLED
+
+
+def _mock_scheduled_bulk_searches(
+    response_mock, polls_before_done: int, final_state="DONE"
+):
+    """Mock bulk searches whose task uuid is their query hash, done after polls_before_done status polls"""
+    bs_creation_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search"]
+    )
+    bs_status_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-tasks"]
+    )
+    polls = {}
+    created = []
+
+    def create_callback(request):
+        query_hash = json.loads(request.body)["query_hash"]
+        created.append(query_hash)
+        return 200, {}, json.dumps({"task_uuid": query_hash})
+
+    def status_callback(request):
+        task_uuid = json.loads(request.body)["task_uuid"]
+        polls[task_uuid] = polls.get(task_uuid, -1) + 1
+        result = copy.deepcopy(bs_status_json["results"][0])
+        result["uuid"] = task_uuid
+        if polls[task_uuid] < polls_before_done:
+            result["state"] = "IN_PROGRESS"
+        else:
+            result["state"] = final_state
+        return 200, {}, json.dumps({"count": 1, "results": [result]})
+
+    response_mock.add_callback(
+        responses.POST, bs_creation_url, callback=create_callback
+    )
+    response_mock.add_callback(responses.POST, bs_status_url, callback=status_callback)
+    return created, polls
+
+
+@responses.activate
+def test_bulk_search_scheduler(datalake: Datalake):
+    created, polls = _mock_scheduled_bulk_searches(responses, polls_before_done=2)
+    scheduler = BulkSearchScheduler(datalake.BulkSearch, max_active=2)
+    called_back = []
+    futures = [
+        scheduler.submit(query_hash=f"hash{i}", callback=called_back.append)
+        for i in range(5)
+    ]
+    assert len(scheduler) == 5
+    assert not responses.calls  # nothing is sent before the scheduler runs
+
+    completed = []
+    for future in scheduler.as_completed():
+        completed.append(future)
+        assert len(created) - len(completed) <= 2  # at most max_active tasks running
+
+    assert len(scheduler) == 0
+    assert sorted(completed, key=id) == sorted(futures, key=id)
+    assert sorted(called_back, key=id) == sorted(futures, key=id)
+    for i, future in enumerate(futures):
+        task = future.result()
+        assert task.uuid == f"hash{i}"
+        assert task.state == BulkSearchTaskState.DONE
+        assert (
+            polls[task.uuid] == 2
+        )  # polled once on creation and twice by the scheduler
+
+
+@responses.activate
+def test_bulk_search_scheduler_failed(datalake: Datalake):
+    _mock_scheduled_bulk_searches(
+        responses, polls_before_done=1, final_state="CANCELLED"
+    )
+    scheduler = BulkSearchScheduler(datalake.BulkSearch)
+    future = scheduler.submit(query_hash="hash")
+    scheduler.run()
+    with pytest.raises(BulkSearchFailedError):
+        future.result()
+
+
+def test_bulk_search_scheduler_invalid_max_active(datalake: Datalake):
+    with pytest.raises(ValueError) as err:
+        BulkSearchScheduler(datalake.BulkSearch, max_active=0)
+    assert str(err.value) == "max_active needs to be positive"
+
+
+@pytest.mark.asyncio
+async def test_bulk_search_scheduler_async(datalake: Datalake):
+    with responses.RequestsMock() as response_context:
+        _mock_scheduled_bulk_searches(response_context, polls_before_done=1)
+        scheduler = BulkSearchScheduler(datalake.BulkSearch, max_active=2)
+        futures = [scheduler.submit(query_hash=f"hash{i}") for i in range(3)]
+        completed = [future async for future in scheduler.as_completed_async()]
+    assert sorted(completed, key=id) == sorted(futures, key=id)
+    assert [future.result().uuid for future in futures] == ["hash0", "hash1", "hash2"]
+
+
+@responses.activate
+def test_bulk_search_sharded_search(datalake: Datalake):
+    bs_creation_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search"]
+    )
+    bs_status_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search-tasks"]
+    )
+    bs_download_url = re.compile(
+        re.escape(
+            TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+            + TestData.TEST_CONFIG["api_version"]
+        )
+        + "mrti/bulk-search/task/(.+)/"
+    )
+    time_ranges = {}  # task uuid -> (gte, lt)
+
+    def create_callback(request):
+        shard_filter = json.loads(request.body)["query_body"]["AND"][-1]["AND"][0]
+        task_uuid = str(len(time_ranges))
+        time_ranges[task_uuid] = (
+            shard_filter["range"]["gte"],
+            shard_filter["range"]["lt"],
+        )
+        return 200, {}, json.dumps({"task_uuid": task_uuid})
+
+    def status_callback(request):
+        task_uuid = json.loads(request.body)["task_uuid"]
+        gte, lt = time_ranges[task_uuid]
+        result = copy.deepcopy(bs_status_json["results"][0])
+        result["uuid"] = task_uuid
+        duration = datetime.datetime.strptime(
+            lt, "%Y-%m-%dT%H:%M:%S.%fZ"
+        ) - datetime.datetime.strptime(gte, "%Y-%m-%dT%H:%M:%S.%fZ")
+        # only shards of one day or less don't have too many results
+        too_many_results = duration > datetime.timedelta(days=1)
+        result["state"] = "FAILED_TOO_MANY_RESULTS" if too_many_results else "DONE"
+        return 200, {}, json.dumps({"count": 1, "results": [result]})
+
+    def download_callback(request):
+        task_uuid = bs_download_url.match(request.url).group(1)
+        gte, _ = time_ranges[task_uuid]
+        results = [
+            [f"hashkey-{gte[:10]}", gte[:10]],
+            ["hashkey-everyday", "everyday"],  # duplicated in every shard
+        ]
+        return 200, {}, json.dumps({"results": results})
+
+    responses.add_callback(responses.POST, bs_creation_url, callback=create_callback)
+    responses.add_callback(responses.POST, bs_status_url, callback=status_callback)
+    responses.add_callback(responses.GET, bs_download_url, callback=download_callback)
+    shards = [
+        TimeRangeShard(
+            "first_seen", datetime.datetime(2023, 1, 1), datetime.datetime(2023, 1, 5)
+        )
+    ]
+
+    results = list(
+        datalake.BulkSearch.sharded_search(
+            {
+                "AND": [
+                    {"AND": [{"field": "risk", "range": {"gt": 60}, "type": "filter"}]}
+                ]
+            },
+            shards,
+            query_fields=["threat_hashkey", "atom_value"],
+        )
+    )
+
+    assert len(time_ranges) == 7  # the 4 days range is split twice
+    assert sorted(results, key=lambda row: row["atom_value"]) == [
+        {"threat_hashkey": "hashkey-2023-01-01", "atom_value": "2023-01-01"},
+        {"threat_hashkey": "hashkey-2023-01-02", "atom_value": "2023-01-02"},
+        {"threat_hashkey": "hashkey-2023-01-03", "atom_value": "2023-01-03"},
+        {"threat_hashkey": "hashkey-2023-01-04", "atom_value": "2023-01-04"},
+        {"threat_hashkey": "hashkey-everyday", "atom_value": "everyday"},
+    ]
+
+
+@responses.activate
+def test_bulk_search_sharded_search_too_many_results(datalake: Datalake):
+    _mock_scheduled_bulk_searches(
+        responses, polls_before_done=1, final_state="FAILED_TOO_MANY_RESULTS"
+    )
+    bs_creation_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-search"]
+    )
+    responses.replace(
+        responses.POST, bs_creation_url, json={"task_uuid": "uuid"}, status=200
+    )
+    shard = TimeRangeShard(
+        "first_seen",
+        datetime.datetime(2023, 1, 1),
+        datetime.datetime(2023, 1, 1, 0, 1),
+    )
+
+    with pytest.raises(BulkSearchFailedError) as err:
+        list(datalake.BulkSearch.sharded_search({"AND": []}, [shard]))
+    assert err.value.failed_state == BulkSearchTaskState.FAILED_TOO_MANY_RESULTS
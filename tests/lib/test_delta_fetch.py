@@ -0,0 +1,143 @@
+import datetime
+from unittest import mock
+
+import pytest
+
+from datalake import Datalake
+from datalake.common.snapshot import iter_snapshot_rows, read_snapshot_header
+from tests.common.fixture import datalake
+
+query_body = {"AND": [{"field": "atom_type", "multi_values": ["ip"], "type": "filter"}]}
+query_hash = "528f01bf39572d6c9026b0097117d863"
+query_fields = ["atom_value", "threat_hashkey"]
+
+
+def _task(rows):
+    task = mock.Mock(advanced_query_hash=query_hash)
+    task.iter_results.return_value = iter(
+        [dict(zip(query_fields, row)) for row in rows]
+    )
+    return task
+
+
+def test_delta_fetch(datalake: Datalake, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.ndjson.gz")
+    with mock.patch.object(datalake.BulkSearch, "create_task") as mock_create_task:
+        mock_create_task.return_value = _task(
+            [["2.2.2.2", "b"], ["1.1.1.1", "a"], ["1.1.1.1", "a"]]
+        )
+        first_fetch = datalake.DeltaFetch.fetch(
+            snapshot_path, query_body=query_body, query_fields=query_fields
+        )
+        mock_create_task.return_value = _task([["3.3.3.3", "c"], ["2.2.2.2", "b"]])
+        second_fetch = datalake.DeltaFetch.fetch(
+            snapshot_path, query_body=query_body, query_fields=query_fields
+        )
+
+    assert first_fetch["from"] is None
+    assert first_fetch["full_fetch"]
+    assert first_fetch["added"] == [["1.1.1.1", "a"], ["2.2.2.2", "b"]]
+    assert first_fetch["count"] == 2
+    assert mock_create_task.call_args_list[0] == mock.call(
+        query_body=query_body, query_hash=None, query_fields=query_fields
+    )
+
+    assert second_fetch["from"] == first_fetch["to"]
+    assert not second_fetch["full_fetch"]
+    assert second_fetch["fetched"] == 2
+    assert second_fetch["added"] == [["3.3.3.3", "c"]]
+    assert second_fetch["removed"] == []
+    assert second_fetch["count"] == 3
+    delta_query_body = mock_create_task.call_args_list[1][1]["query_body"]
+    assert delta_query_body["AND"][:-1] == query_body["AND"]
+    last_updated_filter = delta_query_body["AND"][-1]["AND"][0]
+    assert last_updated_filter["field"] == "last_updated"
+    assert datetime.datetime.strptime(
+        last_updated_filter["range"]["gte"], "%Y-%m-%dT%H:%M:%S.%fZ"
+    ) == (first_fetch["to"] - datalake.DeltaFetch.overlap)
+    assert list(iter_snapshot_rows(snapshot_path)) == [
+        ["1.1.1.1", "a"],
+        ["2.2.2.2", "b"],
+        ["3.3.3.3", "c"],
+    ]
+
+
+def test_delta_fetch_full_refresh(datalake: Datalake, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.ndjson.gz")
+    with mock.patch.object(datalake.BulkSearch, "create_task") as mock_create_task:
+        mock_create_task.return_value = _task([["1.1.1.1", "a"], ["2.2.2.2", "b"]])
+        datalake.DeltaFetch.fetch(
+            snapshot_path, query_body=query_body, query_fields=query_fields
+        )
+        mock_create_task.return_value = _task([["3.3.3.3", "c"], ["2.2.2.2", "b"]])
+        fetch = datalake.DeltaFetch.fetch(
+            snapshot_path,
+            query_body=query_body,
+            query_fields=query_fields,
+            full_refresh_interval=datetime.timedelta(0),
+        )
+
+    assert fetch["full_fetch"]
+    assert mock_create_task.call_args_list[1][1]["query_body"] == query_body
+    assert fetch["added"] == [["3.3.3.3", "c"]]
+    assert fetch["removed"] == [["1.1.1.1", "a"]]
+    assert list(iter_snapshot_rows(snapshot_path)) == [
+        ["2.2.2.2", "b"],
+        ["3.3.3.3", "c"],
+    ]
+
+
+def test_delta_fetch_query_hash(datalake: Datalake, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.ndjson.gz")
+    with mock.patch.object(
+        datalake.BulkSearch, "create_task"
+    ) as mock_create_task, mock.patch.object(
+        datalake.AdvancedSearch,
+        "advanced_search_from_query_hash",
+        return_value={"query_body": query_body, "query_hash": query_hash},
+    ) as mock_advanced_search:
+        for _ in range(3):
+            mock_create_task.return_value = _task([["1.1.1.1", "a"]])
+            datalake.DeltaFetch.fetch(
+                snapshot_path, query_hash=query_hash, query_fields=query_fields
+            )
+
+    assert mock_create_task.call_args_list[0] == mock.call(
+        query_body=None, query_hash=query_hash, query_fields=query_fields
+    )
+    # the query body is resolved once for all the delta fetches
+    mock_advanced_search.assert_called_once_with(query_hash, limit=0)
+    assert read_snapshot_header(snapshot_path)["query_body"] == query_body
+    assert mock_create_task.call_args_list[2][1]["query_body"]["AND"][0] == (
+        query_body["AND"][0]
+    )
+
+
+def test_delta_fetch_other_query(datalake: Datalake, tmp_path):
+    snapshot_path = str(tmp_path / "snapshot.ndjson.gz")
+    with mock.patch.object(datalake.BulkSearch, "create_task") as mock_create_task:
+        mock_create_task.return_value = _task([["1.1.1.1", "a"]])
+        datalake.DeltaFetch.fetch(
+            snapshot_path, query_body=query_body, query_fields=query_fields
+        )
+        mock_create_task.return_value = _task([["2.2.2.2", "b"]])
+        fetch = datalake.DeltaFetch.fetch(
+            snapshot_path, query_hash=query_hash, query_fields=query_fields
+        )
+
+    assert fetch["full_fetch"]
+    assert fetch["from"] is None
+    assert list(iter_snapshot_rows(snapshot_path)) == [["2.2.2.2", "b"]]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"query_body": query_body, "query_hash": query_hash},
+        {"query_body": query_body, "query_fields": ["atom_value"]},
+    ],
+)
+def test_delta_fetch_invalid_parameters(datalake: Datalake, tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        datalake.DeltaFetch.fetch(str(tmp_path / "snapshot.ndjson.gz"), **kwargs)
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+import responses
+
+from datalake import AtomType, Datalake, LookupBatcher
+from tests.common.fixture import TestData, datalake  # noqa needed fixture import
+
+bulk_lookup_url = (
+    TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+    + TestData.TEST_CONFIG["api_version"]
+    + TestData.TEST_CONFIG["endpoints"]["threats-bulk-lookup"]
+)
+atom_values_extract_url = (
+    TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+    + TestData.TEST_CONFIG["api_version"]
+    + TestData.TEST_CONFIG["endpoints"]["threats-atom-values-extract"]
+)
+
+
+def _bulk_lookup_callback(req):
+    body = json.loads(req.body)
+    resp = {
+        atom_type: [
+            {"atom_value": atom_value, "hashkey": f"hashkey_{atom_value}"}
+            for atom_value in body[atom_type]
+        ]
+        for atom_type in ("domain", "ip")
+        if atom_type in body
+    }
+    return 200, {"Content-Type": "application/json"}, json.dumps(resp)
+
+
+@responses.activate
+def test_lookup_batcher_coalesces_lookups(datalake: Datalake):
+    responses.add_callback(
+        responses.POST, bulk_lookup_url, callback=_bulk_lookup_callback
+    )
+
+    with LookupBatcher(datalake.Threats, hashkey_only=True, max_delay=0.5) as batcher:
+        futures = [
+            batcher.submit(f"domain{i}.com", AtomType.DOMAIN) for i in range(250)
+        ]
+        results = [future.result() for future in futures]
+
+    assert results == [
+        {"atom_value": f"domain{i}.com", "hashkey": f"hashkey_domain{i}.com"}
+        for i in range(250)
+    ]
+    assert len(responses.calls) == 3
+    assert json.loads(responses.calls[0].request.body)["hashkey_only"] is True
+
+
+@responses.activate
+def test_lookup_batcher_untyped_atoms(datalake: Datalake):
+    responses.add_callback(
+        responses.POST, bulk_lookup_url, callback=_bulk_lookup_callback
+    )
+    extractor_response = {"found": 0, "not_found": ["12345"], "results": {}}
+    responses.add(
+        responses.POST, atom_values_extract_url, json=extractor_response, status=200
+    )
+
+    with LookupBatcher(datalake.Threats, max_delay=0.5) as batcher:
+        domain = batcher.submit("mayoclinic.org")
+        ip = batcher.submit("8.8.8.8")
+        unknown = batcher.submit("12345")
+
+    assert domain.result() == {
+        "atom_value": "mayoclinic.org",
+        "hashkey": "hashkey_mayoclinic.org",
+    }
+    assert ip.result() == {"atom_value": "8.8.8.8", "hashkey": "hashkey_8.8.8.8"}
+    with pytest.raises(ValueError) as err:
+        unknown.result()
+    assert str(err.value) == "atom could not be typed"
+    bulk_lookup_calls = [
+        call for call in responses.calls if call.request.url == bulk_lookup_url
+    ]
+    assert len(bulk_lookup_calls) == 1
+
+
+def test_lookup_batcher_closed(datalake: Datalake):
+    batcher = LookupBatcher(datalake.Threats)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("mayoclinic.org", AtomType.DOMAIN)
@@ -1,8 +1,12 @@
+import datetime
+import os
 import pytest
 import json
+import shutil
 import responses
 from unittest import mock
-from datalake import Datalake
+from datalake import Datalake, Output, WatchStateStore
+from datalake.common.snapshot import save_snapshot
 from tests.common.fixture import TestData, datalake
 
 query_body = {
@@ -117,6 +121,16 @@ expected_threats_diff = {
 }
 
 
+def mock_download_to_file(bulk_search_result: dict):
+    def download_to_file(output_path, output=Output.JSON, **kwargs):
+        with open(output_path, "w") as output_file:
+            json.dump(bulk_search_result, output_file)
+
+    return mock.patch(
+        "datalake.BulkSearchTask.download_to_file", side_effect=download_to_file
+    )
+
+
 def test_search_watch_no_body_no_query_hash(datalake: Datalake):
     with pytest.raises(ValueError) as exec_error:
         datalake.SearchWatch.search_watch()
@@ -130,7 +144,12 @@ def test_search_watch_with_body_and_with_query_hash(datalake: Datalake):
 
 
 @responses.activate
-def test_search_watch_query_body_without_reference_file(datalake: Datalake):
+def test_search_watch_query_body_without_reference_file(datalake: Datalake, tmp_path):
+    shutil.copy(
+        "tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+        str(tmp_path),
+    )
+
     def bs_creation_callback(request):
         assert json.loads(request.body) == {
             "query_fields": ["atom_value", "threat_hashkey"],
@@ -148,21 +167,22 @@ def test_search_watch_query_body_without_reference_file(datalake: Datalake):
 
     responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
 
-    with mock.patch(
-        "datalake.miscellaneous.search_watch.save_output",
-        side_effect=lambda *args, **kwargs: None,
-    ):
-        with mock.patch("datalake.BulkSearchTask.download_sync") as mock_download_sync:
-            mock_download_sync.return_value = bs_result_json
-            diff_threats = datalake.SearchWatch.search_watch(
-                query_body=query_body, output_folder="tests/input_files"
-            )
-            assert diff_threats["added"] == expected_threats_diff["added"]
-            assert diff_threats["removed"] == expected_threats_diff["removed"]
+    with mock_download_to_file(bs_result_json):
+        diff_threats = datalake.SearchWatch.search_watch(
+            query_body=query_body, output_folder=str(tmp_path)
+        )
+        assert diff_threats["added"] == expected_threats_diff["added"]
+        assert diff_threats["removed"] == expected_threats_diff["removed"]
+
+    result_file = datalake.SearchWatch._find_latest_json_file(str(tmp_path))
+    assert result_file != "528f01bf39572d6c9026b0097117d863-1699966175.json"
+    with open(str(tmp_path / result_file)) as result:
+        assert json.load(result) == bs_result_json
+    assert len(os.listdir(str(tmp_path))) == 2  # no partial download left
 
 
 @responses.activate
-def test_search_watch_query_body_with_reference_file(datalake: Datalake):
+def test_search_watch_query_body_with_reference_file(datalake: Datalake, tmp_path):
     def bs_creation_callback(request):
         assert json.loads(request.body) == {
             "query_fields": ["atom_value", "threat_hashkey"],
@@ -180,24 +200,19 @@ def test_search_watch_query_body_with_reference_file(datalake: Datalake):
 
     responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
 
-    with mock.patch(
-        "datalake.miscellaneous.search_watch.save_output",
-        side_effect=lambda *args, **kwargs: None,
-    ):
-        with mock.patch("datalake.BulkSearchTask.download_sync") as mock_download_sync:
-            mock_download_sync.return_value = bs_result_json
-            diff_threats = datalake.SearchWatch.search_watch(
-                query_body=query_body,
-                output_folder="tests/input_files",
-                reference_file="tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
-            )
+    with mock_download_to_file(bs_result_json):
+        diff_threats = datalake.SearchWatch.search_watch(
+            query_body=query_body,
+            output_folder=str(tmp_path),
+            reference_file="tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+        )
 
-            assert diff_threats["added"] == expected_threats_diff["added"]
-            assert diff_threats["removed"] == expected_threats_diff["removed"]
+        assert diff_threats["added"] == expected_threats_diff["added"]
+        assert diff_threats["removed"] == expected_threats_diff["removed"]
 
 
 @responses.activate
-def test_search_watch_query_hash_with_reference_file(datalake: Datalake):
+def test_search_watch_query_hash_with_reference_file(datalake: Datalake, tmp_path):
     def bs_creation_callback(request):
         assert json.loads(request.body) == {
             "query_fields": ["atom_value", "threat_hashkey"],
@@ -215,24 +230,21 @@ def test_search_watch_query_hash_with_reference_file(datalake: Datalake):
 
     responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
 
-    with mock.patch(
-        "datalake.miscellaneous.search_watch.save_output",
-        side_effect=lambda *args, **kwargs: None,
-    ):
-        with mock.patch("datalake.BulkSearchTask.download_sync") as mock_download_sync:
-            mock_download_sync.return_value = bs_result_json
-            diff_threats = datalake.SearchWatch.search_watch(
-                query_hash=query_hash,
-                output_folder="tests/input_files",
-                reference_file="tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
-            )
+    with mock_download_to_file(bs_result_json):
+        diff_threats = datalake.SearchWatch.search_watch(
+            query_hash=query_hash,
+            output_folder=str(tmp_path),
+            reference_file="tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+        )
 
-            assert diff_threats["added"] == expected_threats_diff["added"]
-            assert diff_threats["removed"] == expected_threats_diff["removed"]
+        assert diff_threats["added"] == expected_threats_diff["added"]
+        assert diff_threats["removed"] == expected_threats_diff["removed"]
 
 
 @responses.activate
-def test_search_watch_query_body_with_wrong_reference_file(datalake: Datalake):
+def test_search_watch_query_body_with_wrong_reference_file(
+    datalake: Datalake, tmp_path
+):
     def bs_creation_callback(request):
         assert json.loads(request.body) == {
             "query_fields": ["atom_value", "threat_hashkey"],
@@ -250,30 +262,27 @@ def test_search_watch_query_body_with_wrong_reference_file(datalake: Datalake):
 
     responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
 
-    with mock.patch(
-        "datalake.miscellaneous.search_watch.save_output",
-        side_effect=lambda *args, **kwargs: None,
-    ):
-        with mock.patch("datalake.BulkSearchTask.download_sync") as mock_download_sync:
-            mock_download_sync.return_value = bs_result_json
-
-            with pytest.raises(FileNotFoundError) as e:
-                datalake.SearchWatch.search_watch(
-                    query_body=query_body,
-                    output_folder="tests/input_files",
-                    reference_file="tests/528f01bf39572d6c9026b0097117d863-1699966175.json",
-                )
+    with mock_download_to_file(bs_result_json):
 
-            assert (
-                "Reference file not found: tests/528f01bf39572d6c9026b0097117d863-1699966175.json"
-                in str(e.value)
+        with pytest.raises(FileNotFoundError) as e:
+            datalake.SearchWatch.search_watch(
+                query_body=query_body,
+                output_folder=str(tmp_path),
+                reference_file="tests/528f01bf39572d6c9026b0097117d863-1699966175.json",
             )
 
+        assert (
+            "Reference file not found: tests/528f01bf39572d6c9026b0097117d863-1699966175.json"
+            in str(e.value)
+        )
+
 
 @responses.activate
 def test_search_watch_query_body_with_no_output_folder_and_no_reference_file(
-    datalake: Datalake,
+    datalake: Datalake, tmp_path, monkeypatch
 ):
+    monkeypatch.chdir(tmp_path)
+
     def bs_creation_callback(request):
         assert json.loads(request.body) == {
             "query_fields": ["atom_value", "threat_hashkey"],
@@ -291,11 +300,215 @@ def test_search_watch_query_body_with_no_output_folder_and_no_reference_file(
 
     responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
 
+    with mock_download_to_file(bs_result_json):
+        diff_threats = datalake.SearchWatch.search_watch(query_body=query_body)
+        assert diff_threats == {}
+
+
+def test_search_watch_iter_threats_diff_files(datalake: Datalake, tmp_path):
+    new_file_path = tmp_path / "528f01bf39572d6c9026b0097117d863-1700046310.json"
+    new_file_path.write_text(json.dumps(bs_result_json))
+
+    diff = list(
+        datalake.SearchWatch.iter_threats_diff_files(
+            "tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+            str(new_file_path),
+        )
+    )
+
+    assert {threat for change, threat in diff if change == "added"} == (
+        expected_threats_diff["added"]
+    )
+    assert {threat for change, threat in diff if change == "removed"} == (
+        expected_threats_diff["removed"]
+    )
+
+
+@responses.activate
+def test_search_watch_with_state_store(datalake: Datalake, tmp_path):
+    responses.add(
+        responses.POST, bs_creation_url, json=bs_creation_response, status=200
+    )
+    responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
+    previous_result = {
+        "advanced_query_hash": "528f01bf39572d6c9026b0097117d863",
+        "results": [
+            ["0.0.10.240", "eff1572f48d3118eb4aa23d63aa5f58b"],
+            ["0.0.10.40", "ca24f9dc63198ecc0572a29f4deaaa54"],
+        ],
+    }
+
+    with WatchStateStore(str(tmp_path / "state.sqlite")) as state_store:
+        with mock_download_to_file(previous_result):
+            assert (
+                datalake.SearchWatch.search_watch(
+                    query_body=query_body,
+                    output_folder=str(tmp_path),
+                    state_store=state_store,
+                )
+                == {}
+            )
+        with mock_download_to_file(bs_result_json):
+            diff_threats = datalake.SearchWatch.search_watch(
+                query_body=query_body,
+                output_folder=str(tmp_path),
+                state_store=state_store,
+            )
+
+        assert sorted(os.listdir(str(tmp_path))) == ["state.sqlite"]
+        assert diff_threats["added"] == expected_threats_diff["added"]
+        assert diff_threats["removed"] == expected_threats_diff["removed"]
+
+
+def test_run_watches(datalake: Datalake, tmp_path):
+    watches = [
+        {"query_hash": "hash_1", "interval": 0.01},
+        {"query_body": query_body, "interval": 0.01},
+    ]
+    diffs = []
+    with WatchStateStore(str(tmp_path / "state.sqlite")) as state_store:
+        with mock.patch.object(
+            datalake.SearchWatch,
+            "search_watch",
+            side_effect=[{}, Exception("API error"), {"added": {}}],
+        ) as mock_search_watch:
+            datalake.SearchWatch.run_watches(
+                watches,
+                state_store,
+                on_diff=lambda watch, diff: diffs.append((watch, diff)),
+                max_runs=3,
+            )
+
+    assert mock_search_watch.call_count == 3
+    assert mock_search_watch.call_args_list[0] == mock.call(
+        query_body=None, query_hash="hash_1", state_store=state_store
+    )
+    assert mock_search_watch.call_args_list[1] == mock.call(
+        query_body=query_body, query_hash=None, state_store=state_store
+    )
+    assert diffs == [(watches[0], {}), (watches[0], {"added": {}})]
+
+
+@pytest.mark.parametrize(
+    "watch",
+    [
+        {"interval": 60},
+        {"query_hash": query_hash, "query_body": query_body, "interval": 60},
+        {"query_hash": query_hash},
+        {"query_hash": query_hash, "interval": 0},
+    ],
+)
+def test_run_watches_invalid_watch(datalake: Datalake, watch):
+    with pytest.raises(ValueError):
+        datalake.SearchWatch.run_watches([watch], state_store=None, max_runs=1)
+
+
+@responses.activate
+def test_search_watch_compact(datalake: Datalake, tmp_path):
+    responses.add(
+        responses.POST, bs_creation_url, json=bs_creation_response, status=200
+    )
+    responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
+    shutil.copy(
+        "tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+        str(tmp_path),
+    )
+
+    with mock_download_to_file(bs_result_json):
+        diff_threats = datalake.SearchWatch.search_watch(
+            query_body=query_body, output_folder=str(tmp_path), compact=True
+        )
+
+    assert diff_threats["added"] == expected_threats_diff["added"]
+    assert diff_threats["removed"] == expected_threats_diff["removed"]
+    snapshot = datalake.SearchWatch._find_latest_json_file(str(tmp_path))
+    assert snapshot.endswith(".ndjson.gz")
+    assert list(datalake.SearchWatch._iter_result_file(str(tmp_path / snapshot))) == [
+        ["0.0.10.244", "7c678c25e5c5a05952dea784934f880b"],
+        ["0.0.10.45", "ca24f9dc63198ecc0572a29f4deaaa54"],
+        ["0.0.10.240", "eff1572f48d3118eb4aa23d63aa5f58b"],
+    ]
+
+
+@responses.activate
+def test_search_watch_failed_download(datalake: Datalake, tmp_path):
+    responses.add(
+        responses.POST, bs_creation_url, json=bs_creation_response, status=200
+    )
+    responses.add(responses.POST, bs_status_url, json=bs_status_json, status=200)
+
+    def download_to_file(output_path, output=Output.JSON, **kwargs):
+        with open(output_path, "w") as output_file:
+            output_file.write('{"results": [')
+        raise ConnectionError("connection reset")
+
     with mock.patch(
-        "datalake.miscellaneous.search_watch.save_output",
-        side_effect=lambda *args, **kwargs: None,
+        "datalake.BulkSearchTask.download_to_file", side_effect=download_to_file
     ):
-        with mock.patch("datalake.BulkSearchTask.download_sync") as mock_download_sync:
-            mock_download_sync.return_value = bs_result_json
-            diff_threats = datalake.SearchWatch.search_watch(query_body=query_body)
-            assert diff_threats == {}
+        with pytest.raises(ConnectionError):
+            datalake.SearchWatch.search_watch(
+                query_body=query_body, output_folder=str(tmp_path)
+            )
+
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_threats_diff_with_snapshot(datalake: Datalake, tmp_path):
+    snapshot_path = str(
+        tmp_path / "528f01bf39572d6c9026b0097117d863-1700046310.ndjson.gz"
+    )
+    save_snapshot(snapshot_path, bulk_search_result=bs_result_json)
+
+    diff_threats = datalake.SearchWatch.threats_diff(
+        "tests/input_files/528f01bf39572d6c9026b0097117d863-1699966175.json",
+        snapshot_path,
+        datetime.datetime(2023, 11, 14, 13, 49, 35),
+        datetime.datetime(2023, 11, 15, 12, 5, 10),
+    )
+
+    assert diff_threats == expected_threats_diff
+
+
+def test_search_watch_delta(datalake: Datalake, tmp_path):
+    fetches = [
+        {"from": None, "added": [["0.0.10.40", "ca24f9dc63198ecc0572a29f4deaaa54"]]},
+        {
+            "from": datetime.datetime(2023, 11, 14, 13, 49, 35),
+            "to": datetime.datetime(2023, 11, 15, 12, 5, 10),
+            "added": [["0.0.10.244", "7c678c25e5c5a05952dea784934f880b"]],
+            "removed": [],
+        },
+    ]
+    with mock.patch.object(
+        datalake.DeltaFetch, "fetch", side_effect=fetches
+    ) as mock_fetch:
+        assert (
+            datalake.SearchWatch.search_watch(
+                query_hash=query_hash, output_folder=str(tmp_path), delta=True
+            )
+            == {}
+        )
+        diff_threats = datalake.SearchWatch.search_watch(
+            query_hash=query_hash, output_folder=str(tmp_path), delta=True
+        )
+
+    assert mock_fetch.call_args == mock.call(
+        str(tmp_path / f"{query_hash}-delta.ndjson.gz"),
+        query_body=None,
+        query_hash=query_hash,
+        query_fields=["atom_value", "threat_hashkey"],
+        full_refresh_interval=None,
+    )
+    assert diff_threats == {
+        "from": "2023-11-14 13:49:35",
+        "to": "2023-11-15 12:05:10",
+        "added": {("0.0.10.244", "7c678c25e5c5a05952dea784934f880b")},
+        "removed": {},
+    }
+
+
+def test_search_watch_delta_with_reference_file(datalake: Datalake):
+    with pytest.raises(ValueError):
+        datalake.SearchWatch.search_watch(
+            query_hash=query_hash, reference_file="reference.json", delta=True
+        )
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta, timezone
 from responses import matchers
 import os
 import ast
+import json
 
 
 from tests.common.fixture import TestData, datalake  # noqa needed fixture import
@@ -20,6 +21,7 @@ from datalake import (
     SightingType,
     Visibility,
     ThreatType,
+    BulkSightingsError,
 )
 
 jarm = Jarm("12/12/2012 12:12:12", "some_fingerprint", True, "some_malware")
@@ -687,6 +689,195 @@ def test_bulk_submit_sightings_failure(datalake):
     assert payload == expected_res
 
 
+def test_prepare_sightings_payload_many_atoms(datalake):
+    atoms = [IpAtom(f"10.0.{i // 256}.{i % 256}") for i in range(1000)] + [
+        file_atom,
+        IpAtom("9.9.9.9"),
+    ]
+
+    with patch.dict(os.environ, {"IGNORE_SIGHTING_BUILDER_WARNING": "1"}):
+        payload = datalake.Sightings._prepare_sightings_payload(
+            atoms,
+            None,
+            start,
+            end,
+            SightingType.NEUTRAL,
+            Visibility.PUBLIC,
+            1,
+        )
+
+    assert len(payload["ip_list"]) == 1001
+    assert payload["ip_list"][0] == {"ip_address": "10.0.0.0"}
+    assert payload["ip_list"][-1] == {"ip_address": "9.9.9.9"}
+    assert len(payload["file_list"]) == 1
+
+
+def _hashkeys_sighting(hashkeys):
+    return {
+        "hashkeys": hashkeys,
+        "start_timestamp": start,
+        "end_timestamp": end,
+        "sighting_type": SightingType.NEUTRAL,
+        "description_visibility": Visibility.PUBLIC,
+        "count": 1,
+    }
+
+
+@responses.activate
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_bulk_submit_sightings_chunks(datalake, max_workers):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-sighting"]
+    )
+    requests_hashkeys = []
+
+    def bulk_sighting_callback(request):
+        sightings = json.loads(request.body)["data"]
+        requests_hashkeys.append([sighting["hashkeys"] for sighting in sightings])
+        results = [{"hashkeys": sighting["hashkeys"]} for sighting in sightings]
+        return 200, {}, json.dumps({"count": len(results), "results": results})
+
+    responses.add_callback(responses.POST, url, callback=bulk_sighting_callback)
+    sightings_hashkeys = [
+        ["hashkey_1"],
+        ["hashkey_2", "hashkey_3"],
+        ["hashkey_4"],
+        ["hashkey_5", "hashkey_6", "hashkey_7", "hashkey_8"],
+        ["hashkey_9"],
+    ]
+
+    with patch.object(
+        datalake.Sightings, "OCD_DTL_MAX_BULK_SIGHTINGS", 2
+    ), patch.object(datalake.Sightings, "OCD_DTL_MAX_BULK_SIGHTINGS_ATOMS", 3):
+        res = datalake.Sightings.bulk_submit_sightings(
+            [_hashkeys_sighting(hashkeys) for hashkeys in sightings_hashkeys],
+            max_workers=max_workers,
+        )
+
+    assert sorted(requests_hashkeys) == [
+        [["hashkey_1"], ["hashkey_2", "hashkey_3"]],
+        [["hashkey_4"]],
+        [["hashkey_5", "hashkey_6", "hashkey_7", "hashkey_8"]],
+        [["hashkey_9"]],
+    ]
+    assert res == {
+        "count": 5,
+        "results": [{"hashkeys": hashkeys} for hashkeys in sightings_hashkeys],
+    }
+
+
+@responses.activate
+def test_bulk_submit_sightings_chunk_failure(datalake):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-sighting"]
+    )
+
+    def bulk_sighting_callback(request):
+        sightings = json.loads(request.body)["data"]
+        if ["hashkey_4"] in [sighting["hashkeys"] for sighting in sightings]:
+            errors = {"1": {"hashkeys": ["hashkey_4 has not been found"]}}
+            return 422, {}, json.dumps({"data": errors})
+        results = [{"hashkeys": sighting["hashkeys"]} for sighting in sightings]
+        return 200, {}, json.dumps({"count": len(results), "results": results})
+
+    responses.add_callback(responses.POST, url, callback=bulk_sighting_callback)
+    sightings_hashkeys = [
+        ["hashkey_1"],
+        ["hashkey_2"],
+        ["hashkey_3"],
+        ["hashkey_4"],
+        ["hashkey_5"],
+    ]
+
+    with patch.object(datalake.Sightings, "OCD_DTL_MAX_BULK_SIGHTINGS", 2):
+        with pytest.raises(BulkSightingsError) as exc:
+            datalake.Sightings.bulk_submit_sightings(
+                [_hashkeys_sighting(hashkeys) for hashkeys in sightings_hashkeys],
+                max_workers=2,
+            )
+
+    # the error of the second sighting of the second request is the one of the fourth sighting
+    assert exc.value.errors == {"3": {"hashkeys": ["hashkey_4 has not been found"]}}
+    assert exc.value.results == [
+        {"hashkeys": ["hashkey_1"]},
+        {"hashkeys": ["hashkey_2"]},
+        None,
+        None,
+        {"hashkeys": ["hashkey_5"]},
+    ]
+    assert str(exc.value).startswith("2 of 5 sightings were not submitted")
+
+
+@responses.activate
+def test_bulk_submit_sightings_chunk_server_error(datalake):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-sighting"]
+    )
+    responses.add(
+        responses.POST, url, json={"count": 1, "results": [{"uid": "1"}]}, status=200
+    )
+    responses.add(responses.POST, url, body="Internal error", status=500)
+
+    with patch.object(datalake.Sightings, "OCD_DTL_MAX_BULK_SIGHTINGS", 1):
+        with pytest.raises(BulkSightingsError) as exc:
+            datalake.Sightings.bulk_submit_sightings(
+                [_hashkeys_sighting(["hashkey_1"]), _hashkeys_sighting(["hashkey_2"])]
+            )
+
+    assert exc.value.errors == {"1": "500: Internal error"}
+    assert exc.value.results == [{"uid": "1"}, None]
+
+
+@responses.activate
+def test_bulk_submit_sightings_chunk_missing_results(datalake):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-sighting"]
+    )
+    responses.add(
+        responses.POST, url, json={"count": 1, "results": [{"uid": "1"}]}, status=200
+    )
+    responses.add(responses.POST, url, json={"count": 1}, status=200)
+    responses.add(
+        responses.POST, url, json={"count": 1, "results": [{"uid": "3"}]}, status=200
+    )
+
+    with patch.object(datalake.Sightings, "OCD_DTL_MAX_BULK_SIGHTINGS", 1):
+        with pytest.raises(BulkSightingsError) as exc:
+            datalake.Sightings.bulk_submit_sightings(
+                [_hashkeys_sighting([f"hashkey_{i}"]) for i in range(3)]
+            )
+
+    assert exc.value.errors == {"1": "0 results returned for 1 sightings submitted"}
+    assert exc.value.results == [{"uid": "1"}, None, {"uid": "3"}]
+
+
+@responses.activate
+def test_bulk_submit_sightings_single_request_missing_results(datalake):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-sighting"]
+    )
+    responses.add(
+        responses.POST, url, json={"count": 1, "results": [{"uid": "1"}]}, status=200
+    )
+
+    with pytest.raises(ValueError) as exc:
+        datalake.Sightings.bulk_submit_sightings(
+            [_hashkeys_sighting(["hashkey_1"]), _hashkeys_sighting(["hashkey_2"])]
+        )
+
+    assert str(exc.value) == "1 results returned for 2 sightings submitted"
+
+
 def test_sightings_filtered_bad_ordering(datalake):
     with pytest.raises(ValueError) as err:
         datalake.Sightings.sightings_filtered(ordering="bad_ordering")
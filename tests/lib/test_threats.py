@@ -1,9 +1,12 @@
+import datetime
 import json
 
 import pytest
 import responses
 
 from datalake import Datalake, Output, AtomType, ThreatType, OverrideType, IpAtom
+from datalake.common.atom_classifier import AtomClassifier
+from datalake.common.journal import BulkThreatsJournal
 from tests.common.fixture import (
     TestData,
     datalake,
@@ -284,6 +287,43 @@ def test_bulk_lookup_return_search_hashkey(datalake):
     )
 
 
+@responses.activate
+def test_atom_values_extract_sends_only_unknown_atoms(datalake):
+    extractor_response = {
+        "found": 1,
+        "not_found": ["not_an_atom"],
+        "results": {"as": ["12345"]},
+    }
+    responses.add(
+        responses.POST,
+        atom_values_extract_url,
+        match=[
+            responses.matchers.json_params_matcher(
+                {"content": "12345 not_an_atom", "treat_hashes_like": "file"}
+            )
+        ],
+        json=extractor_response,
+        status=200,
+    )
+
+    untyped_atoms = ["mayoclinic.org", "12345", "8.8.8.8", "not_an_atom", "12345"]
+    expected_response = {
+        "found": 3,
+        "not_found": ["not_an_atom"],
+        "results": {"domain": ["mayoclinic.org"], "as": ["12345"], "ip": ["8.8.8.8"]},
+    }
+    assert datalake.Threats._atom_values_extract(untyped_atoms) == expected_response
+    assert len(responses.calls) == 1
+
+    # the type given by the API is remembered
+    assert datalake.Threats._atom_values_extract(["12345", "8.8.8.8"]) == {
+        "found": 2,
+        "not_found": [],
+        "results": {"as": ["12345"], "ip": ["8.8.8.8"]},
+    }
+    assert len(responses.calls) == 1
+
+
 @responses.activate
 def test_bulk_lookup_threats_on_typed_atoms(datalake):
     bulk_resp = {
@@ -373,6 +413,66 @@ def test_bulk_lookup_threats_on_big_chunk_csv(datalake):
     assert csv_lines[0] == header
 
 
+def _bulk_lookup_callback(req):
+    body = json.loads(req.body)
+    resp = {
+        "domain": [
+            {
+                "atom_value": domain,
+                "hashkey": "664d2e13bff4ac355c94b4f62ac0b92a",
+                "threat_found": False,
+            }
+            for domain in body["domain"]
+        ]
+    }
+    return 200, {"Content-Type": "application/json"}, json.dumps(resp)
+
+
+@responses.activate
+def test_bulk_lookup_threats_concurrent_batches(datalake):
+    atom_values = [f"domain{i}.com" for i in range(1_000)]
+    responses.add_callback(
+        responses.POST, bulk_lookup_url, callback=_bulk_lookup_callback
+    )
+
+    api_response = datalake.Threats.bulk_lookup(
+        atom_values=atom_values, atom_type=AtomType.DOMAIN, max_workers=4
+    )
+
+    assert len(responses.calls) == 10
+    assert [threat["atom_value"] for threat in api_response["domain"]] == atom_values
+
+
+@responses.activate
+def test_bulk_lookup_iter(datalake):
+    atom_values = (f"domain{i}.com" for i in range(250))
+    responses.add_callback(
+        responses.POST, bulk_lookup_url, callback=_bulk_lookup_callback
+    )
+
+    batches = list(
+        datalake.Threats.bulk_lookup_iter(
+            atom_values, atom_type=AtomType.DOMAIN, max_workers=3
+        )
+    )
+
+    assert len(batches) == 3
+    assert sorted(len(batch["domain"]) for batch in batches) == [50, 100, 100]
+    assert {
+        threat["atom_value"] for batch in batches for threat in batch["domain"]
+    } == {f"domain{i}.com" for i in range(250)}
+
+
+@responses.activate
+def test_bulk_lookup_iter_invalid_output(datalake: Datalake):
+    with pytest.raises(ValueError) as err:
+        datalake.Threats.bulk_lookup_iter(atoms, output=Output.MISP)
+    assert (
+        str(err.value)
+        == f"MISP output type is not supported. Outputs supported are: CSV, JSON"
+    )
+
+
 @responses.activate
 def test_bulk_lookup_threat_invalid_output(datalake: Datalake):
     wrong_output = "123"
@@ -444,6 +544,48 @@ def test_edit_score_bad_override_type(datalake: Datalake):
     assert str(err.value) == "Invalid OverrideType input"
 
 
+@responses.activate
+def test_bulk_edit_score_by_hashkeys(datalake: Datalake, monkeypatch):
+    monkeypatch.setattr(datalake.Threats, "OCD_DTL_MAX_EDIT_SCORE_HASHKEYS", 2)
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["threats-bulk-scoring-edits"]
+    )
+    hashkeys = [f"hashkey{i}" for i in range(5)]
+    sent_chunks = []
+
+    def request_callback(request):
+        chunk = json.loads(request.body)["hashkeys"]
+        sent_chunks.append(chunk)
+        if chunk == ["hashkey4"]:  # always fails
+            return 500, {}, "error"
+        if chunk == ["hashkey2", "hashkey3"] and sent_chunks.count(chunk) == 1:
+            return 500, {}, "error"  # fails the first time only
+        return 200, {}, json.dumps({"message": "ok"})
+
+    responses.add_callback(responses.POST, url, callback=request_callback)
+
+    outcomes = datalake.Threats.bulk_edit_score_by_hashkeys(
+        hashkeys, [{"threat_type": ThreatType.DDOS, "score": 0}], max_workers=2
+    )
+
+    assert outcomes == {
+        "hashkey0": "OK",
+        "hashkey1": "OK",
+        "hashkey2": "OK",
+        "hashkey3": "OK",
+        "hashkey4": "FAILED",
+    }
+    assert sorted(sent_chunks) == [
+        ["hashkey0", "hashkey1"],
+        ["hashkey2", "hashkey3"],
+        ["hashkey2", "hashkey3"],
+        ["hashkey4"],
+        ["hashkey4"],
+    ]
+
+
 def test_add_threats_not_threat_types_not_whitelist(datalake: Datalake):
     with pytest.raises(ValueError) as err:
         atom_list = ["100.100.100.1"]
@@ -578,6 +720,180 @@ def test_add_threats_bulk(datalake: Datalake):
     ]
 
 
+@responses.activate
+def test_add_threats_bulk_polls_tasks_until_done(datalake: Datalake, monkeypatch):
+    monkeypatch.setattr(datalake.Threats, "OCD_DTL_MAX_BULK_THREATS_IN_FLIGHT", 2)
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats"]
+    )
+    task_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats-task"]
+    )
+    atom_list = [f"1.1.{i // 256}.{i % 256}" for i in range(300)]
+    task_uuids = ["task-0", "task-1", "task-2"]
+    for task_uuid in task_uuids:
+        responses.add(responses.POST, url, json={"task_uuid": task_uuid}, status=202)
+
+    for i, task_uuid in enumerate(task_uuids):
+        task_status_url = task_url.replace("{task_uuid}", task_uuid)
+        responses.add(
+            responses.GET, task_status_url, json={"state": "IN_PROGRESS"}, status=200
+        )
+        responses.add(
+            responses.GET,
+            task_status_url,
+            json={
+                "state": "DONE",
+                "hashkeys": [f"hashkey-{i}"],
+                "atom_values": atom_list[i * 100 : (i + 1) * 100],
+            },
+            status=200,
+        )
+
+    threat_types = [{"threat_type": ThreatType("ddos"), "score": 0}]
+    response = datalake.Threats.add_threats(atom_list, AtomType.IP, threat_types)
+
+    assert response == [
+        {
+            "success": [
+                {
+                    "created_hashkeys": [f"hashkey-{i}"],
+                    "created_atom_values": atom_list[i * 100 : (i + 1) * 100],
+                }
+            ],
+            "failed": [],
+        }
+        for i in range(3)
+    ]
+    status_calls = [call for call in responses.calls if call.request.method == "GET"]
+    assert len(status_calls) == 6  # each task is polled until it is done, no more
+
+
+@responses.activate
+def test_add_threats_bulk_resume_from_journal(datalake: Datalake, tmp_path):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats"]
+    )
+    task_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats-task"]
+    )
+    atom_list = [f"1.1.{i // 256}.{i % 256}" for i in range(300)]
+    batches = [atom_list[i * 100 : (i + 1) * 100] for i in range(3)]
+
+    def task_status(i):
+        return {
+            "state": "DONE",
+            "hashkeys": [f"hashkey-{i}"],
+            "atom_values": batches[i],
+        }
+
+    # the first run added the first batch, the task of the second one was still running
+    journal_path = str(tmp_path / "add_threats.journal")
+    with BulkThreatsJournal(journal_path) as journal:
+        batch_keys = [journal.batch_key("ip", "\n".join(batch)) for batch in batches]
+        journal.submitted(batch_keys[0], "task-0")
+        journal.done(batch_keys[0], "task-0", task_status(0))
+        journal.submitted(batch_keys[1], "task-1")
+    with open(journal_path, "a") as journal_file:
+        journal_file.write('{"event": "submitted", "ba')  # interrupted while writing
+
+    responses.add(responses.POST, url, json={"task_uuid": "task-2"}, status=202)
+    for i in (1, 2):
+        responses.add(
+            responses.GET,
+            task_url.replace("{task_uuid}", f"task-{i}"),
+            json=task_status(i),
+            status=200,
+        )
+
+    threat_types = [{"threat_type": ThreatType("ddos"), "score": 0}]
+    response = datalake.Threats.add_threats(
+        atom_list, AtomType.IP, threat_types, journal_path=journal_path, resume=True
+    )
+
+    assert response == [
+        {
+            "success": [
+                {
+                    "created_hashkeys": [f"hashkey-{i}"],
+                    "created_atom_values": batches[i],
+                }
+            ],
+            "failed": [],
+        }
+        for i in range(3)
+    ]
+    posts = [call for call in responses.calls if call.request.method == "POST"]
+    assert len(posts) == 1
+    assert json.loads(posts[0].request.body)["atom_values"] == "\n".join(batches[2])
+
+    journal = BulkThreatsJournal(journal_path, resume=True)
+    journal.close()
+    assert [journal.task_status(batch_key) for batch_key in batch_keys] == [
+        task_status(i) for i in range(3)
+    ]
+
+
+@responses.activate
+def test_add_threats_bulk_resume_unknown_task(datalake: Datalake, tmp_path):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats"]
+    )
+    task_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["bulk-manual-threats-task"]
+    )
+    atom_list = ["1.1.1.1", "1.1.1.2"]
+    journal_path = str(tmp_path / "add_threats.journal")
+    with BulkThreatsJournal(journal_path) as journal:
+        batch_key = journal.batch_key("ip", "\n".join(atom_list))
+        journal.submitted(batch_key, "expired-task")
+
+    responses.add(
+        responses.GET,
+        task_url.replace("{task_uuid}", "expired-task"),
+        json={"message": "Not found"},
+        status=404,
+    )
+    responses.add(responses.POST, url, json={"task_uuid": "new-task"}, status=202)
+    responses.add(
+        responses.GET,
+        task_url.replace("{task_uuid}", "new-task"),
+        json={"state": "DONE", "hashkeys": ["hashkey"], "atom_values": atom_list},
+        status=200,
+    )
+
+    threat_types = [{"threat_type": ThreatType("ddos"), "score": 0}]
+    response = datalake.Threats.add_threats(
+        atom_list, AtomType.IP, threat_types, journal_path=journal_path, resume=True
+    )
+
+    assert response == [
+        {
+            "success": [
+                {"created_hashkeys": ["hashkey"], "created_atom_values": atom_list}
+            ],
+            "failed": [],
+        }
+    ]
+    posts = [call for call in responses.calls if call.request.method == "POST"]
+    assert len(posts) == 1
+    with BulkThreatsJournal(journal_path, resume=True) as journal:
+        assert journal.batches[batch_key]["task_uuid"] == "new-task"
+        assert journal.task_status(batch_key)["state"] == "DONE"
+
+
 def test_atom_values_empty_source_id(datalake: Datalake):
     with pytest.raises(ValueError) as err:
         source_id = None
@@ -739,6 +1055,109 @@ def test_atom_values(datalake: Datalake):
     )
 
 
+@responses.activate
+def test_atom_values_time_windows(datalake: Datalake, tmp_path):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["sources"]
+    )
+    get_resp = {
+        "count": 1,
+        "results": [{"description": "source_a description", "id": "source_a"}],
+    }
+    responses.add(responses.GET, url, json=get_resp, status=200)
+
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["atom-values"]
+    )
+
+    def request_callback(request):
+        payload = json.loads(request.body)
+        since = payload["normalized_timestamp_since"]
+        resp = [{"atom_value": f"atom_{since}", "normalized_timestamp": since}]
+        return 200, {}, json.dumps(resp)
+
+    responses.add_callback(responses.POST, url, callback=request_callback)
+    output_path = str(tmp_path / "atom_values.json")
+
+    written_count = datalake.Threats.atom_values(
+        ["source_a"],
+        "2023-09-17T00:00:00.000Z",
+        "2023-09-17T23:59:59.999Z",
+        output_path=output_path,
+        window=datetime.timedelta(hours=6),
+        max_workers=4,
+    )
+
+    expected_atom_values = [
+        {
+            "atom_value": f"atom_2023-09-17T{hour:02}:00:00.000Z",
+            "normalized_timestamp": f"2023-09-17T{hour:02}:00:00.000Z",
+        }
+        for hour in (0, 6, 12, 18)
+    ]
+    assert written_count == 4
+    with open(output_path) as output_file:
+        assert json.load(output_file) == expected_atom_values
+    assert len(responses.calls) == 5  # sources check and one request per window
+
+    atom_values = datalake.Threats.atom_values(
+        ["source_a"],
+        "2023-09-17T00:00:00.000Z",
+        "2023-09-17T23:59:59.999Z",
+        window=datetime.timedelta(hours=6),
+    )
+    assert atom_values == expected_atom_values
+
+
+@responses.activate
+def test_atom_values_time_windows_csv(datalake: Datalake, tmp_path):
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["sources"]
+    )
+    get_resp = {
+        "count": 1,
+        "results": [{"description": "source_a description", "id": "source_a"}],
+    }
+    responses.add(responses.GET, url, json=get_resp, status=200)
+
+    url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+        + TestData.TEST_CONFIG["endpoints"]["atom-values"]
+    )
+
+    def request_callback(request):
+        since = json.loads(request.body)["normalized_timestamp_since"]
+        csv_resp = f"atom_value,normalized_timestamp\natom_{since},{since}\n"
+        return 200, {"Content-Type": "text/csv"}, csv_resp
+
+    responses.add_callback(responses.POST, url, callback=request_callback)
+    output_path = str(tmp_path / "atom_values.csv")
+
+    written_count = datalake.Threats.atom_values(
+        ["source_a"],
+        "2023-09-17T00:00:00.000Z",
+        "2023-09-17T11:59:59.999Z",
+        output=Output.CSV,
+        output_path=output_path,
+        window=datetime.timedelta(hours=6),
+    )
+
+    assert written_count == 2
+    with open(output_path) as output_file:
+        assert output_file.read() == (
+            "atom_value,normalized_timestamp\n"
+            "atom_2023-09-17T00:00:00.000Z,2023-09-17T00:00:00.000Z\n"
+            "atom_2023-09-17T06:00:00.000Z,2023-09-17T06:00:00.000Z\n"
+        )
+
+
 @responses.activate
 def test_preprod_atom_values(datalake_preprod):
     url = (
@@ -787,3 +1206,70 @@ def test_preprod_atom_values(datalake_preprod):
         )
         == post_resp
     )
+
+
+def _add_threats_with_comments_responses(hashkeys, not_found_hashkeys):
+    base_url = (
+        TestData.TEST_CONFIG["main"][TestData.TEST_ENV]
+        + TestData.TEST_CONFIG["api_version"]
+    )
+    for hashkey in hashkeys:
+        threat_url = base_url + TestData.TEST_CONFIG["endpoints"]["threats"].format(
+            hashkey=hashkey
+        )
+        if hashkey in not_found_hashkeys:
+            responses.add(responses.GET, threat_url, json={}, status=200)
+            continue
+        responses.add(responses.GET, threat_url, json={"hashkey": hashkey}, status=200)
+        comments_url = base_url + TestData.TEST_CONFIG["endpoints"][
+            "threats-comments"
+        ].format(hashkey=hashkey)
+        responses.add(
+            responses.GET, comments_url, json=[{"content": hashkey}], status=200
+        )
+
+
+@responses.activate
+def test_get_threats_with_comments_concurrent(datalake: Datalake):
+    hashkeys = [f"hashkey{i}" for i in range(10)]
+    _add_threats_with_comments_responses(hashkeys, {"hashkey3", "hashkey7"})
+
+    threats, not_found = datalake.Threats.get_threats_with_comments(
+        hashkeys, max_workers=4
+    )
+
+    assert threats == {
+        "count": 8,
+        "results": [
+            {"hashkey": hashkey, "comments": [{"content": hashkey}]}
+            for hashkey in hashkeys
+            if hashkey not in ("hashkey3", "hashkey7")
+        ],
+    }
+    assert not_found == ["hashkey3", "hashkey7"]
+
+
+@responses.activate
+def test_iter_threats_with_comments(datalake: Datalake):
+    hashkeys = [f"hashkey{i}" for i in range(10)]
+    _add_threats_with_comments_responses(hashkeys, {"hashkey3"})
+
+    results = dict(
+        datalake.Threats.iter_threats_with_comments(iter(hashkeys), max_workers=4)
+    )
+
+    assert results.keys() == set(hashkeys)
+    assert results["hashkey3"] is None
+    assert results["hashkey5"] == {
+        "hashkey": "hashkey5",
+        "comments": [{"content": "hashkey5"}],
+    }
+
+
+def test_close_atom_type_memo(datalake: Datalake, tmp_path):
+    memo_path = str(tmp_path / "atom_types.ndjson")
+    datalake.Threats.atom_classifier = AtomClassifier(memo_path=memo_path)
+
+    datalake.close()
+
+    assert datalake.Threats.atom_classifier._file is None